@@ -12,9 +12,11 @@ export async function getSheets(file) {
   return res.json();
 }
 
-export async function extractSchedule({ file, sheet, channel, advertiser }) {
+export async function extractSchedule({ file, uploadId, sheet, channel, advertiser }) {
   const fd = new FormData();
-  fd.append("file", file);
+  // a workbook already sent to getSheets is referenced by its upload id
+  if (uploadId) fd.append("upload_id", uploadId);
+  else fd.append("file", file);
   fd.append("sheet", sheet);
   fd.append("channel", channel);
   fd.append("advertiser", advertiser);
@@ -27,17 +29,35 @@ export async function extractSchedule({ file, sheet, channel, advertiser }) {
   return res.json();
 }
 
+export async function extractScheduleBatch({ file, uploadId, specs, combine }) {
+  // specs: [{ sheet, channel, advertiser }], extracted in parallel on the server
+  const fd = new FormData();
+  if (uploadId) fd.append("upload_id", uploadId);
+  else fd.append("file", file);
+  fd.append("specs", JSON.stringify(specs));
+  if (combine) fd.append("combine", "1");
+
+  const res = await fetch(`${API_BASE}/api/extract/batch`, {
+    method: "POST",
+    body: fd,
+  });
+  if (!res.ok) throw new Error(await res.text());
+  return res.json();
+}
+
 export function downloadExtracted(token) {
   window.open(`${API_BASE}/api/extract/download/${token}`, "_blank");
 }
 
-export async function runMonitoring({ token, nilsonFile, roNumber, sessionId, channel }) {
+export async function runMonitoring({ token, nilsonFile, roNumber, sessionId, channel, claimMode }) {
   const fd = new FormData();
   fd.append("token", token);
   fd.append("ro_number", roNumber);
   fd.append("channel", channel || "Unknown Channel");
   if (sessionId) fd.append("session_id", sessionId);
   if (nilsonFile) fd.append("nilson", nilsonFile);
+  // "independent" (default) or "exclusive"; only used when a session is created
+  if (claimMode) fd.append("claim_mode", claimMode);
 
   const res = await fetch(`${API_BASE}/api/monitor`, {
     method: "POST",
@@ -47,6 +67,48 @@ export async function runMonitoring({ token, nilsonFile, roNumber, sessionId, ch
   return res.json();
 }
 
+export async function runMonitoringBatch({ items, nilsonFile, sessionId, claimMode }) {
+  // items: [{ token, ro_number, channel }], matched in parallel on the server
+  const fd = new FormData();
+  fd.append("items", JSON.stringify(items));
+  if (sessionId) fd.append("session_id", sessionId);
+  if (nilsonFile) fd.append("nilson", nilsonFile);
+  if (claimMode) fd.append("claim_mode", claimMode);
+
+  const res = await fetch(`${API_BASE}/api/monitor/batch`, {
+    method: "POST",
+    body: fd,
+  });
+  if (!res.ok) throw new Error(await res.text());
+  return res.json();
+}
+
+export async function appendNilson({ sessionId, nilsonFile }) {
+  // the extended log is a new session; its jobs come back with new job ids
+  const fd = new FormData();
+  fd.append("nilson", nilsonFile);
+
+  const res = await fetch(`${API_BASE}/api/monitor/session/${sessionId}/append`, {
+    method: "POST",
+    body: fd,
+  });
+  if (!res.ok) throw new Error(await res.text());
+  return res.json();
+}
+
+export async function fetchPreview(key, { which, page = 1, pageSize = 100, sort, order, filters } = {}) {
+  // key: extract token or monitoring job id; which: unmatched | all | nilson for jobs
+  const params = new URLSearchParams({ page, page_size: pageSize });
+  if (which) params.set("which", which);
+  if (sort) params.set("sort", sort);
+  if (order) params.set("order", order);
+  if (filters) params.set("filters", JSON.stringify(filters));
+
+  const res = await fetch(`${API_BASE}/api/preview/${key}?${params}`);
+  if (!res.ok) throw new Error(await res.text());
+  return res.json();
+}
+
 export function downloadFullNilson(sessionId) {
   window.open(`${API_BASE}/api/monitor/download/session/${sessionId}/full_nilson`, "_blank");
 }
@@ -55,3 +117,20 @@ export function downloadFullNilson(sessionId) {
 export function downloadMonitoring(jobId, which) {
   window.open(`${API_BASE}/api/monitor/download/${jobId}/${which}`, "_blank");
 }
+
+export async function getJob(jobId) {
+  const res = await fetch(`${API_BASE}/api/jobs/${jobId}`);
+  if (!res.ok) throw new Error(await res.text());
+  return res.json();
+}
+
+export async function waitForJob(jobId, onProgress, intervalMs = 1000) {
+  // polls an async extract/monitor job (sent with async=1) until it finishes
+  for (;;) {
+    const status = await getJob(jobId);
+    if (onProgress) onProgress(status);
+    if (status.state === "done") return status.result;
+    if (status.state === "failed") throw new Error(status.error || "job failed");
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
@@ -1,9 +1,66 @@
-import React from "react";
+import React, { useEffect, useState } from "react";
+import { fetchPreview } from "../api.js";
 
-export default function DataTable({ preview }) {
-  if (!preview) return null;
+const PAGE_SIZE = 100;
 
-  const { columns = [], rows = [], totalRows = 0 } = preview;
+// previews come column-oriented ({ columns, columnData }); older ones as row dicts
+function previewRows(preview) {
+  if (preview.rows) return preview.rows;
+  const { columns = [], columnData = [] } = preview;
+  const n = columnData.length ? columnData[0].length : 0;
+  const rows = new Array(n);
+  for (let i = 0; i < n; i++) {
+    const row = {};
+    columns.forEach((c, j) => { row[c] = columnData[j][i]; });
+    rows[i] = row;
+  }
+  return rows;
+}
+
+export default function DataTable({ preview, source, which }) {
+  // with a source (extract token / job id) further pages are fetched from the server
+  const [page, setPage] = useState(1);
+  const [sort, setSort] = useState(null);
+  const [order, setOrder] = useState("asc");
+  const [current, setCurrent] = useState(preview);
+  const [loading, setLoading] = useState(false);
+
+  useEffect(() => {
+    setCurrent(preview);
+    setPage(1);
+    setSort(null);
+  }, [preview]);
+
+  useEffect(() => {
+    if (!source) return;
+    if (page === 1 && !sort) {
+      // the first page came with the extract/monitor response
+      setCurrent(preview);
+      return;
+    }
+    let cancelled = false;
+    setLoading(true);
+    fetchPreview(source, { which, page, pageSize: PAGE_SIZE, sort, order })
+      .then((res) => { if (!cancelled) setCurrent(res); })
+      .catch(() => {})
+      .finally(() => { if (!cancelled) setLoading(false); });
+    return () => { cancelled = true; };
+  }, [source, which, page, sort, order]);
+
+  if (!current) return null;
+
+  const { columns = [], totalRows = 0 } = current;
+  const rows = previewRows(current);
+  const filteredRows = current.filteredRows ?? totalRows;
+  const pageCount = Math.max(1, Math.ceil(filteredRows / PAGE_SIZE));
+  const offset = source ? (page - 1) * PAGE_SIZE : 0;
+
+  function toggleSort(c) {
+    if (!source) return;
+    if (sort === c) setOrder(order === "asc" ? "desc" : "asc");
+    else { setSort(c); setOrder("asc"); }
+    setPage(1);
+  }
 
   // Hide internal columns
   const hiddenColumns = ["Date_dt"];
@@ -23,8 +80,18 @@ export default function DataTable({ preview }) {
 
   return (
     <div style={{ overflowX: "auto" }}>
-      <div className="small" style={{ marginBottom: 8 }}>
-        Showing {rows.length} rows (Total: {totalRows})
+      <div className="small" style={{ marginBottom: 8, display: "flex", gap: 12, alignItems: "center" }}>
+        <span>
+          Showing {rows.length ? offset + 1 : 0}-{offset + rows.length} of {filteredRows} rows (Total: {totalRows})
+          {loading ? " …" : ""}
+        </span>
+        {source && pageCount > 1 ? (
+          <span style={{ display: "flex", gap: 6, alignItems: "center" }}>
+            <button onClick={() => setPage(page - 1)} disabled={page <= 1 || loading}>Prev</button>
+            <span>Page {page} / {pageCount}</span>
+            <button onClick={() => setPage(page + 1)} disabled={page >= pageCount || loading}>Next</button>
+          </span>
+        ) : null}
       </div>
 
       <table
@@ -52,14 +119,17 @@ export default function DataTable({ preview }) {
             {visibleColumns.map((c) => (
               <th
                 key={c}
+                onClick={() => toggleSort(c)}
                 style={{
                   textAlign: "left",
                   padding: 8,
                   borderBottom: "1px solid #eee",
-                  whiteSpace: "nowrap"
+                  whiteSpace: "nowrap",
+                  cursor: source ? "pointer" : "default"
                 }}
               >
                 {c}
+                {sort === c ? (order === "asc" ? " ▲" : " ▼") : ""}
               </th>
             ))}
           </tr>
@@ -78,7 +148,7 @@ export default function DataTable({ preview }) {
                   fontSize: "13px"
                 }}
               >
-                {idx + 1}
+                {offset + idx + 1}
               </td>
 
               {visibleColumns.map((c) => (
@@ -11,6 +11,7 @@ export default function ExtractPage() {
   const [file, setFile] = useState(null);
   const [sheets, setSheets] = useState([]);
   const [sheet, setSheet] = useState("");
+  const [uploadId, setUploadId] = useState("");
   const [channel, setChannel] = useState(CHANNELS[0]);
   const [advertiser, setAdvertiser] = useState(ADVERTISERS[0]);
 
@@ -24,6 +25,7 @@ export default function ExtractPage() {
     try {
       const data = await getSheets(file);
       setSheets(data.sheets || []);
+      setUploadId(data.upload_id || "");
       setSheet((data.sheets || [])[0] || "");
     } catch (e) {
       setErr(String(e));
@@ -38,7 +40,16 @@ export default function ExtractPage() {
     if (!sheet) return setErr("Please select a sheet.");
     setLoading(true);
     try {
-      const res = await extractSchedule({ file, sheet, channel, advertiser });
+      let res;
+      try {
+        res = await extractSchedule({ file, uploadId, sheet, channel, advertiser });
+      } catch (e) {
+        if (!uploadId) throw e;
+        // cached upload expired: send the file again
+        setUploadId("");
+        res = await extractSchedule({ file, sheet, channel, advertiser });
+      }
+      setUploadId(res.upload_id || "");
       sessionStorage.setItem("extract_token", res.token);
       sessionStorage.setItem("extract_preview", JSON.stringify(res.preview));
       sessionStorage.setItem("extract_channel", channel);
@@ -63,7 +74,10 @@ export default function ExtractPage() {
             <input
               type="file"
               accept=".xlsx,.xls"
-              onChange={(e) => setFile(e.target.files?.[0] || null)}
+              onChange={(e) => {
+                setFile(e.target.files?.[0] || null);
+                setUploadId("");
+              }}
               style={styles.input}
             />
             <div style={styles.smallText}>
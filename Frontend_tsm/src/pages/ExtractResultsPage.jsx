@@ -113,7 +113,7 @@ export default function ExtractResultsPage() {
 
           {/* TABLE */}
           <div style={{ marginTop: "16px" }}>
-            <DataTable preview={preview} />
+            <DataTable preview={preview} source={token} />
           </div>
 
           {/* ACTION BUTTONS – BOTTOM */}
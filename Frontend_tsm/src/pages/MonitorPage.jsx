@@ -77,7 +77,7 @@ export default function MonitorPage() {
               <>
                 <input
                   type="file"
-                  accept=".xlsx,.xls"
+                  accept=".xlsx,.xls,.csv,.parquet"
                   onChange={(e) => setNilsonFile(e.target.files?.[0] || null)}
                   style={styles.input}
                 />
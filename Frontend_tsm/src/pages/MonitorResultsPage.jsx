@@ -124,6 +124,7 @@ export default function MonitorResultsPage() {
                           <button style={{ ...styles.smallActionBtn, backgroundColor: '#4299e1' }} onClick={() => downloadMonitoring(job.jobId, "unmatched")}>Unmatched CSV</button>
                           <button style={{ ...styles.smallActionBtn, backgroundColor: '#4299e1' }} onClick={() => downloadMonitoring(job.jobId, "all")}>All Data CSV</button>
                           <button style={{ ...styles.smallActionBtn, backgroundColor: '#48bb78' }} onClick={() => downloadMonitoring(job.jobId, "nilson")}>Nilson CSV</button>
+                          <button style={{ ...styles.smallActionBtn, backgroundColor: '#805ad5' }} onClick={() => downloadMonitoring(job.jobId, "xlsx")}>Excel Workbook</button>
                        </div>
                     </td>
                   </tr>
@@ -138,7 +139,7 @@ export default function MonitorResultsPage() {
         <div style={styles.section}>
           <h3 style={styles.sectionTitle}>Unmatched Spots</h3>
           <div style={styles.tableContainer}>
-            <DataTable preview={unmatchedPreview} />
+            <DataTable preview={unmatchedPreview} source={currentJobId} which="unmatched" />
           </div>
         </div>
       </div>
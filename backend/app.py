@@ -1,80 +1,94 @@
+import cProfile
 import io
-from datetime import datetime, time
-from flask import Flask, request, jsonify, send_file
+import json
+import os
+import time
+import zipfile
+from flask import Flask, g, request, jsonify, send_file
 from flask_cors import CORS
+import numpy as np
 import pandas as pd
 
-from extractor import extract_schedule_grid
-from monitoring import find_unmatched_records
-from storage import put_extract, get_extract, put_result, get_result, create_session, get_session, update_session
+import metrics
+from extractor import extract_schedule_grid, extract_many, list_valid_sheets
+from monitoring import (
+    render_monitoring_frame,
+    prepare_nilson, PreparedNilson, claim_nilson, channel_partitions, match_partition,
+    match_schedule, render_statuses, ClaimLedger, STATE_COLUMNS, NO_ROW, CLAIM_MODES
+)
+from ingest import read_nilson
+from exporters import (
+    iter_csv, iter_monitoring_csv, iter_full_nilson_csv,
+    extracted_schedule_xlsx, monitoring_workbook_xlsx
+)
+from payloads import FastJSONProvider, gzip_response, preview_payload
+from previews import PAGE_SIZE, query_positions, page_slice
+from storage import (
+    put_extract, get_extract, put_result, get_result, create_session, get_session,
+    add_session_claims, get_session_claims, add_session_job, get_session_jobs, extend_session,
+    get_session_nilson, get_session_claim_mode,
+    put_upload, get_upload, get_job, cache_stats
+)
+from jobs import JobError, no_progress, submit as submit_job
+from workers import run_parallel
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
-# ---------- helpers ----------
+# set to a directory to allow ?profile=1 on any request: the request is run
+# under cProfile and the stats are dumped there (name in X-Profile)
+PROFILE_DIR = os.getenv("PROFILE_DIR")
 
-def make_json_safe(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Convert datetime / date / time objects to strings
-    so Flask jsonify() does not crash.
-    """
-    df = df.copy()
 
-    for col in df.columns:
-        # datetime64 columns
-        if pd.api.types.is_datetime64_any_dtype(df[col]):
-            df[col] = df[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+@app.before_request
+def start_timing():
+    g.request_start = time.perf_counter()
+    metrics.start_request()
+    if PROFILE_DIR and request.args.get("profile") == "1":
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
 
-        # object columns that may contain time objects
-        else:
-            df[col] = df[col].apply(
-                lambda x: x if pd.isnull(x)
-                else x.strftime("%H:%M:%S") if isinstance(x, time)
-                else x.strftime("%Y-%m-%d %H:%M:%S") if isinstance(x, datetime)
-                else x
-            )
 
-    return df
+# registered before compress_response so it runs after it and the total includes gzip
+@app.after_request
+def timing_headers(response):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        name = f"{request.endpoint or 'request'}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{id(profiler):x}.prof"
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+        response.headers["X-Profile"] = name
 
+    elapsed = time.perf_counter() - g.pop("request_start", time.perf_counter())
+    metrics.observe("tsm_request_seconds", elapsed, endpoint=request.endpoint or "unknown",
+                    status=response.status_code)
+    timing = metrics.server_timing(total=elapsed)
+    if timing:
+        response.headers["Server-Timing"] = timing
+        response.headers["Timing-Allow-Origin"] = "*"
+    return response
 
-def df_preview(df: pd.DataFrame, limit=None):
-    df = make_json_safe(df)
-    cols = list(df.columns)
 
-    if limit is None:
-        rows = df.fillna("").to_dict(orient="records")
-    else:
-        rows = df.head(limit).fillna("").to_dict(orient="records")
+@app.after_request
+def compress_response(response):
+    return gzip_response(response, request.headers.get("Accept-Encoding", ""))
 
-    return {
-        "columns": cols,
-        "rows": rows,
-        "totalRows": int(len(df))
-    }
 
-def to_excel_bytes_from_df(df: pd.DataFrame):
-    out = io.BytesIO()
-    export_df = df.copy()
-
-    # prefer Date_dt as Excel date if exists
-    if "Date_dt" in export_df.columns:
-        export_df["Date"] = export_df["Date_dt"]
-
-    export_df = export_df.drop(columns=["Date_dt"], errors="ignore")
+# ---------- helpers ----------
 
-    with pd.ExcelWriter(out, engine="openpyxl") as writer:
-        export_df.to_excel(writer, index=False, sheet_name="Extracted Row Data")
-        ws = writer.book["Extracted Row Data"]
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
-        if "Date" in export_df.columns:
-            date_col_idx = export_df.columns.get_loc("Date") + 1
-            for r in range(2, len(export_df) + 2):
-                cell = ws.cell(row=r, column=date_col_idx)
-                if cell.value:
-                    cell.number_format = "DD/MM/YYYY"
 
-    out.seek(0)
-    return out
+def df_preview(df: pd.DataFrame, limit=None, total_rows=None):
+    """
+    Column-oriented JSON preview of the first `limit` rows (all rows when None).
+    total_rows: row count to report when df is already a page of a larger frame.
+    """
+    total = len(df) if total_rows is None else total_rows
+    if limit is not None:
+        df = df.head(limit)
+    return preview_payload(df, total_rows=total)
 
 
 # ---------- routes ----------
@@ -90,40 +104,143 @@ def schedule_sheets():
     if not f:
         return jsonify({"error": "file is required"}), 400
 
-    import openpyxl
-    tmp = io.BytesIO(f.read())
-    wb = openpyxl.load_workbook(tmp, data_only=True)
-    sheets = [n for n in wb.sheetnames if n != "Final KPIs"]
+    data = f.read()
+    try:
+        sheets = list_valid_sheets(io.BytesIO(data))
+    except (zipfile.BadZipFile, KeyError):
+        return jsonify({"error": "file is not a valid .xlsx workbook"}), 400
+
+    # later extracts reference the cached upload instead of re-uploading it
+    upload_id = put_upload(data)
+
+    return jsonify({"sheets": sheets, "upload_id": upload_id})
 
-    return jsonify({"sheets": sheets})
+
+def _read_upload():
+    """Workbook bytes and upload id from an uploaded file or a cached upload_id."""
+    f = request.files.get("file")
+    if f:
+        data = f.read()
+        return data, put_upload(data)
+
+    upload_id = request.form.get("upload_id", "")
+    data = get_upload(upload_id) if upload_id else None
+    return data, upload_id
+
+
+def _wants_async():
+    return request.form.get("async", "").lower() in ("1", "true")
+
+
+def _wants_diagnostics():
+    # "0"/"false" skips the per-spot "not found" diagnostics for counts-only runs
+    return request.form.get("diagnostics", "1").lower() not in ("0", "false")
+
+
+def _claim_mode():
+    claim_mode = request.form.get("claim_mode", "independent")
+    if claim_mode not in CLAIM_MODES:
+        raise JobError(f"claim_mode must be one of {', '.join(CLAIM_MODES)}")
+    return claim_mode
+
+
+def _accepted(job_id):
+    return jsonify({"job_id": job_id, "state": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+
+
+@app.errorhandler(JobError)
+def job_error(e):
+    return jsonify({"error": str(e)}), e.status
 
 
 @app.post("/api/extract")
 def extract():
-    f = request.files.get("file")
     sheet = request.form.get("sheet", "")
     channel = request.form.get("channel", "")
     advertiser = request.form.get("advertiser", "")
 
-    if not f or not sheet:
-        return jsonify({"error": "file and sheet are required"}), 400
+    if not sheet or not (request.files.get("file") or request.form.get("upload_id")):
+        return jsonify({"error": "file (or upload_id) and sheet are required"}), 400
+
+    data, upload_id = _read_upload()
+    if data is None:
+        return jsonify({"error": "invalid or expired upload"}), 404
 
-    import tempfile
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmpf:
-        tmpf.write(f.read())
-        tmp_path = tmpf.name
+    args = (data, sheet, channel, advertiser, upload_id)
+    if _wants_async():
+        return _accepted(submit_job("extract", _run_extract, *args))
+    return jsonify(_run_extract(no_progress, *args))
 
-    df = extract_schedule_grid(tmp_path, sheet, channel, advertiser)
+
+def _run_extract(progress, data, sheet, channel, advertiser, upload_id):
+    progress("extracting", 5)
+    try:
+        df = extract_schedule_grid(io.BytesIO(data), sheet, channel, advertiser)
+    except (KeyError, ValueError) as e:
+        # unknown sheet, or no schedule grid on it
+        raise JobError(e.args[0] if e.args else str(e), 400) from e
+    progress("storing", 80, rows=int(len(df)))
     token = put_extract(df, meta={
         "sheet": sheet,
         "channel": channel,
         "advertiser": advertiser
     })
 
-    return jsonify({
+    return {
         "token": token,
-        "preview": df_preview(df)
-    })
+        "upload_id": upload_id,
+        "preview": df_preview(df, limit=PAGE_SIZE)
+    }
+
+
+@app.post("/api/extract/batch")
+def extract_batch():
+    """
+    Extract several sheets of one workbook in one request.
+    Form: file or upload_id, specs = JSON [{"sheet", "channel", "advertiser"}],
+    combine = "1" to also store all sheets under one combined token.
+    """
+    try:
+        specs = json.loads(request.form.get("specs", "[]"))
+    except ValueError:
+        return jsonify({"error": "specs must be a JSON list"}), 400
+    if not isinstance(specs, list) or not specs or not all(isinstance(s, dict) and s.get("sheet") for s in specs):
+        return jsonify({"error": "specs must be a non-empty list of {sheet, channel, advertiser}"}), 400
+    if not (request.files.get("file") or request.form.get("upload_id")):
+        return jsonify({"error": "file (or upload_id) is required"}), 400
+
+    data, upload_id = _read_upload()
+    if data is None:
+        return jsonify({"error": "invalid or expired upload"}), 404
+
+    results = extract_many(data, specs)
+
+    items = []
+    frames = []
+    for spec, df in zip(specs, results):
+        item = {
+            "sheet": spec["sheet"],
+            "channel": spec.get("channel", ""),
+            "advertiser": spec.get("advertiser", "")
+        }
+        if isinstance(df, Exception):
+            item["error"] = str(df) or type(df).__name__
+        else:
+            item["token"] = put_extract(df, meta=dict(item))
+            item["preview"] = df_preview(df, limit=PAGE_SIZE)
+            frames.append(df)
+        items.append(item)
+
+    response = {"upload_id": upload_id, "items": items}
+
+    if request.form.get("combine", "") in ("1", "true") and frames:
+        combined = pd.concat(frames, ignore_index=True)
+        response["combinedToken"] = put_extract(combined, meta={
+            "sheets": [i["sheet"] for i in items if "token" in i]
+        })
+        response["combinedTotalRows"] = int(len(combined))
+
+    return jsonify(response)
 
 
 @app.get("/api/extract/download/<token>")
@@ -132,13 +249,11 @@ def download_extracted(token):
     if not item:
         return jsonify({"error": "invalid or expired token"}), 404
 
-    excel_bytes = to_excel_bytes_from_df(item["df"])
-
     return send_file(
-        excel_bytes,
+        extracted_schedule_xlsx(item["df"]),
         as_attachment=True,
         download_name="extracted_schedule.xlsx",
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        mimetype=XLSX_MIMETYPE
     )
 
 
@@ -152,55 +267,409 @@ def monitor():
 
     if not token or not ro_number:
         return jsonify({"error": "token, ro_number are required"}), 400
+    diagnostics = _wants_diagnostics()
+    claim_mode = _claim_mode()
 
     item = get_extract(token)
     if not item:
         return jsonify({"error": "invalid or expired token"}), 404
 
     schedule_df = item["df"].copy()
-    
-    if session_id:
-        sess = get_session(session_id)
-        if not sess:
-            return jsonify({"error": "invalid or expired session"}), 404
-        original_nilson_df = sess["original_nilson_df"]
-        full_nilson_df = sess["full_nilson_df"]
-    else:
-        if not f:
-            return jsonify({"error": "nilson file required for new session"}), 400
-        original_nilson_df = pd.read_excel(f)
-        full_nilson_df = original_nilson_df.copy()
-        if "RO Number" not in full_nilson_df.columns:
-            full_nilson_df["RO Number"] = ""
-        session_id = create_session(original_nilson_df, full_nilson_df)
-
-    unmatched_df, all_df, job_nilson_df = find_unmatched_records(
-        schedule_df, original_nilson_df.copy(), ro_number
+    if f and _wants_async():
+        # the upload stream is gone once the request ends
+        f = io.BytesIO(f.read())
+
+    args = (schedule_df, ro_number, session_id, channel, diagnostics, f, claim_mode)
+    if _wants_async():
+        return _accepted(submit_job("monitor", _run_monitor, *args))
+    return jsonify(_run_monitor(no_progress, *args))
+
+
+def _run_monitor(progress, schedule_df, ro_number, session_id, channel, diagnostics, f, claim_mode):
+    progress("loading nilson", 0)
+    prepared, session_id = _session_nilson(session_id, f, claim_mode)
+    ledger, claim_mode = _session_ledger(session_id, prepared)
+
+    def matching(step, done, total):
+        progress(f"matching pass {step}/3", 10 + 80 * ((step - 1) * total + done) / (3 * max(total, 1)),
+                 rows_done=done, rows_total=total)
+
+    def match(unavailable):
+        return (*match_schedule(schedule_df, prepared, diagnostics=diagnostics, progress=matching,
+                                unavailable=unavailable), None)
+
+    (unmatched_df, all_df, claimed, _), (job_id, summary) = _claim_and_publish(
+        session_id, ro_number, channel, schedule_df, ledger, claim_mode, match
     )
+    job_nilson_df = claim_nilson(prepared, ro_number, claimed)
+
+    return {
+        "session_id": session_id,
+        "job_id": job_id,
+        "summary": summary,
+        # first page only; /api/preview/<job_id> serves the rest
+        "unmatchedPreview": df_preview(
+            render_monitoring_frame(unmatched_df.head(PAGE_SIZE), job_nilson_df), total_rows=len(unmatched_df)
+        ),
+        "nilsonPreview": df_preview(job_nilson_df, limit=PAGE_SIZE)
+    }
+
+
+def _session_nilson(session_id, f, claim_mode="independent"):
+    """
+    (prepared nilson, session_id) for an existing session or a new upload;
+    a new session gets claim_mode, an existing one keeps its own.
+    """
+    if session_id:
+        prepared = get_session_nilson(session_id, _prepared_from_session)
+        if prepared is None:
+            raise JobError("invalid or expired session", 404)
+        return prepared, session_id
+
+    if not f:
+        raise JobError("nilson file required for new session", 400)
+    with metrics.stage("nilson.read"):
+        original_nilson_df = read_nilson(f)
+    # normalize and index the log once; every RO in the session reuses it
+    prepared = prepare_nilson(original_nilson_df)
+    return prepared, create_session(original_nilson_df, prepared, claim_mode)
+
+
+def _prepared_from_session(sess):
+    if "prepared_nilson_df" in sess:
+        return PreparedNilson.from_payload(sess)
+    return prepare_nilson(sess["original_nilson_df"])
+
 
-    mask = job_nilson_df["RO Number"] == ro_number
-    full_nilson_df.loc[mask, "RO Number"] = ro_number
-    update_session(session_id, full_nilson_df)
+def _session_ledger(session_id, prepared):
+    """(ClaimLedger of the claims recorded on the session so far, the session's claim mode)."""
+    claim_mode = get_session_claim_mode(session_id)
+    if claim_mode is None:
+        raise JobError("invalid or expired session", 404)
+    return ClaimLedger(len(prepared.frame), get_session_claims(session_id)), claim_mode
 
-    matched_count = int(mask.sum())
+
+def _result_nilson(item):
+    """A stored result's nilson frame, built from its session and claimed rows."""
+    if "nilson" in item:
+        # results stored before they referenced their session
+        return item["nilson"]
+    prepared, _ = _session_nilson(item["session_id"], None)
+    return claim_nilson(prepared, item["ro_number"], item["claimed"]["position"].to_numpy())
+
+
+# an exclusive run that lost records to a concurrent run is matched again at most this often
+CLAIM_ATTEMPTS = 3
+
+
+def _claim_and_publish(session_id, ro_number, channel, schedule_df, ledger, claim_mode, match, matched=None):
+    """
+    Match one RO with match(unavailable) -> (unmatched_df, all_df, claimed,
+    new_claims as for _publish_job) and publish it; returns (match's
+    result, (job_id, summary)). matched: match's result for the ledger as it
+    is, when already computed.
+
+    In exclusive mode, a run whose records were claimed by a concurrent run
+    since its ledger snapshot is matched again without them; on the last
+    attempt the overlap is recorded and reported as claimConflicts.
+    """
+    exclusive = claim_mode == "exclusive"
+    for attempt in range(1, CLAIM_ATTEMPTS + 1):
+        if matched is None:
+            matched = match(ledger.unavailable(ro_number) if exclusive else None)
+        published = _publish_job(session_id, ro_number, channel, schedule_df, *matched, ledger,
+                                 reject_overlap=exclusive and attempt < CLAIM_ATTEMPTS)
+        if published is not None:
+            return matched, published
+        matched = None
+
+
+def _publish_job(session_id, ro_number, channel, schedule_df, unmatched_df, all_df, claimed, new_claims, ledger,
+                 reject_overlap=False):
+    """
+    Record the RO's claimed nilson rows on the session and in its ledger and
+    store its result; returns (job_id, summary), or None when reject_overlap
+    and a concurrent run claimed some of the rows first (the ledger then has
+    that run's claims).
+    new_claims: the positions not yet claimed on the session when re-running
+    a job, None for all of claimed.
+    """
+    # only this RO's matched rows go back to the session
+    recorded = add_session_claims(
+        session_id, ro_number, claimed if new_claims is None else new_claims,
+        since=ledger.recorded, reject_overlap=reject_overlap,
+    )
+    if recorded is None:
+        raise JobError("session expired while monitoring", 404)
+    count, newer = recorded
+    # claims of runs that published on the session after the ledger was read
+    for other_ro, positions in newer:
+        ledger.record(other_ro, positions)
+    if count is None:
+        return None
+    # records this RO shares with ROs claimed before it, racing runs included
+    conflicts = ledger.record(ro_number, claimed)
 
     summary = {
         "channel": channel,
         "roNumber": ro_number,
         "totalScheduleSpots": int(len(schedule_df)),
         "totalUnmatched": int(len(unmatched_df)),
-        "totalMatchedInNilson": matched_count
+        "totalMatchedInNilson": int(len(claimed)),
+        "claimConflicts": conflicts,
+        "totalClaimConflicts": sum(conflicts.values()),
     }
 
-    job_id = put_result(unmatched_df, all_df, job_nilson_df, summary=summary)
+    job_id = put_result(unmatched_df, all_df, session_id, ro_number, claimed, summary=summary)
+    add_session_job(session_id, job_id, ro_number, channel)
+    return job_id, summary
 
-    return jsonify({
-        "session_id": session_id,
-        "job_id": job_id,
-        "summary": summary,
-        "unmatchedPreview": df_preview(unmatched_df),
-        "nilsonPreview": df_preview(job_nilson_df)
+
+@app.post("/api/monitor/session/<session_id>/append")
+def append_nilson(session_id):
+    """
+    Extend a session's nilson log with new rows (e.g. the next days' log) and
+    bring its jobs up to date without re-running them from scratch.
+    Form: nilson file, diagnostics as for /api/monitor, async.
+
+    Existing rows keep their positions, so earlier matches stay as they are;
+    only unmatched spots in the buckets (advertiser, channel, date, duration)
+    that received new rows are matched again. The extended log is a new
+    session (returned session_id) holding the old session's claims; every
+    job of the old session is republished on it under a new job_id.
+    """
+    f = request.files.get("nilson")
+    if not f:
+        return jsonify({"error": "nilson file required"}), 400
+    diagnostics = _wants_diagnostics()
+
+    if _wants_async():
+        f = io.BytesIO(f.read())
+        return _accepted(submit_job("append", _run_append, session_id, f, diagnostics))
+    return jsonify(_run_append(no_progress, session_id, f, diagnostics))
+
+
+def _run_append(progress, session_id, f, diagnostics):
+    progress("loading nilson", 0)
+    prepared, _ = _session_nilson(session_id, None)
+    with metrics.stage("nilson.read"):
+        appended_df = read_nilson(f)
+    prepared, touched = prepared.appended(appended_df)
+    ledger, claim_mode = _session_ledger(session_id, prepared)
+    new_session_id = extend_session(session_id, prepared, len(prepared.frame) - len(appended_df), claim_mode)
+    if new_session_id is None:
+        raise JobError("invalid or expired session", 404)
+
+    session_jobs = get_session_jobs(session_id)
+    jobs = []
+    for n, (previous_job_id, entry) in enumerate(session_jobs.items()):
+        progress(f"re-monitoring {n + 1}/{len(session_jobs)}", 10 + 80 * n / len(session_jobs))
+        ro_number, channel = entry["roNumber"], entry["channel"]
+        job = {"roNumber": ro_number, "channel": channel, "previousJobId": previous_job_id}
+        item = get_result(previous_job_id)
+        if not item:
+            job["error"] = "invalid or expired job"
+            jobs.append(job)
+            continue
+
+        previous = item["all"]
+        schedule_df = previous.drop(columns=STATE_COLUMNS)
+        earlier = previous["Aired_Nilson_Row"].to_numpy()
+
+        def match(unavailable):
+            unmatched_df, all_df, claimed = match_schedule(
+                schedule_df, prepared, diagnostics=diagnostics, previous=previous, only_keys=touched,
+                unavailable=unavailable
+            )
+            return unmatched_df, all_df, claimed, np.setdiff1d(claimed, earlier[earlier != NO_ROW])
+
+        (_, _, _, new_claims), (job["job_id"], job["summary"]) = _claim_and_publish(
+            new_session_id, ro_number, channel, schedule_df, ledger, claim_mode, match
+        )
+        job["newlyMatched"] = int(len(new_claims))
+        jobs.append(job)
+
+    return {
+        "session_id": new_session_id,
+        "previousSessionId": session_id,
+        "appendedRows": int(len(appended_df)),
+        "totalRows": int(len(prepared.frame)),
+        "affectedBuckets": len(touched),
+        "jobs": jobs,
+    }
+
+
+@app.post("/api/monitor/batch")
+def monitor_batch():
+    """
+    Monitor several ROs against one nilson log in one request.
+    Form: items = JSON [{"token", "ro_number", "channel"}], session_id or nilson file,
+    diagnostics and claim_mode as for /api/monitor.
+
+    Items are grouped by the channels their spots air on and the groups are
+    matched on the worker pool; claims are recorded in item order, so the
+    jobs and the session end up as with one /api/monitor call per item.
+    """
+    try:
+        specs = json.loads(request.form.get("items", "[]"))
+    except ValueError:
+        return jsonify({"error": "items must be a JSON list"}), 400
+    if not isinstance(specs, list) or not specs or not all(
+        isinstance(s, dict) and s.get("token") and s.get("ro_number") for s in specs
+    ):
+        return jsonify({"error": "items must be a non-empty list of {token, ro_number, channel}"}), 400
+    diagnostics = _wants_diagnostics()
+    claim_mode = _claim_mode()
+
+    schedules = []
+    for spec in specs:
+        item = get_extract(spec["token"])
+        if not item:
+            return jsonify({"error": f"invalid or expired token: {spec['token']}"}), 404
+        schedules.append(item["df"])
+
+    prepared, session_id = _session_nilson(
+        request.form.get("session_id", ""), request.files.get("nilson"), claim_mode
+    )
+    ledger, claim_mode = _session_ledger(session_id, prepared)
+
+    partitions = channel_partitions(schedules)
+    # exclusive claims: each partition continues from the session's ledger
+    partition_ledger = ledger if claim_mode == "exclusive" else None
+    outputs = run_parallel(match_partition, [
+        (prepared, [schedules[i] for i in part], diagnostics, partition_ledger,
+         [specs[i]["ro_number"] for i in part])
+        for part in partitions
+    ])
+    matched = {}
+    for part, output in zip(partitions, outputs):
+        for i in part:
+            matched[i] = output if isinstance(output, Exception) else output[part.index(i)]
+
+    jobs = []
+    for i, spec in enumerate(specs):
+        ro_number = spec["ro_number"]
+        channel = spec.get("channel") or "Unknown Channel"
+        job = {"roNumber": ro_number, "channel": channel, "token": spec["token"]}
+        if isinstance(matched[i], Exception):
+            job["error"] = str(matched[i]) or type(matched[i]).__name__
+        else:
+            def match(unavailable, schedule_df=schedules[i]):
+                return (*match_schedule(schedule_df, prepared, diagnostics, unavailable=unavailable), None)
+
+            _, (job["job_id"], job["summary"]) = _claim_and_publish(
+                session_id, ro_number, channel, schedules[i], ledger, claim_mode, match, (*matched[i], None)
+            )
+        jobs.append(job)
+
+    return jsonify({"session_id": session_id, "jobs": jobs})
+
+
+@app.get("/api/jobs/<job_id>")
+def job_status(job_id):
+    """State, stage and percent of an async extract/monitor run; the response body once done."""
+    status = get_job(job_id)
+    if not status:
+        return jsonify({"error": "invalid or expired job"}), 404
+    return jsonify(status)
+
+
+@app.get("/api/metrics")
+def prometheus_metrics():
+    """Stage, Redis and request histograms of this process, in the Prometheus text format."""
+    stats = cache_stats()
+    text = metrics.render_prometheus(extra={
+        "tsm_cache_hits_total": ("counter", "Storage cache hits", stats["hits"]),
+        "tsm_cache_misses_total": ("counter", "Storage cache misses", stats["misses"]),
+        "tsm_cache_evictions_total": ("counter", "Storage cache evictions", stats["evictions"]),
+        "tsm_cache_bytes": ("gauge", "Bytes held by the storage cache", stats["bytes"]),
+        "tsm_cache_entries": ("gauge", "Entries held by the storage cache", stats["entries"]),
     })
+    return app.response_class(text, mimetype="text/plain; version=0.0.4")
+
+
+@app.get("/api/cache/stats")
+def storage_cache_stats():
+    """Hit/miss/eviction counters of this process's storage cache."""
+    return jsonify(cache_stats())
+
+
+@app.get("/api/preview/<key>")
+def preview_page(key):
+    """
+    One page of a stored extract (extract:<id>) or monitoring result
+    (result:<id>, which = unmatched | all | nilson).
+    Query: page, page_size, sort, order = asc | desc, filters = JSON {column: text},
+    date_from, date_to.
+    """
+    try:
+        filters = json.loads(request.args.get("filters") or "{}")
+        page = int(request.args.get("page", 1))
+        page_size = int(request.args.get("page_size", PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "page and page_size must be integers, filters a JSON object"}), 400
+    if not isinstance(filters, dict):
+        return jsonify({"error": "filters must be a JSON object"}), 400
+    sort = request.args.get("sort") or None
+    descending = request.args.get("order", "asc").lower() == "desc"
+    try:
+        date_from, date_to = _query_date("date_from"), _query_date("date_to")
+    except ValueError:
+        return jsonify({"error": "date_from and date_to must be dates"}), 400
+
+    nilson_df = None
+    if key.startswith("extract:"):
+        item = get_extract(key)
+        if not item:
+            return jsonify({"error": "invalid or expired token"}), 404
+        df = item["df"]
+    elif key.startswith("result:"):
+        item = get_result(key)
+        if not item:
+            return jsonify({"error": "invalid or expired job"}), 404
+        which = request.args.get("which", "unmatched")
+        if which not in ("unmatched", "all", "nilson"):
+            return jsonify({"error": "which must be unmatched, all, or nilson"}), 400
+        nilson = _result_nilson(item)
+        df = nilson if which == "nilson" else item[which]
+        if which != "nilson":
+            nilson_df = nilson
+    else:
+        return jsonify({"error": "unknown preview key"}), 404
+
+    view = df
+    if nilson_df is not None:
+        # result frames hold status codes; render the text only where it is queried
+        view = df.drop(columns=STATE_COLUMNS)
+        if filters.get("Aired_Status") or sort == "Aired_Status":
+            view["Aired_Status"] = render_statuses(df)
+
+    positions = query_positions(view, filters, sort, descending, date_from, date_to)
+    page, page_size, start, stop, page_count = page_slice(len(positions), page, page_size)
+
+    rows = df.iloc[positions[start:stop]]
+    if nilson_df is not None:
+        rows = render_monitoring_frame(rows, nilson_df)
+
+    out = df_preview(rows, total_rows=len(df))
+    out.update({
+        "filteredRows": int(len(positions)),
+        "page": page,
+        "pageSize": page_size,
+        "pageCount": page_count
+    })
+    return jsonify(out)
+
+
+def _query_date(name):
+    """Timestamp of query arg name, None when absent; ValueError when it is not a date."""
+    text = request.args.get(name)
+    if not text:
+        return None
+    value = pd.Timestamp(text)
+    if value is pd.NaT:
+        raise ValueError(f"{name} is not a date")
+    return value
 
 
 @app.get("/api/monitor/download/<job_id>/<which>")
@@ -214,23 +683,28 @@ def download_monitor_files(job_id, which):
     ro_number = summary.get("roNumber", "Unknown_RO").replace(" ", "_")
     prefix = f"{ro_number}_{channel}"
 
+    if which not in ("unmatched", "all", "nilson", "xlsx"):
+        return jsonify({"error": "which must be unmatched, all, nilson, or xlsx"}), 400
+    nilson_df = _result_nilson(item)
+
     if which == "unmatched":
-        df = item["unmatched"]
+        chunks = iter_monitoring_csv(item["unmatched"], nilson_df)
         name = f"{prefix}_unmatched_data.csv"
     elif which == "all":
-        df = item["all"]
+        chunks = iter_monitoring_csv(item["all"], nilson_df)
         name = f"{prefix}_all_schedule_data.csv"
     elif which == "nilson":
-        df = item["nilson"]
+        chunks = iter_csv(nilson_df)
         name = f"{prefix}_nilson.csv"
     else:
-        return jsonify({"error": "which must be unmatched, all, or nilson"}), 400
-
-    buf = io.BytesIO()
-    df.to_csv(buf, index=False, encoding="utf-8-sig")
-    buf.seek(0)
+        return send_file(
+            monitoring_workbook_xlsx({**item, "nilson": nilson_df}),
+            as_attachment=True,
+            download_name=f"{prefix}_monitoring.xlsx",
+            mimetype=XLSX_MIMETYPE
+        )
 
-    return send_file(buf, as_attachment=True, download_name=name, mimetype="text/csv")
+    return _csv_download(chunks, name)
 
 
 @app.get("/api/monitor/download/session/<session_id>/full_nilson")
@@ -238,14 +712,16 @@ def download_session_full_nilson(session_id):
     sess = get_session(session_id)
     if not sess:
         return jsonify({"error": "invalid or expired session"}), 404
-        
-    df = sess["full_nilson_df"]
-    
-    buf = io.BytesIO()
-    df.to_csv(buf, index=False, encoding="utf-8-sig")
-    buf.seek(0)
-
-    return send_file(buf, as_attachment=True, download_name="full_nilson.csv", mimetype="text/csv")
+
+    chunks = iter_full_nilson_csv(sess["original_nilson_df"], get_session_claims(session_id))
+    return _csv_download(chunks, "full_nilson.csv")
+
+
+def _csv_download(chunks, name):
+    """Stream CSV chunks as an attachment, sent as they are produced."""
+    response = app.response_class(chunks, mimetype="text/csv")
+    response.headers.set("Content-Disposition", "attachment", filename=name)
+    return response
 
 
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+"""
+Benchmarks for extraction, matching, previews, exports and storage on synthetic data.
+
+    python benchmark.py [--scale N] [--repeat N] [--output results.json] [--compare old.json]
+
+Every case runs `repeat` times and reports min/median/mean seconds; the JSON
+written with --output can be passed to --compare from another checkout to
+print the ratio per case. Storage runs against fakeredis unless --redis is
+given, in which case REDIS_URL is used.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import synthetic
+from exporters import extracted_schedule_xlsx, iter_csv, iter_full_nilson_csv, iter_monitoring_csv, monitoring_workbook_xlsx
+from extractor import extract_schedule_grid
+from ingest import read_nilson
+from monitoring import find_unmatched_records, prepare_nilson, render_monitoring_frame
+from payloads import preview_payload
+
+CASES = []
+
+
+def case(name):
+    def register(fn):
+        CASES.append((name, fn))
+        return fn
+    return register
+
+
+def _drain(chunks):
+    return sum(len(c) for c in chunks)
+
+
+def _read(f):
+    data = f.read()
+    f.close()
+    return len(data)
+
+
+class Data:
+    """Inputs shared by the cases, built once per scale."""
+
+    def __init__(self, scale):
+        self.workbook = synthetic.schedule_workbook(programs=60 * scale, months=((2026, 1), (2026, 2)), seed=1)
+        self.schedule = extract_schedule_grid(io.BytesIO(self.workbook), "Sheet 1", "TV One", "AcmeCo")
+        self.nilson = pd.concat([
+            synthetic.nilson_for_schedule(self.schedule, aired=0.8, seed=2),
+            synthetic.nilson_log(50_000 * scale, seed=3),
+        ], ignore_index=True)
+        self.nilson_csv = self.nilson.to_csv(index=False).encode("utf-8")
+        self.prepared = prepare_nilson(self.nilson)
+        self.unmatched, self.all, self.job_nilson = find_unmatched_records(self.schedule, self.prepared, "RO1")
+        self.result = {"unmatched": self.unmatched, "all": self.all, "nilson": self.job_nilson, "summary": {}}
+        self.claims = [("RO1", np.flatnonzero((self.job_nilson["RO Number"] == "RO1").to_numpy()))]
+
+
+# ---------- extraction and ingest ----------
+
+@case("extract_schedule_grid")
+def _(d):
+    return extract_schedule_grid(io.BytesIO(d.workbook), "Sheet 1", "TV One", "AcmeCo")
+
+
+@case("read_nilson_csv")
+def _(d):
+    return read_nilson(io.BytesIO(d.nilson_csv))
+
+
+# ---------- matching ----------
+
+@case("prepare_nilson")
+def _(d):
+    return prepare_nilson(d.nilson)
+
+
+@case("find_unmatched_records")
+def _(d):
+    return find_unmatched_records(d.schedule, d.prepared, "RO1")
+
+
+@case("find_unmatched_records_no_diagnostics")
+def _(d):
+    return find_unmatched_records(d.schedule, d.prepared, "RO1", diagnostics=False)
+
+
+# ---------- previews ----------
+
+@case("df_preview_all")
+def _(d):
+    return preview_payload(render_monitoring_frame(d.all, d.job_nilson))
+
+
+@case("df_preview_nilson")
+def _(d):
+    return preview_payload(d.job_nilson)
+
+
+# ---------- exports ----------
+
+@case("csv_nilson")
+def _(d):
+    return _drain(iter_csv(d.job_nilson))
+
+
+@case("csv_monitoring_all")
+def _(d):
+    return _drain(iter_monitoring_csv(d.all, d.job_nilson))
+
+
+@case("csv_full_nilson")
+def _(d):
+    return _drain(iter_full_nilson_csv(d.nilson, d.claims))
+
+
+@case("xlsx_extracted_schedule")
+def _(d):
+    return _read(extracted_schedule_xlsx(d.schedule))
+
+
+@case("xlsx_monitoring_workbook")
+def _(d):
+    return _read(monitoring_workbook_xlsx(d.result))
+
+
+# ---------- storage ----------
+
+@case("storage_result_roundtrip")
+def _(d):
+    import storage
+    job_id = storage.put_result(d.unmatched, d.all, "session:bench", "RO1", d.claims[0][1])
+    storage.cache.clear()
+    return storage.get_result(job_id)
+
+
+@case("storage_session_roundtrip")
+def _(d):
+    import storage
+    session_id = storage.create_session(d.nilson, d.prepared)
+    storage.cache.clear()
+    return storage.get_session(session_id)
+
+
+@case("storage_result_cached")
+def _(d):
+    import storage
+    job_id = storage.put_result(d.unmatched, d.all, "session:bench", "RO1", d.claims[0][1])
+    return storage.get_result(job_id)
+
+
+def _use_redis(real):
+    os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+    import storage
+    if not real:
+        import fakeredis
+        storage.r = fakeredis.FakeRedis()
+
+
+def _timed(fn, d, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(d)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(scale=1, repeat=3, only=None):
+    setup = time.perf_counter()
+    d = Data(scale)
+    report = {
+        "meta": {
+            "revision": _revision(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "scale": scale,
+            "repeat": repeat,
+            "scheduleRows": int(len(d.schedule)),
+            "nilsonRows": int(len(d.nilson)),
+            "setupSeconds": round(time.perf_counter() - setup, 4),
+        },
+        "results": {},
+    }
+    for name, fn in CASES:
+        if only and not any(o in name for o in only):
+            continue
+        times = _timed(fn, d, repeat)
+        report["results"][name] = {
+            "min": round(min(times), 6),
+            "median": round(statistics.median(times), 6),
+            "mean": round(statistics.fmean(times), 6),
+        }
+    return report
+
+
+def compare(report, baseline):
+    """Lines of median time now vs baseline, per case present in both."""
+    lines = []
+    for name, now in report["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        ratio = now["median"] / before["median"] if before["median"] else float("inf")
+        lines.append(f"{name:40s} {before['median']:10.4f}s -> {now['median']:10.4f}s  x{ratio:.2f}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="multiplies schedule programs and nilson rows")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="run the cases whose name contains any of these")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="JSON report from an earlier run to compare against")
+    parser.add_argument("--redis", action="store_true", help="use REDIS_URL instead of fakeredis")
+    args = parser.parse_args(argv)
+
+    _use_redis(args.redis)
+    report = run(args.scale, args.repeat, args.only)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            print("\n".join(compare(report, json.load(fh))), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Per-process LRU cache for the deserialized payloads storage.py reads from Redis.
+
+Entries are charged their in-memory size (payload_size) against a byte
+budget and expire when the Redis key would. Cached payloads are shared between requests,
+so callers treat them as read-only (copy a frame before changing it).
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def payload_size(value):
+    """
+    Bytes a cached value holds in memory: frames by memory_usage(deep=True),
+    dicts by their values. Compressed blobs are several times smaller than
+    the frames they decode to, so the blob length is not a usable measure.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(payload_size(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, expires_at or None)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """The cached value, or None on a miss (absent or expired)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, _, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, size, ttl=None):
+        """Cache value for ttl seconds (None: no local expiry); too-large values are not kept."""
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes or (ttl is not None and ttl <= 0):
+                return
+            expires_at = time.monotonic() + ttl if ttl is not None else None
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def touch(self, key, ttl):
+        """Push an entry's expiry out to ttl seconds from now, following a Redis EXPIRE."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1], time.monotonic() + ttl)
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,222 @@
+"""
+Streaming exports for the download endpoints.
+
+CSV is written a chunk of rows at a time from the stored frame, so only one
+chunk of rendered rows and CSV text is alive at once however long the frame.
+Excel goes through an xlsxwriter workbook in constant_memory mode the same
+way: rows are written a chunk at a time and each row's XML goes to a temp
+file as soon as the next one starts.
+"""
+import json
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from monitoring import claim_owners, render_monitoring_frame
+
+CSV_CHUNK_ROWS = 5000
+
+# what to_csv(encoding="utf-8-sig") puts in front of the file
+BOM = "\ufeff".encode("utf-8")
+
+
+def iter_csv(df: pd.DataFrame, transform=None, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Yield df as utf-8-sig CSV bytes, identical to df.to_csv(index=False,
+    encoding="utf-8-sig"). transform(chunk, start) -> frame is applied to
+    each slice of rows (starting at position `start`) before it is written.
+    """
+    yield BOM
+    starts = range(0, len(df), chunk_rows) if len(df) else [0]
+    for start in starts:
+        chunk = df.iloc[start:start + chunk_rows]
+        if transform is not None:
+            chunk = transform(chunk, start)
+        yield chunk.to_csv(index=False, header=start == 0).encode("utf-8")
+
+
+def iter_monitoring_csv(df: pd.DataFrame, nilson_df: pd.DataFrame, chunk_rows=CSV_CHUNK_ROWS):
+    """Unmatched/all result frame as CSV, rendered chunk by chunk."""
+    return iter_csv(df, lambda chunk, start: render_monitoring_frame(chunk, nilson_df), chunk_rows)
+
+
+def iter_full_nilson_csv(original_nilson: pd.DataFrame, claims, chunk_rows=CSV_CHUNK_ROWS):
+    """Session full_nilson as CSV: the original log with "RO Number" from claim_owners, a chunk at a time."""
+    owners = claim_owners(original_nilson, claims)
+
+    def with_owners(chunk, start):
+        return chunk.assign(**{"RO Number": owners[start:start + len(chunk)]})
+
+    return iter_csv(original_nilson, with_owners, chunk_rows)
+
+
+# --- Excel ---
+
+XLSX_CHUNK_ROWS = 5000
+DATE_FORMAT = "DD/MM/YYYY"
+DATETIME_FORMAT = "YYYY-MM-DD HH:MM:SS"  # what pandas' to_excel uses
+# what openpyxl gave datetime.date, datetime.time and datetime cells
+TIME_FORMAT = "h:mm:ss"
+OBJECT_FORMATS = {"date": "yyyy-mm-dd", "datetime": "yyyy-mm-dd h:mm:ss"}
+
+# workbooks below this stay in memory, larger ones spill to a temp file
+XLSX_SPOOL_BYTES = 16 * 1024 * 1024
+
+WORKBOOK_OPTIONS = {
+    "constant_memory": True,
+    # datetime cells without a column format, e.g. in an object column
+    "default_date_format": DATETIME_FORMAT,
+    # cell text is data: "=..." is not a formula, "http..." not a link
+    "strings_to_formulas": False,
+    "strings_to_urls": False,
+    "nan_inf_to_errors": True,
+}
+
+
+def new_workbook():
+    """Workbook for write_sheet, written into a spooled temp file by save_workbook."""
+    return xlsxwriter.Workbook(tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_BYTES), WORKBOOK_OPTIONS)
+
+
+def _excel_values(s: pd.Series) -> np.ndarray:
+    """Cell values for one column: native Python scalars, None for missing cells."""
+    values = s.to_numpy(dtype=object).copy()
+    values[s.isna().to_numpy()] = None
+    return values
+
+
+def _excel_serials(s: pd.Series) -> np.ndarray:
+    """datetime64 column as Excel 1900-system serial day numbers, None for NaT."""
+    if getattr(s.dt, "tz", None) is not None:
+        s = s.dt.tz_localize(None)
+    days = (s - pd.Timestamp(1899, 12, 31)) / pd.Timedelta(days=1)
+    # Excel counts the 29/02/1900 that never was
+    days = days.where(days <= 59, days + 1)
+    return _excel_values(days)
+
+
+def _day_fractions(values) -> np.ndarray:
+    out = np.full(len(values), None, dtype=object)
+    for i, t in enumerate(values):
+        if t is not None:
+            out[i] = (t.hour * 3600 + t.minute * 60 + t.second + t.microsecond / 1e6) / 86400
+    return out
+
+
+def _column_cells(ws, s: pd.Series, is_date):
+    """
+    (write method, values, number format) for one column. Dates and times
+    become serial numbers here, a column at a time, so each cell is a single
+    write_number instead of a per-cell datetime conversion.
+    """
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return ws.write_number, _excel_serials(s), DATE_FORMAT if is_date else DATETIME_FORMAT
+    values = _excel_values(s)
+    fmt = DATE_FORMAT if is_date else None
+    if pd.api.types.is_bool_dtype(s):
+        return ws.write_boolean, values, fmt
+    if pd.api.types.is_numeric_dtype(s):
+        return ws.write_number, values, fmt
+    if pd.api.types.is_string_dtype(s) and s.dtype != object:
+        values[values == ""] = None  # blank, as ws.write would leave it
+        return ws.write_string, values, fmt
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == "time":
+        return ws.write_number, _day_fractions(values), fmt or TIME_FORMAT
+    if kind in ("date", "datetime"):
+        return ws.write_number, _excel_serials(pd.Series(pd.to_datetime(values))), fmt or OBJECT_FORMATS[kind]
+    # anything else goes through xlsxwriter's own type dispatch
+    return ws.write, values, fmt
+
+
+def _write_rows(wb, ws, df: pd.DataFrame, first_row, date_columns, formats):
+    cells = []
+    for j, col in enumerate(df.columns):
+        write, values, fmt = _column_cells(ws, df.iloc[:, j], col in date_columns)
+        if fmt is not None and fmt not in formats:
+            formats[fmt] = wb.add_format({"num_format": fmt})
+        cells.append((j, write, values, formats.get(fmt)))
+
+    for i in range(len(df)):
+        r = first_row + i
+        for j, write, values, fmt in cells:
+            if values[i] is not None:
+                write(r, j, values[i], fmt)
+
+
+def write_sheet(wb, title, df: pd.DataFrame, transform=None, date_columns=("Date",),
+                chunk_rows=XLSX_CHUNK_ROWS):
+    """
+    Write df to a new sheet of a new_workbook(), chunk_rows rows at a time;
+    transform(chunk, start) -> frame as for iter_csv. Cells of date_columns
+    get DD/MM/YYYY, other datetime columns the pandas format.
+    """
+    ws = wb.add_worksheet(title[:31])
+    formats = {}
+    starts = range(0, len(df), chunk_rows) if len(df) else [0]
+    for start in starts:
+        chunk = df.iloc[start:start + chunk_rows]
+        if transform is not None:
+            chunk = transform(chunk, start)
+        if start == 0:
+            ws.write_row(0, 0, [str(c) for c in chunk.columns])
+        _write_rows(wb, ws, chunk, start + 1, date_columns, formats)
+    return ws
+
+
+def save_workbook(wb):
+    """Finished workbook as a file object positioned at 0."""
+    wb.close()
+    out = wb.filename  # the file object new_workbook passed in
+    out.seek(0)
+    return out
+
+
+def schedule_for_excel(chunk: pd.DataFrame, start=0) -> pd.DataFrame:
+    """Schedule frames export the parsed Date_dt as the Date column."""
+    if "Date_dt" not in chunk.columns:
+        return chunk
+    out = chunk.drop(columns=["Date_dt"])
+    if "Date" in out.columns:
+        out["Date"] = chunk["Date_dt"]
+    return out
+
+
+def extracted_schedule_xlsx(df: pd.DataFrame):
+    wb = new_workbook()
+    write_sheet(wb, "Extracted Row Data", df, schedule_for_excel)
+    return save_workbook(wb)
+
+
+def monitoring_workbook_xlsx(item: dict):
+    """One workbook for a monitoring job: unmatched, all schedule data, nilson and summary."""
+    nilson_df = item["nilson"]
+
+    def rendered(chunk, start):
+        return schedule_for_excel(render_monitoring_frame(chunk, nilson_df))
+
+    wb = new_workbook()
+    write_sheet(wb, "Unmatched", item["unmatched"], rendered)
+    write_sheet(wb, "All Schedule Data", item["all"], rendered)
+    write_sheet(wb, "Nilson", nilson_df)
+    write_sheet(wb, "Summary", summary_frame(item.get("summary", {})))
+    return save_workbook(wb)
+
+
+def summary_frame(summary: dict) -> pd.DataFrame:
+    """
+    Field/Value rows of a job summary; a dict value (claimConflicts) becomes
+    one row per entry, named "<field>: <key>", other non-scalars JSON text.
+    """
+    fields, values = [], []
+    for field, value in summary.items():
+        if isinstance(value, dict):
+            for key, inner in value.items():
+                fields.append(f"{field}: {key}")
+                values.append(inner)
+            continue
+        fields.append(field)
+        values.append(value if value is None or np.isscalar(value) else json.dumps(value, default=str))
+    return pd.DataFrame({"Field": fields, "Value": values}, dtype=object)
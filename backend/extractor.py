@@ -1,6 +1,16 @@
+import io
+import posixpath
+import re
+import zipfile
 from datetime import datetime
+from xml.etree import ElementTree
+
+import numpy as np
 import openpyxl
 import pandas as pd
+from openpyxl.utils.cell import range_boundaries
+
+import metrics
 
 COL_MAP = {
     "program": "program",
@@ -18,17 +28,88 @@ OUTPUT_HEADERS = [
 ]
 
 
-def get_merged_value(sheet, row, col):
-    cell = sheet.cell(row=row, column=col)
-    for merged_range in sheet.merged_cells.ranges:
-        if cell.coordinate in merged_range:
-            return sheet.cell(row=merged_range.min_row, column=merged_range.min_col).value
-    return cell.value
+# --- workbook internals read straight from the xlsx archive ---
+
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_MERGE_CELL_RE = re.compile(rb'<(?:\w+:)?mergeCell\b[^>]*?\bref="([^"]+)"')
+
+
+def _sheet_paths(archive: zipfile.ZipFile) -> dict:
+    """Sheet name -> worksheet part inside the archive, in workbook order."""
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {}
+    for rel in rels.iter(f"{_NS_PKG_REL}Relationship"):
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            target = target.lstrip("/")
+        else:
+            target = posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = target
+
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    return {
+        sheet.get("name"): targets.get(sheet.get(f"{_NS_REL}id"))
+        for sheet in workbook.iter(f"{_NS_MAIN}sheet")
+    }
+
+
+def _merged_ranges(archive: zipfile.ZipFile, sheet_path: str) -> list:
+    """
+    (min_col, min_row, max_col, max_row) of every merged range of a sheet.
+    Read-only worksheets do not expose merges, so the <mergeCell> refs are
+    scanned from the raw sheet xml in chunks without parsing the cells.
+    """
+    ranges = []
+    tail = b""
+    with archive.open(sheet_path) as src:
+        while True:
+            chunk = src.read(1 << 20)
+            if not chunk:
+                break
+            buf = tail + chunk
+            last_end = 0
+            for m in _MERGE_CELL_RE.finditer(buf):
+                ranges.append(range_boundaries(m.group(1).decode()))
+                last_end = m.end()
+            tail = buf[max(last_end, len(buf) - 256):]
+    return ranges
+
+
+def _merged_blanks(ranges) -> dict:
+    """
+    row -> [(first_col, last_col)] of merged cells that are not the top-left
+    cell of their range; these read as empty, as in a fully loaded sheet.
+    """
+    blanks = {}
+    for min_col, min_row, max_col, max_row in ranges:
+        if min_col < max_col:
+            blanks.setdefault(min_row, []).append((min_col + 1, max_col))
+        for r in range(min_row + 1, max_row + 1):
+            blanks.setdefault(r, []).append((min_col, max_col))
+    return blanks
+
+
+def _clean_row(values, spans):
+    if not spans:
+        return values
+    values = list(values)
+    for first, last in spans:
+        for c in range(first, min(last, len(values)) + 1):
+            values[c - 1] = None
+    return values
+
 
+def _at(values, col):
+    return values[col - 1] if col <= len(values) else None
 
-def list_valid_sheets(xlsx_path: str):
-    wb = openpyxl.load_workbook(xlsx_path, data_only=True)
-    names = [n for n in wb.sheetnames if n != "Final KPIs"]
+
+def list_valid_sheets(xlsx_path):
+    # sheet names come from the workbook manifest, no sheet is parsed
+    with zipfile.ZipFile(xlsx_path) as archive:
+        names = [n for n in _sheet_paths(archive) if n != "Final KPIs"]
     return names
 
 def normalize_month_year(raw):
@@ -64,87 +145,134 @@ def normalize_month_year(raw):
         return None
 
 
-def extract_schedule_grid(xlsx_path: str, sheet_name: str, channel: str, advertiser: str) -> pd.DataFrame:
-    wb = openpyxl.load_workbook(xlsx_path, data_only=True)
-    sheet = wb[sheet_name]
-
-    # 1) find header row containing "Program" in col A (rows 1..24)
-    header_row = None
-    indices = {}
-
-    for r in range(1, 25):
-        v = sheet.cell(row=r, column=1).value
-        if v is None:
-            continue
-        if "program" in str(v).lower():
-            header_row = r
-            break
-
-    if not header_row:
-        raise ValueError("Could not find program header row.")
-
-    # 2) map fixed columns A-R (1..18)
-    for c in range(1, 19):
-        cell_val = sheet.cell(row=header_row, column=c).value
-        cell_val = "" if cell_val is None else str(cell_val).lower()
-        for key, target in COL_MAP.items():
-            if target in cell_val:
-                indices[key] = c
-
-    # 3) map date columns starting from S (19)
-    month_row = header_row - 3
-    date_num_row = header_row - 1
-    date_cols = {}
-
-    for c in range(19, sheet.max_column + 1):
-        d_num = sheet.cell(row=date_num_row, column=c).value
-        if d_num is None:
-            break
-        raw_month = get_merged_value(sheet, month_row, c)
-        m_year = normalize_month_year(raw_month)
-        date_cols[c] = f"{d_num} {m_year}"  # e.g. "21 Jan - 2026"
-
-    rows = []
-
-    # 4) extract one entry per spot
-    for r in range(header_row + 1, sheet.max_row + 1):
-        prog = sheet.cell(row=r, column=indices.get("program", 1)).value
-        if not prog:
-            continue
-        prog_s = str(prog).lower()
-        if any(x in prog_s for x in ["total", "benefit", "bonus", "commercial"]):
-            continue
-
-        for col_idx, date_str in date_cols.items():
-            spot_count = sheet.cell(row=r, column=col_idx).value
-            if spot_count and isinstance(spot_count, (int, float)) and spot_count > 0:
-                for _ in range(int(spot_count)):
-                    rows.append({
-                        "Program": prog,
-                        "Commercial Name": sheet.cell(row=r, column=indices.get("com_name", 2)).value,
-                        "Dur": sheet.cell(row=r, column=indices.get("duration", 3)).value,
-                        "Language": sheet.cell(row=r, column=indices.get("language", 4)).value,
-                        "Time": sheet.cell(row=r, column=indices.get("time", 6)).value,
-                        "Date": date_str,
-                        "Rate Card Rate": sheet.cell(row=r, column=indices.get("rate_card", 8)).value,
-                        "Negotiated Rate": sheet.cell(row=r, column=indices.get("negotiated", 9)).value,
-                        "Channel": channel,
-                        "Advertiser": advertiser
-                    })
-
-    df = pd.DataFrame(rows)
-
-    # Normalize Date: parse "21 Jan - 2026" -> datetime, but keep as datetime for Excel formatting
-    def parse_date(raw):
-        try:
-            return datetime.strptime(str(raw).strip(), "%d %b - %Y")
-        except Exception:
-            return pd.NaT
-
-    if not df.empty:
-        df["Date_dt"] = df["Date"].apply(parse_date)
-    else:
-        df["Date_dt"] = pd.Series(dtype="datetime64[ns]")
+def extract_schedule_grid(xlsx_path, sheet_name: str, channel: str, advertiser: str) -> pd.DataFrame:
+    """
+    Extract one spot per row from a schedule sheet.
+
+    The sheet is streamed once in read-only mode. Merged month headers are
+    resolved through a lookup built once from the sheet's merge ranges, and
+    only cells actually present are visited, so stray formatting far below or
+    to the right of the grid does not inflate the work.
+    """
+    clock = metrics.StageClock("extract")
+    wb = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        sheet = wb[sheet_name]
+        # ignore the stored <dimension>, it can be inflated by stray formatting
+        sheet.reset_dimensions()
+
+        with zipfile.ZipFile(xlsx_path) as archive:
+            merged = _merged_ranges(archive, _sheet_paths(archive)[sheet_name])
+        blanks = _merged_blanks(merged)
+        clock.lap("open")
+
+        sheet_rows = enumerate(sheet.iter_rows(values_only=True), start=1)
+
+        # 1) find header row containing "Program" in col A (rows 1..24)
+        header_row = None
+        indices = {}
+        top_rows = [()]  # 1-based, rows up to the header
+
+        for r, values in sheet_rows:
+            values = _clean_row(values, blanks.get(r))
+            top_rows.append(values)
+            v = _at(values, 1)
+            if v is not None and "program" in str(v).lower():
+                header_row = r
+                break
+            if r >= 24:
+                break
+
+        if not header_row:
+            raise ValueError("Could not find program header row.")
+
+        # 2) map fixed columns A-R (1..18)
+        for c in range(1, 19):
+            cell_val = _at(top_rows[header_row], c)
+            cell_val = "" if cell_val is None else str(cell_val).lower()
+            for key, target in COL_MAP.items():
+                if target in cell_val:
+                    indices[key] = c
+
+        # 3) map date columns starting from S (19)
+        month_row = header_row - 3
+        date_num_row = header_row - 1
+        date_cols = {}
+
+        # merged month header cells -> their top-left cell
+        month_cells = {}
+        for min_col, min_row, max_col, max_row in merged:
+            if min_row <= month_row <= max_row:
+                for c in range(min_col, max_col + 1):
+                    month_cells[c] = (min_row, min_col)
+
+        c = 19
+        while True:
+            d_num = _at(top_rows[date_num_row], c) if date_num_row >= 1 else None
+            if d_num is None:
+                break
+            raw_month = None
+            if month_row >= 1:
+                src_row, src_col = month_cells.get(c, (month_row, c))
+                raw_month = _at(top_rows[src_row], src_col)
+            m_year = normalize_month_year(raw_month)
+            date_cols[c] = f"{d_num} {m_year}"  # e.g. "21 Jan - 2026"
+            c += 1
+
+        # one row of attributes per program and a program x date spot-count matrix
+        attr_cols = [
+            ("Program", indices.get("program", 1)),
+            ("Commercial Name", indices.get("com_name", 2)),
+            ("Dur", indices.get("duration", 3)),
+            ("Language", indices.get("language", 4)),
+            ("Time", indices.get("time", 6)),
+            ("Rate Card Rate", indices.get("rate_card", 8)),
+            ("Negotiated Rate", indices.get("negotiated", 9)),
+        ]
+        date_col_idx = list(date_cols)
+        attrs = []
+        counts = []
+        clock.lap("header")
+
+        # 4) read program rows
+        for r, values in sheet_rows:
+            values = _clean_row(values, blanks.get(r))
+            prog = _at(values, indices.get("program", 1))
+            if not prog:
+                continue
+            prog_s = str(prog).lower()
+            if any(x in prog_s for x in ["total", "benefit", "bonus", "commercial"]):
+                continue
+
+            attrs.append([_at(values, c) for _, c in attr_cols])
+            counts.append([_spot_count(_at(values, c)) for c in date_col_idx])
+    finally:
+        wb.close()
+    clock.lap("rows")
+
+    # 5) expand to one entry per spot: repeat each (program, date) cell by its count
+    n_dates = len(date_col_idx)
+    counts = np.array(counts, dtype=np.int64).reshape(len(attrs), n_dates)
+    cell_idx = np.repeat(np.arange(counts.size), counts.ravel())
+    prog_idx = cell_idx // n_dates if n_dates else cell_idx
+    date_idx = cell_idx % n_dates if n_dates else cell_idx
+
+    # dates parsed once per date column: "21 Jan - 2026" -> datetime
+    date_strs = list(date_cols.values())
+    date_dts = _object_array([parse_date(s) for s in date_strs])
+
+    attr_values = np.empty((len(attrs), len(attr_cols)), dtype=object)
+    for k, row in enumerate(attrs):
+        attr_values[k, :] = row
+    columns = {name: attr_values[prog_idx, k] for k, (name, _) in enumerate(attr_cols)}
+    columns["Date"] = _object_array(date_strs)[date_idx]
+    columns["Channel"] = _object_array([channel] * len(cell_idx))
+    columns["Advertiser"] = _object_array([advertiser] * len(cell_idx))
+
+    df = pd.DataFrame(columns).infer_objects()
+
+    # keep as datetime for Excel formatting
+    df["Date_dt"] = pd.to_datetime(pd.Series(date_dts[date_idx]))
 
     # Keep display column "Date" in DD/MM/YYYY if possible (for table)
     df["Date"] = df["Date_dt"].dt.strftime("%d/%m/%Y")
@@ -155,5 +283,44 @@ def extract_schedule_grid(xlsx_path: str, sheet_name: str, channel: str, adverti
         "Rate Card Rate", "Negotiated Rate", "Date",
         "Commercial Name", "Channel", "Advertiser", "Date_dt"
     ]]
+    clock.lap("expand")
 
     return df
+
+
+def extract_sheet_from_bytes(data: bytes, sheet_name: str, channel: str, advertiser: str) -> pd.DataFrame:
+    return extract_schedule_grid(io.BytesIO(data), sheet_name, channel, advertiser)
+
+
+def extract_many(data: bytes, specs: list) -> list:
+    """
+    Extract several sheets of one workbook in parallel across worker processes.
+    specs: [{"sheet", "channel", "advertiser"}]. Returns one DataFrame (or the
+    exception raised for that sheet) per spec, in order.
+    """
+    from workers import run_parallel
+
+    return run_parallel(extract_sheet_from_bytes, [
+        (data, spec["sheet"], spec.get("channel", ""), spec.get("advertiser", ""))
+        for spec in specs
+    ])
+
+
+def parse_date(raw):
+    try:
+        return datetime.strptime(str(raw).strip(), "%d %b - %Y")
+    except Exception:
+        return pd.NaT
+
+
+def _spot_count(v):
+    if v and isinstance(v, (int, float)) and v > 0:
+        return int(v)
+    return 0
+
+
+def _object_array(values):
+    # np.array would try to coerce cells (datetimes, mixed numbers); keep them as-is
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
@@ -0,0 +1,313 @@
+"""
+Nilson log ingestion: xlsx, CSV or Parquet uploads to a DataFrame.
+
+xlsx sheets are streamed straight from the archive: the worksheet XML is
+iterparsed and each cell is converted the way pd.read_excel converts it,
+into one list per column rather than one per row. The shared strings,
+styles (which cells hold dates) and date system are read from their parts
+with openpyxl's public helpers. Each column is then typed as pandas'
+parser types it, so the frame is the one pd.read_excel(source, dtype=...)
+returns with the text columns as str. The format is sniffed from the
+content, the file name is not needed.
+"""
+import csv
+import io
+import posixpath
+import zipfile
+from functools import lru_cache
+from xml.etree.ElementTree import fromstring, iterparse
+
+import numpy as np
+import pandas as pd
+from openpyxl.cell.text import Text
+from openpyxl.reader.strings import read_string_table
+from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel, from_ISO8601
+from openpyxl.xml.constants import SHEET_MAIN_NS
+
+# text columns are read as text whatever the cells look like (programs
+# named "24", numeric-looking times); the rest is inferred
+NILSON_TEXT_COLUMNS = ["Advertiser", "Channel", "Advt_Theme", "Program", "Prog_time", "Advt_time"]
+
+# cell text pandas' parsers read as missing (the read_csv na_values default)
+NA_STRINGS = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+TRUE_STRINGS = frozenset(["True", "TRUE", "true"])
+FALSE_STRINGS = frozenset(["False", "FALSE", "false"])
+BOOL_STRINGS = TRUE_STRINGS | FALSE_STRINGS
+
+_ROW = f"{{{SHEET_MAIN_NS}}}row"
+_CELL = f"{{{SHEET_MAIN_NS}}}c"
+_VALUE = f"{{{SHEET_MAIN_NS}}}v"
+_INLINE = f"{{{SHEET_MAIN_NS}}}is"
+_TEXT = f"{{{SHEET_MAIN_NS}}}t"
+
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_REL_TYPES = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+
+
+@lru_cache(maxsize=None)
+def _column_index(letters):
+    idx = 0
+    for ch in letters:
+        idx = idx * 26 + ord(ch) - 64
+    return idx
+
+
+def _number(text):
+    # openpyxl's _cast_number, then pandas' integral float -> int
+    if "." in text or "E" in text or "e" in text:
+        value = float(text)
+        as_int = int(value) if np.isfinite(value) else None
+        return as_int if as_int == value else value
+    return int(text)
+
+
+# --- workbook parts ---
+
+def _workbook_parts(archive: zipfile.ZipFile):
+    """(first worksheet, shared strings or None, styles or None, date epoch) of an xlsx archive."""
+    rels = fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets, by_type = {}, {}
+    for rel in rels.iter(f"{_NS_PKG_REL}Relationship"):
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            target = target.lstrip("/")
+        else:
+            target = posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = target
+        by_type[rel.get("Type", "").rsplit("/", 1)[-1]] = target
+
+    workbook = fromstring(archive.read("xl/workbook.xml"))
+    sheet = next(workbook.iter(f"{{{SHEET_MAIN_NS}}}sheet"))
+    properties = workbook.find(f"{{{SHEET_MAIN_NS}}}workbookPr")
+    date1904 = properties is not None and properties.get("date1904", "0").lower() in ("1", "true")
+    return (
+        targets[sheet.get(f"{_NS_REL}id")],
+        by_type.get("sharedStrings"),
+        by_type.get("styles"),
+        MAC_EPOCH if date1904 else WINDOWS_EPOCH,
+    )
+
+
+def _date_styles(styles_xml):
+    """(date style indices, timedelta style indices): cellXfs whose number format shows a date or a duration."""
+    root = fromstring(styles_xml)
+    custom = {
+        int(fmt.get("numFmtId")): fmt.get("formatCode", "")
+        for fmt in root.iter(f"{{{SHEET_MAIN_NS}}}numFmt")
+    }
+    dates, timedeltas = set(), set()
+    xfs = root.find(f"{{{SHEET_MAIN_NS}}}cellXfs")
+    for idx, xf in enumerate(xfs if xfs is not None else []):
+        num_fmt_id = int(xf.get("numFmtId", 0))
+        fmt = custom.get(num_fmt_id) or builtin_format_code(num_fmt_id)
+        if fmt and is_date_format(fmt):
+            dates.add(idx)
+        if fmt and is_timedelta_format(fmt):
+            timedeltas.add(idx)
+    return dates, timedeltas
+
+
+# --- cells ---
+
+def _convert_cell(el, shared_strings, epoch, date_formats, timedelta_formats):
+    t = el.get("t", "n")
+    if t == "inlineStr":
+        node = el.find(_INLINE)
+        if node is None:
+            return ""
+        if len(node) == 1 and node[0].tag == _TEXT:
+            # plain inline text, what pandas' to_excel writes
+            return node[0].text or ""
+        return Text.from_tree(node).content
+
+    value = el.findtext(_VALUE)
+    if not value:
+        return ""
+    if t == "n":
+        style = int(el.get("s", 0))
+        if style in date_formats:
+            try:
+                return from_excel(float(value), epoch, timedelta=style in timedelta_formats)
+            except (OverflowError, ValueError):
+                return np.nan
+        return _number(value)
+    if t == "s":
+        return shared_strings[int(value)]
+    if t == "b":
+        return bool(int(value))
+    if t == "e":
+        return np.nan
+    if t == "d":
+        return from_ISO8601(value)
+    return value
+
+
+def _sheet_columns(src, *cell_context):
+    """
+    (columns, rows): converted cell values (pd.read_excel conventions) per
+    column, "" for blank cells, down to the last row with a value.
+    """
+    columns = []
+    rows = 0  # rows up to the last non-blank one
+    row_number = 0
+    for _, el in iterparse(src):
+        if el.tag != _ROW:
+            continue
+        r = el.get("r")
+        # rows missing from the XML are blank rows
+        row_number = int(r) if r else row_number + 1
+        i = row_number - 1
+        col = 0
+        for c in el:
+            if c.tag != _CELL:
+                continue
+            ref = c.get("r")
+            col = _column_index(ref.rstrip("0123456789")) - 1 if ref else col
+            value = _convert_cell(c, *cell_context)
+            if value != "":
+                while len(columns) <= col:
+                    columns.append([])
+                cells = columns[col]
+                if len(cells) < i:
+                    cells.extend([""] * (i - len(cells)))
+                cells.append(value)
+                rows = row_number
+            col += 1
+        el.clear()
+    for cells in columns:
+        cells.extend([""] * (rows - len(cells)))
+    return columns, rows
+
+
+def _column_names(header):
+    """Header cells as pandas names them: blanks become "Unnamed: i", repeats get .1, .2, ..."""
+    names, counts = [], {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value == "" else value
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts.get(name, 0)
+        counts[name] = count + 1
+        names.append(name)
+    return names
+
+
+def _missing(values) -> np.ndarray:
+    return np.fromiter(
+        (v is None or (isinstance(v, str) and v in NA_STRINGS) or (isinstance(v, float) and v != v)
+         for v in values),
+        dtype=bool, count=len(values),
+    )
+
+
+def _typed_column(cells, text=False):
+    """
+    One column of cell values typed as pandas' parser types it: numbers and
+    numeric text to a numeric dtype, all-boolean columns to bool, and the
+    rest left to the Series constructor (str, datetime64 or object).
+    """
+    values = np.empty(len(cells), dtype=object)
+    values[:] = cells
+    missing = _missing(values)
+    values[missing] = np.nan
+    if not text:
+        try:
+            return pd.Series(pd.to_numeric(values))
+        except (ValueError, TypeError):
+            pass
+    # equal cells share one object, as pandas' sanitize_objects leaves them (1 and True alike)
+    memo = {}
+    values[:] = [memo.setdefault(v, v) for v in values]
+    if text:
+        values[~missing] = [str(v) for v in values[~missing]]
+        return pd.Series(values, dtype=str)
+    if len(values) and not isinstance(values[0], int):
+        present = values[~missing]
+        if all(isinstance(v, bool) or (isinstance(v, str) and v in BOOL_STRINGS) for v in present):
+            flags = np.array([v is True or v in TRUE_STRINGS for v in present])
+            if not missing.any():
+                return pd.Series(flags)
+            # missing cells keep the column object, as in pandas
+            values[~missing] = flags
+    return pd.Series(values)
+
+
+def read_xlsx(source) -> pd.DataFrame:
+    """
+    First sheet of an xlsx workbook, as pd.read_excel(source, dtype=...)
+    returns it with the NILSON_TEXT_COLUMNS as str.
+    """
+    with zipfile.ZipFile(source) as archive:
+        sheet, strings, styles, epoch = _workbook_parts(archive)
+        shared_strings = []
+        if strings and strings in archive.namelist():
+            with archive.open(strings) as src:
+                shared_strings = read_string_table(src)
+        date_formats, timedelta_formats = set(), set()
+        if styles and styles in archive.namelist():
+            date_formats, timedelta_formats = _date_styles(archive.read(styles))
+        with archive.open(sheet) as src:
+            columns, rows = _sheet_columns(src, shared_strings, epoch, date_formats, timedelta_formats)
+
+    if not rows:
+        return pd.DataFrame()
+    names = _column_names([cells[0] for cells in columns])
+    if rows == 1:
+        return pd.DataFrame(columns=names)
+    text = set(_text_dtypes(names))
+    return pd.DataFrame({
+        name: _typed_column(cells[1:], name in text)
+        for name, cells in zip(names, columns)
+    })
+
+
+def _text_dtypes(columns):
+    return {col: str for col in NILSON_TEXT_COLUMNS if col in columns}
+
+
+def read_csv(source) -> pd.DataFrame:
+    raw = source.read() if hasattr(source, "read") else open(source, "rb").read()
+    # header first, so the text columns can be typed before parsing the rows
+    header = next(csv.reader(io.StringIO(raw[:65536].decode("utf-8-sig", errors="replace"))), [])
+    try:
+        return pd.read_csv(io.BytesIO(raw), encoding="utf-8-sig", dtype=_text_dtypes(header),
+                           float_precision="round_trip")
+    except UnicodeDecodeError:
+        # vendor exports saved from Excel on Windows
+        return pd.read_csv(io.BytesIO(raw), encoding="cp1252", dtype=_text_dtypes(header),
+                           float_precision="round_trip")
+
+
+def read_parquet(source) -> pd.DataFrame:
+    df = pd.read_parquet(source)
+    for col, dtype in _text_dtypes(df.columns).items():
+        if not pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype(dtype).where(df[col].notna())
+    return df
+
+
+def read_nilson(source) -> pd.DataFrame:
+    """Nilson log from an uploaded file or path: xlsx, Parquet, CSV (or .xls), sniffed from the first bytes."""
+    if hasattr(source, "read"):
+        data = source.read()
+        source = io.BytesIO(data)
+        head = data[:4]
+    else:
+        with open(source, "rb") as fh:
+            head = fh.read(4)
+
+    if head.startswith(b"PK"):
+        return read_xlsx(source)
+    if head == b"PAR1":
+        return read_parquet(source)
+    if head == b"\xd0\xcf\x11\xe0":
+        # legacy .xls (OLE2); left to pandas and xlrd
+        return pd.read_excel(source)
+    return read_csv(source)
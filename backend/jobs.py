@@ -0,0 +1,83 @@
+"""
+Opt-in async mode for the extract/monitor endpoints.
+
+submit() records a job status document in storage and runs the work on a
+background thread of this process; the status (state, stage, percent and
+finally the result or error) lives in Redis, so any app worker can answer
+GET /api/jobs/<job_id>. JOB_THREADS=0 runs jobs inline, which is handy in tests.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import create_job, put_job
+
+JOB_THREADS = int(os.getenv("JOB_THREADS", "2"))
+
+_executor = None
+
+
+class JobError(Exception):
+    """An expected failure with the HTTP status the synchronous endpoint would return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    def __init__(self, job_id, kind):
+        self.id = job_id
+        self.status = {"id": job_id, "kind": kind, "state": "queued", "stage": "queued", "percent": 0}
+
+    def update(self, stage=None, percent=None, **detail):
+        """Report progress; percent is for the whole job (0-100)."""
+        if stage is not None:
+            self.status["stage"] = stage
+        if percent is not None:
+            self.status["percent"] = max(0, min(100, int(percent)))
+        self.status["detail"] = detail
+        self.status["updated"] = time.time()
+        put_job(self.id, self.status)
+
+    def _finish(self, state, **fields):
+        self.status.update(state=state, updated=time.time(), **fields)
+        put_job(self.id, self.status)
+
+
+def no_progress(stage=None, percent=None, **detail):
+    pass
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=JOB_THREADS, thread_name_prefix="job")
+    return _executor
+
+
+def _run(job, fn, args):
+    job.status["state"] = "running"
+    job.update("started", 0)
+    try:
+        result = fn(job.update, *args)
+    except JobError as e:
+        job._finish("failed", error=str(e), httpStatus=e.status)
+    except Exception as e:
+        job._finish("failed", error=str(e) or type(e).__name__, httpStatus=500)
+    else:
+        job._finish("done", stage="done", percent=100, result=result)
+
+
+def submit(kind, fn, *args):
+    """
+    Run fn(progress, *args) in the background and return the job id at once.
+    fn reports through progress(stage, percent, **detail) and returns the
+    JSON-able response body of the synchronous endpoint.
+    """
+    job = Job(create_job(kind), kind)
+    if JOB_THREADS < 1:
+        _run(job, fn, args)
+    else:
+        _get_executor().submit(_run, job, fn, args)
+    return job.id
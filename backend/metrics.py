@@ -0,0 +1,162 @@
+"""
+Hot-path timings and counts, exposed two ways:
+
+- per request, as a Server-Timing header: stage() and StageClock laps made
+  while handling a request are collected (see start_request) and summed by
+  name;
+- per process, as Prometheus histograms rendered by render_prometheus() for
+  /api/metrics.
+
+Work done in batch worker processes is not seen by the parent's histograms,
+and each gunicorn worker serves its own numbers.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROWS_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+# name -> (help, buckets)
+HISTOGRAMS = {
+    "tsm_request_seconds": ("HTTP request handling time, until the response is returned", SECONDS_BUCKETS),
+    "tsm_stage_seconds": ("Time spent in one stage of extraction, ingest, matching or serialization",
+                          SECONDS_BUCKETS),
+    "tsm_match_pass_rows": ("Schedule spots considered and matched per matching pass", ROWS_BUCKETS),
+    "tsm_redis_seconds": ("Redis round trip time per operation and key type", SECONDS_BUCKETS),
+    "tsm_payload_bytes": ("Serialized payload size per operation and key type", BYTES_BUCKETS),
+}
+
+_lock = threading.Lock()
+_series = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_timings = ContextVar("timings", default=None)
+
+
+def observe(name, value, **labels):
+    """Add one observation to histogram `name` (one of HISTOGRAMS)."""
+    buckets = HISTOGRAMS[name][1]
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with _lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        else:
+            series[len(buckets)] += 1
+        series[-1] += value
+
+
+def add_timing(name, seconds):
+    """Record seconds under name in the current request's Server-Timing, if one is being collected."""
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timer(histogram, timing=None, **labels):
+    """Time the block into histogram (with labels) and, named `timing`, the request's Server-Timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(histogram, elapsed, **labels)
+        if timing:
+            add_timing(timing, elapsed)
+
+
+def stage(name):
+    return timer("tsm_stage_seconds", timing=name, stage=name)
+
+
+class StageClock:
+    """
+    Consecutive stages of one function without nesting blocks:
+    clock.lap("read") records the time since the previous lap (or the clock's
+    creation) as stage "<prefix>.read".
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.last = now
+        full = f"{self.prefix}.{name}"
+        observe("tsm_stage_seconds", elapsed, stage=full)
+        add_timing(full, elapsed)
+        return elapsed
+
+
+# ---------- per request ----------
+
+def start_request():
+    """Collect Server-Timing entries for the rest of this request (context)."""
+    _timings.set({})
+
+
+def server_timing(total=None):
+    """Server-Timing header value for the current request, or None outside one."""
+    timings = _timings.get()
+    if timings is None:
+        return None
+    entries = [f"{_token(name)};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def _token(name):
+    # Server-Timing metric names are HTTP tokens
+    return "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+
+
+# ---------- Prometheus text format ----------
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus(extra=None):
+    """
+    All histograms in the Prometheus text exposition format; extra is
+    {name: (type, help, value)} for counters and gauges kept elsewhere.
+    """
+    with _lock:
+        snapshot = {key: list(series) for key, series in _series.items()}
+
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for (series_name, pairs), series in sorted(snapshot.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ["+Inf"], series[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(pairs + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(pairs)} {series[-1]:.6f}")
+            lines.append(f"{name}_count{_labels(pairs)} {cumulative}")
+
+    for name, (kind, help_text, value) in (extra or {}).items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _series.clear()
@@ -1,7 +1,40 @@
+import copy
 import re
-from datetime import datetime, timedelta
+import warnings
+import numpy as np
 import pandas as pd
 
+import metrics
+
+THEME_VALUES = ["Tag", "-Tr", "-BB", " Com Break", "-Extro", "-Intro", " Time Check"]
+MATCH_KEYS = ["Advertiser", "Channel", "Date_key", "Dur"]
+KEY_LABELS = ["Advertiser", "Channel", "Date", "Duration"]
+
+# nilson columns matching reads; prepare_nilson normalizes only these and the
+# rest of the log is carried along untouched for the exports
+NILSON_COLUMNS = ["Advertiser", "Channel", "Dd", "Mn", "Yr", "Date", "Dur",
+                  "Prog_time", "Advt_time", "Advt_Theme", "Program"]
+
+# Schedule row status codes. Results keep the code plus its parameters in the
+# STATE_COLUMNS and are rendered to text by render_monitoring_frame.
+NO_STATUS = -1
+STATUS_AIRED = 0
+STATUS_OUTSIDE_DAYPART = 1    # Tag/Sponsorship outside 6AM-6PM / 6PM-10:59PM
+STATUS_KEY_MISSING = 2        # param: bits of KEY_LABELS not found (0 = "No match")
+STATUS_CONSUMED = 3           # param: records in range, all consumed by other spots
+STATUS_NO_THEME_OR_TIME = 4
+STATUS_NO_PROGRAM_TIME = 5
+STATUS_PARTIAL = 6            # param: matches found, param2: matches still needed
+
+NO_ROW = -1
+NO_OWNER = -1  # ClaimLedger.owner of unclaimed rows
+CLAIM_MODES = ("independent", "exclusive")
+
+STATE_COLUMNS = [
+    "Aired_Status_Code", "Aired_Status_Param", "Aired_Status_Param2",
+    "Aired_Window_Start", "Aired_Window_End", "Aired_Nilson_Row",
+]
+
 
 def _to_time(x):
     if pd.isna(x):
@@ -27,68 +60,582 @@ def is_special_program(prog_val):
     return p == "tag" or p.startswith(("sponsorship", "spon. of", "spon of"))
 
 
-def create_time_range(row):
-    start_time = row["Prog_time"]
+# --- columnar time layer: times are integer seconds-of-day, NO_TIME when missing ---
 
-    morning_start = datetime.strptime("06:00:00", "%H:%M:%S").time()
-    evening_start = datetime.strptime("18:00:00", "%H:%M:%S").time()
-    evening_end = datetime.strptime("22:59:00", "%H:%M:%S").time()
+SECONDS_PER_DAY = 24 * 3600
+NO_TIME = -1
 
-    if is_special_program(row["Program"]):
-        if isinstance(start_time, str):
-            start_time = datetime.strptime(start_time, "%H:%M:%S").time()
+MORNING_START = 6 * 3600
+EVENING_START = 18 * 3600
+EVENING_END = 22 * 3600 + 59 * 60
 
-        if morning_start <= start_time < evening_start:
-            return morning_start, evening_start
-        elif evening_start <= start_time <= evening_end:
-            return evening_start, evening_end
-        else:
-            return None, None
-    else:
-        end_time = row["End_Time"]
 
-                # 🔎 DEBUG PRINT HERE
-        if start_time is None or end_time is None:
-            print("Invalid time detected:")
-            print("Program:", row["Program"])
-            print("Start Time:", start_time)
-            print("End Time:", end_time)
-            print(row)
-            return None, None
+def _time_to_seconds(t):
+    if t is None or pd.isna(t):
+        return NO_TIME
+    return t.hour * 3600 + t.minute * 60 + t.second
 
-        start_dt = datetime.combine(datetime.today(), start_time)
-        end_dt = datetime.combine(datetime.today(), end_time)
 
-        start_range = (start_dt - timedelta(minutes=7)).time()
-        
-        if start_time.hour >= 22:
-            end_range = (end_dt + timedelta(minutes=20)).time()
-        else:
-            end_range = (end_dt + timedelta(minutes=12)).time()
+def format_seconds(secs):
+    if secs is None or secs < 0:
+        return "None"
+    secs = int(secs)
+    return f"{secs // 3600:02d}:{secs % 3600 // 60:02d}:{secs % 60:02d}"
 
-        return start_range, end_range
 
+def parse_schedule_times(values: pd.Series) -> np.ndarray:
+    """
+    Parse schedule time strings ("10.00 AM", "22:30", ...) to seconds-of-day.
+    Schedules reuse a handful of slots, so each distinct string is parsed once.
+    """
+    codes, uniques = pd.factorize(values)
+    secs = np.array([_time_to_seconds(_to_time(v)) for v in uniques] + [NO_TIME], dtype=np.int64)
+    return secs[codes]
+
+
+def parse_nilson_times(values: pd.Series):
+    """
+    Parse a nilson time column once per distinct value.
+    Returns (time objects column, seconds-of-day array).
+
+    Logs hold mostly distinct "HH:MM:SS" strings, parsed with that format in
+    one go; only the values it does not fit go through dateutil.
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=object)
+    text = uniques.map(lambda v: v.strip() if isinstance(v, str) else None)
+    parsed = pd.to_datetime(text, format="%H:%M:%S", errors="coerce")
+    retry = parsed.isna() & uniques.notna()
+    if retry.any():
+        with warnings.catch_warnings():
+            # no common format is left to infer, dateutil per value is expected
+            warnings.simplefilter("ignore", UserWarning)
+            parsed[retry] = pd.to_datetime(uniques[retry], errors="coerce")
+
+    times = np.append(parsed.dt.time.to_numpy(dtype=object), pd.NaT)
+    secs = (parsed.dt.hour * 3600 + parsed.dt.minute * 60 + parsed.dt.second).fillna(NO_TIME)
+    secs = np.append(secs.to_numpy(dtype=np.int64), NO_TIME)
+
+    return pd.Series(times[codes], index=values.index, dtype=object), secs[codes]
+
+
+def special_program_mask(programs: pd.Series) -> np.ndarray:
+    codes, uniques = pd.factorize(programs)
+    flags = np.array([is_special_program(p) for p in uniques] + [False], dtype=bool)
+    return flags[codes]
+
+
+def compute_time_windows(prog_secs: np.ndarray, end_secs: np.ndarray, special: np.ndarray):
+    """
+    Matching windows for every schedule row at once.
+
+    Regular programs: start - 7 min to end + 12 min (+20 min when the program
+    starts at 22:00 or later), wrapping at midnight.
+    Tag/Sponsorship: the 6AM-6PM or 6PM-10:59PM day-part holding the start time.
+    Rows without a window get NO_TIME on both ends.
+    """
+    win_start = np.full(len(prog_secs), NO_TIME, dtype=np.int64)
+    win_end = np.full(len(prog_secs), NO_TIME, dtype=np.int64)
+
+    regular = ~special & (prog_secs >= 0) & (end_secs >= 0)
+    extra = np.where(prog_secs >= 22 * 3600, 20 * 60, 12 * 60)
+    win_start[regular] = (prog_secs[regular] - 7 * 60) % SECONDS_PER_DAY
+    win_end[regular] = (end_secs[regular] + extra[regular]) % SECONDS_PER_DAY
+
+    morning = special & (prog_secs >= MORNING_START) & (prog_secs < EVENING_START)
+    evening = special & (prog_secs >= EVENING_START) & (prog_secs <= EVENING_END)
+    win_start[morning], win_end[morning] = MORNING_START, EVENING_START
+    win_start[evening], win_end[evening] = EVENING_START, EVENING_END
+
+    return win_start, win_end
+
+
+class _NextFree:
+    """
+    Smallest free slot at or after a given slot, over one bucket view
+    (union-find with path compression; slot len(free) means none).
+    """
+
+    def __init__(self, free):
+        self.parent = [i if f else i + 1 for i, f in enumerate(free)] + [len(free)]
+
+    def find(self, slot):
+        parent = self.parent
+        root = slot
+        while parent[root] != root:
+            root = parent[root]
+        while parent[slot] != root:
+            parent[slot], slot = root, parent[slot]
+        return root
+
+    def take(self, slot):
+        self.parent[slot] = slot + 1
+
+
+class _Augmenter:
+    """
+    Augmenting paths over one bucket view: from an unmatched spot, a BFS
+    through the records in its window and the spots holding them finds a
+    free record and shifts the path, so one more spot is matched and no
+    matched spot loses its match. Spots in themed_spots may only hold slots
+    set in themed_slots.
+
+    Each slot is reached once per search (skipped in O(1) through _NextFree),
+    and slots reached by failed searches stay reached until the next success:
+    nothing changed, so they cannot lead anywhere new.
+    """
+
+    def __init__(self, ranges, result, free, themed_spots=(), themed_slots=None):
+        self.ranges = ranges
+        self.result = result
+        self.free = free
+        self.themed_spots = themed_spots
+        self.themed_slots = themed_slots
+        self.owner = {slot: k for k, slot in enumerate(result) if slot is not None}
+        self._reset()
+
+    def _reset(self):
+        self.reached = {}  # slot -> spot it was reached from
+        self.open = _NextFree(self.free.tolist())
+        self.open_themed = None
+        if self.themed_spots:
+            self.open_themed = _NextFree((self.free & self.themed_slots).tolist())
+
+    def augment(self, root):
+        queue = [root]
+        for k in queue:
+            view = self.open_themed if k in self.themed_spots else self.open
+            for lo, hi in self.ranges[k]:
+                slot = view.find(lo)
+                while slot < hi:
+                    self.reached[slot] = k
+                    self.open.take(slot)
+                    if self.open_themed is not None:
+                        self.open_themed.take(slot)
+                    other = self.owner.get(slot)
+                    if other is None:
+                        self._shift(slot)
+                        self._reset()
+                        return True
+                    queue.append(other)
+                    slot = view.find(slot)
+        return False
 
-def check_time_in_range(time_to_check, start_range, end_range):
-    if isinstance(time_to_check, str):
-        check_time = datetime.strptime(time_to_check, "%H:%M:%S").time()
-    else:
-        check_time = time_to_check
+    def _shift(self, slot):
+        result = self.result
+        while slot is not None:
+            k = self.reached[slot]
+            slot, result[k] = result[k], slot
+            self.owner[result[k]] = k
+
+
+class _Bucket:
+    """Nilson row positions of one matching key, sorted by effective air time."""
+
+    def __init__(self, positions, times):
+        self.positions = positions
+        self.times = times
+
+    def slot_ranges(self, s, e):
+        # seconds-of-day, inclusive on both ends; a range that wraps midnight is split in two
+        if s < 0 or e < 0:
+            return []
+        if s > e:
+            return [
+                (int(np.searchsorted(self.times, s, side="left")), len(self.times)),
+                (0, int(np.searchsorted(self.times, e, side="right"))),
+            ]
+        return [(
+            int(np.searchsorted(self.times, s, side="left")),
+            int(np.searchsorted(self.times, e, side="right")),
+        )]
+
+
+class NilsonIndex:
+    """
+    Matching index over a prepared nilson frame (see PreparedNilson).
+
+    Rows are grouped by (Advertiser, Channel, Date_key, Dur) and each bucket is
+    sorted by effective air time (Advt_time, falling back to Prog_time), so a
+    spot's time window is answered by binary search instead of a frame scan.
+    Every bucket also keeps a second view restricted to themed records for the
+    Tag/Sponsorship theme pass.
+    """
+
+    def __init__(self, data_n: pd.DataFrame, times: np.ndarray, layout=None):
+        """
+        `times` holds the effective air time of every row in seconds-of-day.
+        `layout` is a stored (positions, bounds) from a previous build, which
+        skips the grouping and sorting.
+        """
+        n = len(data_n)
+        self.size = n
+        keyed = np.ones(n, dtype=bool)
+        for col in MATCH_KEYS:
+            keyed &= data_n[col].notna().to_numpy()
+
+        themed = np.zeros(n, dtype=bool)
+        if "Advt_Theme" in data_n.columns:
+            themed = data_n["Advt_Theme"].astype(str).str.strip().isin(THEME_VALUES).to_numpy()
+
+        key_cols = [data_n[col].to_numpy() for col in MATCH_KEYS]
+
+        # keys present at all (with or without a usable air time)
+        self.keys = set(zip(*(c[keyed] for c in key_cols)))
+        # distinct values of each key column, for the "not found" diagnostics
+        self.values = {col: set(data_n[col].dropna().unique()) for col in MATCH_KEYS}
+        self.themed_keys = set(zip(*(c[keyed & themed] for c in key_cols)))
+        self.buckets = {}
+
+        if layout is None:
+            layout = self._layout(key_cols, keyed & (times >= 0), times)
+        # row positions sorted by (key, air time, position) and the bucket starts
+        self.layout = layout
+        positions, bounds = layout
+        if len(positions):
+            for chunk in np.split(positions, bounds):
+                key = tuple(c[chunk[0]] for c in key_cols)
+                chunk_themed = chunk[themed[chunk]]
+                self.buckets[key] = (
+                    _Bucket(chunk, times[chunk]),
+                    _Bucket(chunk_themed, times[chunk_themed]),
+                )
+
+    @staticmethod
+    def _layout(key_cols, usable, times):
+        positions = np.flatnonzero(usable)
+        if not len(positions):
+            return positions, np.array([], dtype=np.int64)
+        codes, _ = pd.MultiIndex.from_arrays([c[positions] for c in key_cols]).factorize()
+        order = np.lexsort((positions, times[positions], codes))
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        return positions[order], bounds
+
+    def extended(self, data_n: pd.DataFrame, times: np.ndarray, start):
+        """
+        (index, keys) for data_n whose first `start` rows are this index's:
+        only the appended rows are grouped, and only the buckets they join
+        are re-sorted. keys are the matching keys of the appended rows.
+        """
+        index = copy.copy(self)
+        index.size = len(data_n)
+        new = data_n.iloc[start:]
+        keyed = np.ones(len(new), dtype=bool)
+        for col in MATCH_KEYS:
+            keyed &= new[col].notna().to_numpy()
+        themed = np.zeros(len(new), dtype=bool)
+        if "Advt_Theme" in new.columns:
+            themed = new["Advt_Theme"].astype(str).str.strip().isin(THEME_VALUES).to_numpy()
+        key_cols = [new[col].to_numpy() for col in MATCH_KEYS]
+
+        keys = set(zip(*(c[keyed] for c in key_cols)))
+        index.keys = self.keys | keys
+        index.values = {col: self.values[col] | set(new[col].dropna().unique()) for col in MATCH_KEYS}
+        index.themed_keys = self.themed_keys | set(zip(*(c[keyed & themed] for c in key_cols)))
+        index.buckets = dict(self.buckets)
+
+        positions, bounds = self._layout(key_cols, keyed & (times[start:] >= 0), times[start:])
+        if len(positions):
+            for chunk in np.split(positions, bounds):
+                key = tuple(c[chunk[0]] for c in key_cols)
+                chunk_themed = chunk[themed[chunk]] + start
+                chunk = chunk + start
+                old = index.buckets.get(key)
+                if old is not None:
+                    chunk = np.concatenate([old[0].positions, chunk])
+                    chunk = chunk[np.lexsort((chunk, times[chunk]))]
+                    chunk_themed = np.concatenate([old[1].positions, chunk_themed])
+                    chunk_themed = chunk_themed[np.lexsort((chunk_themed, times[chunk_themed]))]
+                index.buckets[key] = (
+                    _Bucket(chunk, times[chunk]),
+                    _Bucket(chunk_themed, times[chunk_themed]),
+                )
+
+        chunks = [bucket.positions for bucket, _ in index.buckets.values()]
+        if chunks:
+            index.layout = (np.concatenate(chunks), np.cumsum([len(c) for c in chunks[:-1]], dtype=np.int64))
+        return index, keys
+
+    def missing_mask(self, key):
+        """Bit k set when key[k] does not occur at all in column MATCH_KEYS[k]."""
+        mask = 0
+        for bit, (col, value) in enumerate(zip(MATCH_KEYS, key)):
+            if value not in self.values[col]:
+                mask |= 1 << bit
+        return mask
+
+    def new_state(self, unavailable=None):
+        return _MatchState(self, unavailable)
+
+
+class _MatchState:
+    """
+    Consumption state of one matching run on top of a NilsonIndex: which
+    records are taken and which schedule row holds each of them.
+    """
+
+    def __init__(self, index: NilsonIndex, unavailable=None):
+        self.index = index
+        # records claimed elsewhere (ClaimLedger.unavailable) start out taken
+        self.taken = np.zeros(index.size, dtype=bool) if unavailable is None else unavailable.copy()
+        self.matches = {}  # schedule row -> nilson position
+        self._held = {}    # key -> [(row, window, themed)] of the matched rows
+
+    def pin(self, row, pos):
+        """Keep an earlier match: the record stays with the row and is never moved."""
+        self.taken[pos] = True
+        self.matches[row] = pos
+
+    def assign(self, key, rows, windows, themed=False):
+        """
+        Match schedule rows of one bucket, with (start, end) windows in
+        seconds-of-day, to free records in range (only themed ones when
+        `themed`), as many as possible. Results land in self.matches;
+        returns the records in range per row.
+
+        Windows are taken by increasing end and given the earliest free
+        record from their start, a maximum matching for intervals against
+        points in O(n log n) per bucket. Windows wrapping midnight, and rows
+        still unmatched while rows of earlier passes hold records in this
+        bucket, are then tried with augmenting paths: an earlier row may move
+        to another record in its own window (themed rows to themed records),
+        but never loses its match.
+        """
+        buckets = self.index.buckets.get(key)
+        if buckets is None:
+            return [0] * len(rows)
+        bucket = buckets[themed]
+
+        ranges = [[(lo, hi) for lo, hi in bucket.slot_ranges(s, e) if hi > lo] for s, e in windows]
+        totals = [sum(hi - lo for lo, hi in r) for r in ranges]
+        if not any(totals):
+            return totals
+
+        free = ~self.taken[bucket.positions]
+        result = [None] * len(rows)
+        next_free = _NextFree(free.tolist())
+        line = sorted((r[0][1], r[0][0], k) for k, r in enumerate(ranges) if len(r) == 1)
+        for hi, lo, k in line:
+            slot = next_free.find(lo)
+            if slot < hi:
+                next_free.take(slot)
+                result[k] = slot
+
+        wrapping = [k for k, r in enumerate(ranges) if len(r) == 2]
+        if wrapping:
+            augmenter = _Augmenter(ranges, result, free)
+            for k in wrapping:
+                if result[k] is None:
+                    augmenter.augment(k)
+
+        found = [None if slot is None else int(bucket.positions[slot]) for slot in result]
+        if key in self._held and any(pos is None and total for pos, total in zip(found, totals)):
+            found = self._reroute(key, rows, windows, themed, found, totals)
+
+        held = self._held.setdefault(key, [])
+        for row, window, pos in zip(rows, windows, found):
+            if pos is not None:
+                self.taken[pos] = True
+                self.matches[row] = pos
+                held.append((row, window, themed))
+        return totals
+
+    def _reroute(self, key, rows, windows, themed, found, totals):
+        """
+        Augment unmatched new rows over the whole bucket, moving rows matched
+        earlier where that frees a record. Returns the new rows' positions;
+        moved earlier rows are updated in place.
+        """
+        bucket, themed_bucket = self.index.buckets[key]
+        held = self._held[key]
+        slot_of = {int(p): s for s, p in enumerate(bucket.positions)}
+        themed_slots = np.isin(bucket.positions, themed_bucket.positions)
+
+        n_new = len(rows)
+        spots = [(w, themed) for w in windows] + [(w, t) for _, w, t in held]
+        ranges = [[(lo, hi) for lo, hi in bucket.slot_ranges(s, e) if hi > lo] for (s, e), _ in spots]
+        themed_spots = {k for k, (_, t) in enumerate(spots) if t}
+        result = [None if pos is None else slot_of[pos] for pos in found]
+        result += [slot_of[self.matches[row]] for row, _, _ in held]
+
+        free = ~self.taken[bucket.positions]
+        free[[slot for slot in result if slot is not None]] = True
+        augmenter = _Augmenter(ranges, result, free, themed_spots, themed_slots)
+        for k in range(n_new):
+            if result[k] is None and totals[k]:
+                augmenter.augment(k)
+
+        for row, _, _ in held:
+            self.taken[self.matches[row]] = False
+        for (row, _, _), slot in zip(held, result[n_new:]):
+            self.matches[row] = int(bucket.positions[slot])
+            self.taken[self.matches[row]] = True
+        return [None if slot is None else int(bucket.positions[slot]) for slot in result[:n_new]]
+
+
+class PreparedNilson:
+    """
+    A nilson log normalized for matching (times parsed, Date_key built,
+    Advertiser/Channel/Program lowercased, Dur normalized) with its matching
+    index. Built once per session and reused by every monitor run on it.
+
+    frame holds only the NILSON_COLUMNS (normalized) plus RO Number, Date and
+    Date_key; full_frame() lays them over the original log for exports.
+    """
+
+    def __init__(self, frame: pd.DataFrame, air_secs: np.ndarray, layout=None, original=None, index=None):
+        self.frame = frame
+        self.air_secs = air_secs
+        self.original = original
+        self._layout = layout
+        self._index = index
+
+    @property
+    def index(self) -> NilsonIndex:
+        # built on first use: exports only need full_frame()
+        if self._index is None:
+            self._index = NilsonIndex(self.frame, self.air_secs, layout=self._layout)
+        return self._index
+
+    def memory_usage(self) -> int:
+        """Rough bytes held once the index is built, the original log included."""
+        size = int(self.frame.memory_usage(deep=True).sum()) + 4 * self.air_secs.nbytes
+        if self.original is not None:
+            size += int(self.original.memory_usage(deep=True).sum())
+        return size
+
+    def __getstate__(self):
+        # worker processes only match; the full log stays in the parent
+        self.index
+        state = self.__dict__.copy()
+        state["original"] = None
+        return state
+
+    def full_frame(self) -> pd.DataFrame:
+        """The whole log with the normalized columns in place and the added ones at the end."""
+        if self.original is None:
+            return self.frame.copy()
+        full = self.original.copy()
+        for col in self.frame.columns:
+            full[col] = self.frame[col]
+        return full
+
+    def appended(self, nilson_df: pd.DataFrame):
+        """
+        This log with nilson_df's rows appended after it, and the matching
+        keys those rows fall in. Only the new rows are normalized and only
+        the buckets they join are re-sorted; existing rows keep their
+        positions, so earlier matches and claims stay valid.
+        """
+        clock = metrics.StageClock("nilson.append")
+        data_n, air_secs = _normalize_nilson(nilson_df, clock)
+        start = len(self.frame)
+        frame = pd.concat([self.frame, data_n], ignore_index=True)
+        air_secs = np.concatenate([self.air_secs, air_secs])
+        original = None
+        if self.original is not None:
+            original = pd.concat([self.original, nilson_df], ignore_index=True)
+
+        index, keys = self.index.extended(frame, air_secs, start)
+        prepared = PreparedNilson(frame, air_secs, original=original, index=index)
+        clock.lap("index")
+        return prepared, keys
+
+    def to_payload(self, start=0) -> dict:
+        """
+        Frames for storage; from_payload rebuilds this. With start, only the
+        rows from there on (the part an appended() log added), while the
+        index always covers the whole log.
+        """
+        positions, bounds = self.index.layout
+        bucket_start = np.zeros(len(positions), dtype=bool)
+        bucket_start[bounds] = True
+        return {
+            "prepared_nilson_df": self.frame.iloc[start:] if start else self.frame,
+            "nilson_index_df": pd.DataFrame({
+                "position": positions,
+                "air_secs": self.air_secs[positions],
+                "bucket_start": bucket_start,
+            }),
+        }
+
+    @classmethod
+    def from_payload(cls, payload: dict):
+        frame = payload["prepared_nilson_df"]
+        index_df = payload["nilson_index_df"]
+        positions = index_df["position"].to_numpy(dtype=np.int64)
+        air_secs = np.full(len(frame), NO_TIME, dtype=np.int64)
+        air_secs[positions] = index_df["air_secs"].to_numpy()
+        bounds = np.flatnonzero(index_df["bucket_start"].to_numpy())
+        return cls(frame, air_secs, layout=(positions, bounds), original=payload.get("original_nilson_df"))
+
+
+def prepare_nilson(nilson_df: pd.DataFrame) -> PreparedNilson:
+    clock = metrics.StageClock("nilson")
+    data_n, air_secs = _normalize_nilson(nilson_df, clock)
+    prepared = PreparedNilson(data_n, air_secs, original=nilson_df)
+    clock.lap("index")
+    return prepared
+
+
+def _normalize_nilson(nilson_df: pd.DataFrame, clock):
+    """(normalized NILSON_COLUMNS frame, effective air time in seconds) for prepare_nilson."""
+    data_n = nilson_df[[c for c in NILSON_COLUMNS if c in nilson_df.columns]].copy()
 
-    if start_range > end_range:
-        return check_time >= start_range or check_time <= end_range
-    else:
-        return start_range <= check_time <= end_range
+    data_n["RO Number"] = ""
 
+    # effective air time: Advt_time, falling back to Prog_time
+    air_secs = np.full(len(data_n), NO_TIME, dtype=np.int64)
+    if "Prog_time" in data_n.columns:
+        data_n["Prog_time"], air_secs = parse_nilson_times(data_n["Prog_time"])
+    if "Advt_time" in data_n.columns:
+        data_n["Advt_time"], advt_secs = parse_nilson_times(data_n["Advt_time"])
+        air_secs = np.where(advt_secs >= 0, advt_secs, air_secs)
+    clock.lap("times")
 
-def find_unmatched_records(schedule_df: pd.DataFrame, nilson_df: pd.DataFrame, ro_number: str):
-    data = schedule_df.copy()
-    data_n = nilson_df.copy()
+    if all(c in data_n.columns for c in ["Dd", "Mn", "Yr"]):
+        dd, mn, yr = (data_n[c].astype(str) for c in ["Dd", "Mn", "Yr"])
+        data_n["Date"] = pd.to_datetime(dd + "-" + mn + "-" + yr, format="%d-%m-%Y", errors="coerce")
+    elif "Date" in data_n.columns:
+        data_n["Date"] = pd.to_datetime(data_n["Date"], errors="coerce")
 
-    data_n["RO Number"] = ""
+    data_n["Date_key"] = pd.to_datetime(data_n["Date"], errors="coerce").dt.strftime("%Y-%m-%d")
+
+    for col in ["Advertiser", "Channel", "Program"]:
+        if col in data_n.columns:
+            data_n[col] = data_n[col].astype(str).str.strip().str.lower()
+
+    if "Dur" in data_n.columns:
+        data_n["Dur"] = data_n["Dur"].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    clock.lap("keys")
+    return data_n, air_secs
+
+
+def match_schedule(schedule_df: pd.DataFrame, prepared: PreparedNilson, diagnostics=True, progress=None,
+                   previous=None, only_keys=None, unavailable=None):
+    """
+    Match schedule spots against a prepared nilson log.
+
+    Returns (unmatched, all, claimed) where claimed holds the nilson positions
+    matched by this schedule. The nilson frame itself is not copied, so this
+    is what the batch workers run; find_unmatched_records wraps it.
+
+    progress, if given, is called as progress(step, rows_done, rows_total)
+    a few dozen times over the three passes.
+
+    previous is an earlier `all` result of this schedule on a log that has
+    since been appended to (PreparedNilson.appended): its matches are kept
+    as they are, only unmatched spots whose matching key is in only_keys are
+    matched again, and the rows of other buckets keep their previous status.
+
+    unavailable is a bool mask over the log's rows that may not be matched
+    (records claimed exclusively by other ROs, see ClaimLedger).
+    """
+    clock = metrics.StageClock("match")
+    data = schedule_df.copy()
+    index = prepared.index
 
-    columns = list(data.columns) + ["Aired_Status", "Aired_Row_Data"]
-    all_records = pd.DataFrame(columns=columns)
+    schedule_columns = list(data.columns)
 
     # --- schedule preprocessing (Time split, Date normalize) ---
     if "Time" in data.columns:
@@ -102,8 +649,8 @@ def find_unmatched_records(schedule_df: pd.DataFrame, nilson_df: pd.DataFrame, r
             data["Prog_time_raw"] = tmp_time.str.strip()
             data["End_Time_raw"] = None
 
-    data["Prog_time"] = data.get("Prog_time_raw", data.get("Prog_time")).apply(_to_time)
-    data["End_Time"] = data.get("End_Time_raw", data.get("End_Time")).astype(str).str.strip().apply(_to_time)
+    prog_secs = parse_schedule_times(data.get("Prog_time_raw", data.get("Prog_time")))
+    end_secs = parse_schedule_times(data.get("End_Time_raw", data.get("End_Time")).astype(str).str.strip())
     data["Date"] = pd.to_datetime(data["Date"], dayfirst=True, errors="coerce")
 
     # required columns check
@@ -111,67 +658,48 @@ def find_unmatched_records(schedule_df: pd.DataFrame, nilson_df: pd.DataFrame, r
         if col not in data.columns:
             raise ValueError(f"Schedule is missing required column: {col}")
 
-    # --- nilson preprocessing ---
-    if "Prog_time" in data_n.columns:
-        data_n["Prog_time"] = pd.to_datetime(data_n["Prog_time"], errors="coerce").dt.time
-    if "Advt_time" in data_n.columns:
-        data_n["Advt_time"] = pd.to_datetime(data_n["Advt_time"], errors="coerce").dt.time
-
-    if all(c in data_n.columns for c in ["Dd", "Mn", "Yr"]):
-        data_n["Date"] = pd.to_datetime(
-            data_n[["Dd", "Mn", "Yr"]].astype(str).agg("-".join, axis=1),
-            format="%d-%m-%Y",
-            errors="coerce"
-        )
-    elif "Date" in data_n.columns:
-        data_n["Date"] = pd.to_datetime(data_n["Date"], errors="coerce")
-
     # normalize for matching
     data["Date_key"] = pd.to_datetime(data["Date"], errors="coerce").dt.strftime("%Y-%m-%d")
-    data_n["Date_key"] = pd.to_datetime(data_n["Date"], errors="coerce").dt.strftime("%Y-%m-%d")
     
     for col in ["Advertiser", "Channel", "Program"]:
         if col in data.columns:
             data[col] = data[col].astype(str).str.strip().str.lower()
-        if col in data_n.columns:
-            data_n[col] = data_n[col].astype(str).str.strip().str.lower()
     
     if "Dur" in data.columns:
         data["Dur"] = data["Dur"].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
-    if "Dur" in data_n.columns:
-        data_n["Dur"] = data_n["Dur"].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
-
-    # Convert nilson Prog_time/Advt_time if first row is string
-    if len(data_n) > 0:
-        if "Prog_time" in data_n.columns and isinstance(data_n["Prog_time"].iloc[0], str):
-            data_n["Prog_time"] = data_n["Prog_time"].apply(lambda x: datetime.strptime(x, "%H:%M:%S").time() if isinstance(x, str) else x)
-        if "Advt_time" in data_n.columns and isinstance(data_n["Advt_time"].iloc[0], str):
-            data_n["Advt_time"] = data_n["Advt_time"].apply(lambda x: datetime.strptime(x, "%H:%M:%S").time() if isinstance(x, str) else x)
-
-    matched_counts = {}
-    matched_indices = set()
 
-    spot_counts_data = data.groupby(
-        ["Advertiser", "Channel", "Date_key", "Dur", "Program"]
-    )["Prog_time"].count().to_dict()
+    state = index.new_state(unavailable)
+    if previous is not None:
+        earlier = previous["Aired_Nilson_Row"].to_numpy()
+        for i in np.flatnonzero(earlier != NO_ROW):
+            state.pin(int(i), int(earlier[i]))
+    clock.lap("schedule")
 
-    row_match_idx = [None] * len(data)
-    row_match_data = [""] * len(data)
-    row_total_in_range = [0] * len(data)
-    row_early_status = [None] * len(data)
-    row_start_end = [None] * len(data)
+    special = special_program_mask(data["Program"])
+    win_start, win_end = compute_time_windows(prog_secs, end_secs, special)
+    keys = list(zip(*(data[col] for col in MATCH_KEYS)))
 
-    matched_indices = set()
+    n = len(data)
+    row_total_in_range = [0] * n
+    row_early_status = [None] * n     # status decided before matching
+    row_missing = [0] * n             # MISSING_* bits for STATUS_KEY_MISSING
 
+    report_every = max(n // 20, 1)
+    matched_before = 0
     for step in [1, 2, 3]:
-        for i in range(len(data)):
-            row = data.iloc[i]
-            
+        considered = 0
+        pending = {}  # key -> rows to match in this pass, in schedule order
+        for i in range(n):
+            if progress is not None and i % report_every == 0:
+                progress(step, i, n)
+
             # Skip rows already matched or failed early
-            if row_match_idx[i] is not None or row_early_status[i] is not None:
+            if i in state.matches or row_early_status[i] is not None:
+                continue
+            if only_keys is not None and keys[i] not in only_keys and keys[i] in index.keys:
                 continue
 
-            is_special = is_special_program(row["Program"])
+            is_special = bool(special[i])
             
             if step == 1 and is_special:
                 continue
@@ -180,124 +708,292 @@ def find_unmatched_records(schedule_df: pd.DataFrame, nilson_df: pd.DataFrame, r
             if step == 3 and not is_special:
                 continue
 
-            if row_start_end[i] is None: # Only calculate once
-                start_range, end_range = create_time_range(row)
-                row_start_end[i] = (start_range, end_range)
-            else:
-                start_range, end_range = row_start_end[i]
+            considered += 1
 
-            if is_special and (start_range is None or end_range is None):
-                row_early_status[i] = "Tag/Sponsorship program outside allowed time ranges (6AM-6PM or 6PM-10:59PM)"
+            if is_special and win_start[i] < 0:
+                row_early_status[i] = STATUS_OUTSIDE_DAYPART
                 continue
 
-            matched_records = data_n[
-                (data_n["Advertiser"] == row["Advertiser"]) &
-                (data_n["Channel"] == row["Channel"]) &
-                (data_n["Date_key"] == row["Date_key"]) &
-                (data_n["Dur"] == row["Dur"])
-            ]
+            key = keys[i]
 
-            if len(matched_records) == 0:
-                reason_parts = []
-                if len(data_n[data_n["Advertiser"] == row["Advertiser"]]) == 0:
-                    reason_parts.append("Advertiser not found")
-                if len(data_n[data_n["Channel"] == row["Channel"]]) == 0:
-                    reason_parts.append("Channel not found")
-                if len(data_n[data_n["Date_key"] == row["Date_key"]]) == 0:
-                    reason_parts.append("Date not found")
-                if len(data_n[data_n["Dur"] == row["Dur"]]) == 0:
-                    reason_parts.append("Duration not found")
-
-                row_early_status[i] = " & ".join(reason_parts) if reason_parts else "No match"
+            if key not in index.keys:
+                row_early_status[i] = STATUS_KEY_MISSING
+                if diagnostics:
+                    row_missing[i] = index.missing_mask(key)
                 continue
 
-            # Filtering records by Theme if Step 2
-            filtered_records = matched_records.copy()
-            if step == 2 and is_special:
-                if "Advt_Theme" in filtered_records.columns:
-                    filtered_records = filtered_records[
-                        filtered_records["Advt_Theme"].astype(str).str.strip().isin(
-                            ["Tag", "-Tr", "-BB", " Com Break", "-Extro", "-Intro", " Time Check"]
-                        )
-                    ]
-                else:
-                    filtered_records = filtered_records.iloc[0:0]
-
-                if len(filtered_records) == 0:
-                    # Don't fail it yet! Let it try again in Step 3 without the theme filter.
-                    continue
-
-            # In Step 3, we allow any theme, meaning we just use `matched_records` as `filtered_records`
-            
-            consumed_idx = None
-            matched_row_data = ""
-            total_in_time_range = 0
-            
-            for match_idx, match_row in filtered_records.iterrows():
-                time_to_check = match_row["Advt_time"] if ("Advt_time" in match_row and pd.notnull(match_row["Advt_time"])) else match_row["Prog_time"]
-                if check_time_in_range(time_to_check, start_range, end_range):
-                    total_in_time_range += 1
-                    if match_idx not in matched_indices:
-                        consumed_idx = match_idx
-                        data_n.at[match_idx, "RO Number"] = ro_number
-                        matched_indices.add(match_idx)
-                        matched_row_data = " _ ".join(str(val) for val in match_row.values)
-                        break
-
-            # update state
-            if consumed_idx is not None:
-                row_match_idx[i] = consumed_idx
-                row_match_data[i] = matched_row_data
-            
-            # Keep highest total_in_time_range to show user the availability across passes
-            row_total_in_range[i] = max(row_total_in_range[i], total_in_time_range)
-            
-    # Now generate all_records in original order
-    matched_counts = {}
-    all_records_list = []
-    
-    for i in range(len(data)):
-        row = data.iloc[i]
-        spot_key = (row["Advertiser"], row["Channel"], row["Date_key"], row["Dur"], row["Program"])
-        if spot_key not in matched_counts:
-            matched_counts[spot_key] = 0
-            
-        row_dict = row.to_dict()
-        
-        if row_early_status[i] is not None:
-            row_dict["Aired_Status"] = row_early_status[i]
-            row_dict["Aired_Row_Data"] = ""
-            all_records_list.append(row_dict)
-            continue
-            
-        if row_match_idx[i] is not None:
-            matched_counts[spot_key] += 1
-            row_dict["Aired_Status"] = "Aired"
-            row_dict["Aired_Row_Data"] = row_match_data[i]
-        else:
-            current_found = matched_counts[spot_key]
-            required_matches = spot_counts_data.get(spot_key, 1)
-            total_in_range = row_total_in_range[i]
-            
-            start_range, end_range = row_start_end[i]
-            
-            if current_found == 0:
-                if total_in_range > 0:
-                    row_dict["Aired_Status"] = f"Found 0 available matches, but {total_in_range} records existed in range {start_range}-{end_range} (consumed by other spots)"
-                else:
-                    if is_special_program(row["Program"]):
-                        row_dict["Aired_Status"] = f"No matching available theme or time found in range {start_range} to {end_range}"
-                    else:
-                        row_dict["Aired_Status"] = f"No matching program time found in range {start_range} to {end_range}"
-            else:
-                needed_more = required_matches - current_found
-                row_dict["Aired_Status"] = f"Found only {current_found} matches, needed {needed_more} more"
-            row_dict["Aired_Row_Data"] = ""
-            
-        all_records_list.append(row_dict)
-
-    all_records = pd.DataFrame(all_records_list, columns=columns)
-    unmatched_records = all_records[all_records["Aired_Status"] != "Aired"].copy()
-
-    return unmatched_records, all_records, data_n
+            # Step 2 only considers themed records; without any, leave the spot for Step 3
+            themed = step == 2 and is_special
+            if themed and key not in index.themed_keys:
+                continue
 
+            pending.setdefault(key, []).append(i)
+
+        # spots only compete with spots of the same bucket: one matching per bucket
+        themed = step == 2
+        for key, rows in pending.items():
+            totals = state.assign(key, rows, [(win_start[i], win_end[i]) for i in rows], themed=themed)
+            for i, total_in_time_range in zip(rows, totals):
+                # Keep highest total_in_time_range to show user the availability across passes
+                row_total_in_range[i] = max(row_total_in_range[i], total_in_time_range)
+        matched_now = len(state.matches)
+        matched_in_pass, matched_before = matched_now - matched_before, matched_now
+
+        if progress is not None:
+            progress(step, n, n)
+        clock.lap(f"pass{step}")
+        metrics.observe("tsm_match_pass_rows", considered, step=step, outcome="considered")
+        metrics.observe("tsm_match_pass_rows", matched_in_pass, step=step, outcome="matched")
+
+    # --- assemble results column-wise, in original order ---
+    match_pos = np.full(n, NO_ROW, dtype=np.int64)
+    if state.matches:
+        match_pos[list(state.matches)] = list(state.matches.values())
+    matched = match_pos != NO_ROW
+    early = np.array([NO_STATUS if s is None else s for s in row_early_status], dtype=np.int8)
+    total_in_range = np.array(row_total_in_range, dtype=np.int64)
+
+    # matches so far per (key, Program), counted in schedule order
+    spot_groups = [data[col] for col in ["Advertiser", "Channel", "Date_key", "Dur", "Program"]]
+    current_found = pd.Series(matched, index=data.index).groupby(spot_groups, dropna=False).cumsum().to_numpy()
+    required = pd.Series(prog_secs >= 0, index=data.index).groupby(spot_groups, dropna=False).transform("sum").to_numpy()
+
+    status = np.select(
+        [early != NO_STATUS, matched, current_found > 0, total_in_range > 0, special],
+        [early, STATUS_AIRED, STATUS_PARTIAL, STATUS_CONSUMED, STATUS_NO_THEME_OR_TIME],
+        default=STATUS_NO_PROGRAM_TIME,
+    ).astype(np.int8)
+    param = np.select(
+        [status == STATUS_KEY_MISSING, status == STATUS_PARTIAL, status == STATUS_CONSUMED],
+        [np.array(row_missing), current_found, total_in_range],
+        default=0,
+    )
+    param2 = np.where(status == STATUS_PARTIAL, required - current_found, 0)
+
+    all_records = data[schedule_columns].infer_objects()
+    all_records["Aired_Status_Code"] = status
+    all_records["Aired_Status_Param"] = param.astype(np.int32)
+    all_records["Aired_Status_Param2"] = param2.astype(np.int32)
+    all_records["Aired_Window_Start"] = win_start.astype(np.int32)
+    all_records["Aired_Window_End"] = win_end.astype(np.int32)
+    all_records["Aired_Nilson_Row"] = match_pos
+
+    if previous is not None:
+        # rows of buckets without new records were not looked at again (rows
+        # of missing keys were, their diagnostics depend on the whole log)
+        kept = np.array([only_keys is not None and key not in only_keys and key in index.keys
+                         for key in keys], dtype=bool)
+        for col in STATE_COLUMNS:
+            values = all_records[col].to_numpy().copy()
+            values[kept] = previous[col].to_numpy()[kept]
+            all_records[col] = values
+        status = all_records["Aired_Status_Code"].to_numpy()
+
+    unmatched_records = all_records[status != STATUS_AIRED].copy()
+    clock.lap("assemble")
+
+    return unmatched_records, all_records, match_pos[matched]
+
+
+def claim_nilson(prepared: PreparedNilson, ro_number: str, claimed) -> pd.DataFrame:
+    """The job's nilson frame: the prepared log with this RO on its claimed rows."""
+    data_n = prepared.full_frame()
+    data_n.iloc[claimed, data_n.columns.get_loc("RO Number")] = ro_number
+    return data_n
+
+
+def find_unmatched_records(schedule_df: pd.DataFrame, nilson, ro_number: str, diagnostics=True, progress=None,
+                           unavailable=None):
+    """
+    Match schedule spots against the nilson log for one RO.
+
+    `nilson` is a raw nilson DataFrame or a PreparedNilson; with the latter
+    only the schedule side is processed here.
+
+    Returns (unmatched, all, nilson). The schedule frames carry compact status
+    codes in STATE_COLUMNS; render them with render_monitoring_frame before
+    export. With diagnostics=False, spots without any candidate record are
+    reported as "No match" instead of listing which key was not found.
+    progress and unavailable are passed on to match_schedule.
+    """
+    prepared = nilson if isinstance(nilson, PreparedNilson) else prepare_nilson(nilson)
+    unmatched_records, all_records, claimed = match_schedule(
+        schedule_df, prepared, diagnostics, progress, unavailable=unavailable
+    )
+    return unmatched_records, all_records, claim_nilson(prepared, ro_number, claimed)
+
+
+# --- rendering of compact results (only when serialized) ---
+
+def render_statuses(df: pd.DataFrame) -> list:
+    """Aired_Status text for every row of a compact result frame."""
+    out = []
+    for code, param, param2, start, end in zip(
+        df["Aired_Status_Code"], df["Aired_Status_Param"], df["Aired_Status_Param2"],
+        df["Aired_Window_Start"], df["Aired_Window_End"],
+    ):
+        if code == STATUS_AIRED:
+            out.append("Aired")
+        elif code == STATUS_OUTSIDE_DAYPART:
+            out.append("Tag/Sponsorship program outside allowed time ranges (6AM-6PM or 6PM-10:59PM)")
+        elif code == STATUS_KEY_MISSING:
+            reason_parts = [f"{label} not found" for bit, label in enumerate(KEY_LABELS) if param & (1 << bit)]
+            out.append(" & ".join(reason_parts) if reason_parts else "No match")
+        elif code == STATUS_CONSUMED:
+            out.append(
+                f"Found 0 available matches, but {param} records existed in range "
+                f"{format_seconds(start)}-{format_seconds(end)} (consumed by other spots)"
+            )
+        elif code == STATUS_NO_THEME_OR_TIME:
+            out.append(f"No matching available theme or time found in range {format_seconds(start)} to {format_seconds(end)}")
+        elif code == STATUS_NO_PROGRAM_TIME:
+            out.append(f"No matching program time found in range {format_seconds(start)} to {format_seconds(end)}")
+        else:
+            out.append(f"Found only {param} matches, needed {param2} more")
+    return out
+
+
+def materialize_row_data(match_pos, nilson_df: pd.DataFrame) -> list:
+    """
+    Aired_Row_Data text: the matched nilson row joined with " _ ", as the row
+    read when the spot was matched (before the RO Number was written).
+    """
+    match_pos = np.asarray(match_pos, dtype=np.int64)
+    out = [""] * len(match_pos)
+    hit = np.flatnonzero(match_pos != NO_ROW)
+    if len(hit) == 0:
+        return out
+
+    rows = nilson_df.iloc[match_pos[hit]]
+    if "RO Number" in rows.columns:
+        rows = rows.assign(**{"RO Number": ""})
+    for k, values in zip(hit, rows.itertuples(index=False, name=None)):
+        out[k] = " _ ".join(str(val) for val in values)
+    return out
+
+
+def render_monitoring_frame(df: pd.DataFrame, nilson_df: pd.DataFrame) -> pd.DataFrame:
+    """Compact result frame -> export/preview frame with Aired_Status and Aired_Row_Data."""
+    out = df.drop(columns=STATE_COLUMNS)
+    out["Aired_Status"] = render_statuses(df)
+    out["Aired_Row_Data"] = materialize_row_data(df["Aired_Nilson_Row"], nilson_df)
+    return out
+
+
+def claim_owners(original_nilson: pd.DataFrame, claims) -> np.ndarray:
+    """
+    "RO Number" per nilson row from the per-RO claims, applied in order so a
+    later RO overwrites an earlier one; rows nobody claimed keep the original
+    value (or "" when the log has no RO Number column).
+    """
+    if "RO Number" in original_nilson.columns:
+        owners = original_nilson["RO Number"].to_numpy(dtype=object).copy()
+    else:
+        owners = np.full(len(original_nilson), "", dtype=object)
+    for ro_number, positions in claims:
+        if len(positions):
+            owners[positions] = ro_number
+    return owners
+
+
+class ClaimLedger:
+    """
+    Owner of every nilson row of a session: owner[row] indexes ro_numbers,
+    NO_OWNER where nobody claimed the row. Built from the session's claims
+    in order (a later claim of a row takes it over, as in claim_owners) and
+    updated as jobs are published, so lookups never scan the log.
+
+    In "exclusive" claim mode a monitor run matches with
+    unavailable(ro_number) so records held by other ROs are skipped; in
+    "independent" mode ROs match on the whole log and the records they share
+    are reported by record(). recorded counts the claims recorded, i.e. how
+    far into the session's claim list the ledger is.
+    """
+
+    def __init__(self, size, claims=()):
+        self.owner = np.full(size, NO_OWNER, dtype=np.int32)
+        self.ro_numbers = []
+        self.recorded = 0
+        self._ro_index = {}
+        for ro_number, positions in claims:
+            self.record(ro_number, positions)
+
+    def copy(self):
+        ledger = ClaimLedger(0)
+        ledger.owner = self.owner.copy()
+        ledger.ro_numbers = list(self.ro_numbers)
+        ledger.recorded = self.recorded
+        ledger._ro_index = dict(self._ro_index)
+        return ledger
+
+    def unavailable(self, ro_number=None) -> np.ndarray:
+        """Rows claimed by an RO other than ro_number, as a bool mask."""
+        mask = self.owner != NO_OWNER
+        idx = self._ro_index.get(ro_number)
+        if idx is not None:
+            mask &= self.owner != idx
+        return mask
+
+    def conflicts(self, ro_number, positions) -> dict:
+        """{other RO: count} of positions already claimed by other ROs."""
+        owners = self.owner[np.asarray(positions, dtype=np.int64)]
+        others = owners[(owners != NO_OWNER) & (owners != self._ro_index.get(ro_number, NO_OWNER))]
+        values, counts = np.unique(others, return_counts=True)
+        return {self.ro_numbers[v]: int(c) for v, c in zip(values, counts)}
+
+    def record(self, ro_number, positions) -> dict:
+        """Give positions to ro_number; returns the conflicts() they had."""
+        conflicts = self.conflicts(ro_number, positions)
+        idx = self._ro_index.get(ro_number)
+        if idx is None:
+            idx = self._ro_index[ro_number] = len(self.ro_numbers)
+            self.ro_numbers.append(ro_number)
+        if len(positions):
+            self.owner[np.asarray(positions, dtype=np.int64)] = idx
+        self.recorded += 1
+        return conflicts
+
+
+# --- batch runs ---
+
+def channel_partitions(schedules) -> list:
+    """
+    Group batch items (by index) into partitions that share no channel.
+
+    Nilson buckets are keyed by channel, so items in different partitions can
+    never compete for the same records and may run in any process; items in
+    one partition stay together, in input order.
+    """
+    groups = []  # [(channel set, item indices)]
+    for i, schedule_df in enumerate(schedules):
+        if "Channel" in schedule_df.columns:
+            channels = set(schedule_df["Channel"].dropna().astype(str).str.strip().str.lower())
+        else:
+            channels = set()
+        overlapping = [g for g in groups if g[0] & channels]
+        merged = (set(channels), [])
+        for g in overlapping:
+            merged[0].update(g[0])
+            merged[1].extend(g[1])
+            groups.remove(g)
+        merged[1].append(i)
+        merged[1].sort()
+        groups.append(merged)
+    return [items for _, items in groups]
+
+
+def match_partition(prepared: PreparedNilson, schedules, diagnostics=True, ledger=None, ro_numbers=()) -> list:
+    """
+    Worker entry point: match_schedule for each schedule of one partition, in order.
+    With a ledger (exclusive claims), each schedule skips the records held by
+    other ROs, including those claimed by earlier schedules of the partition.
+    """
+    results = []
+    if ledger is not None:
+        ledger = ledger.copy()
+    for k, schedule_df in enumerate(schedules):
+        unavailable = None if ledger is None else ledger.unavailable(ro_numbers[k])
+        results.append(match_schedule(schedule_df, prepared, diagnostics, unavailable=unavailable))
+        if ledger is not None:
+            ledger.record(ro_numbers[k], results[-1][2])
+    return results
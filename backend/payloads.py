@@ -0,0 +1,126 @@
+"""
+JSON payloads for previews and API responses.
+
+Frames are converted a column at a time and sent column-oriented
+({"columns": [...], "columnData": [[...], ...]}) rather than as one dict per
+row. Responses are encoded with orjson when it is installed and gzipped when
+the client accepts it.
+"""
+import gzip
+from datetime import date, datetime, time
+
+import numpy as np
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+import metrics
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib json
+    orjson = None
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIME_FORMAT = "%H:%M:%S"
+
+# below this the gzip header and CPU cost outweigh the savings
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+
+
+def _cell_text(x):
+    if isinstance(x, time):
+        return x.strftime(TIME_FORMAT)
+    if isinstance(x, datetime):
+        return x.strftime(DATETIME_FORMAT)
+    return x
+
+
+def column_values(s: pd.Series) -> list:
+    """JSON-safe list for one column: datetimes/times as text, missing cells as ""."""
+    missing = s.isna().to_numpy()
+
+    if pd.api.types.is_datetime64_any_dtype(s):
+        values = s.dt.strftime(DATETIME_FORMAT).to_numpy(dtype=object)
+    elif s.dtype == object:
+        # cells repeat a lot (times, dates, programs): convert each distinct value once
+        codes, uniques = pd.factorize(s, use_na_sentinel=True)
+        converted = np.empty(len(uniques) + 1, dtype=object)
+        converted[:-1] = [_cell_text(u) for u in uniques]
+        values = converted[codes]
+    else:
+        # tolist() gives native Python scalars
+        values = s.tolist()
+        if missing.any():
+            values = ["" if m else v for v, m in zip(values, missing)]
+        return values
+
+    if missing.any():
+        values = values.copy()
+        values[missing] = ""
+    return values.tolist()
+
+
+def frame_columns(df: pd.DataFrame) -> list:
+    return [column_values(df.iloc[:, i]) for i in range(df.shape[1])]
+
+
+def preview_payload(df: pd.DataFrame, total_rows=None) -> dict:
+    with metrics.stage("preview"):
+        return {
+            "columns": [str(c) for c in df.columns],
+            "columnData": frame_columns(df),
+            "totalRows": int(len(df) if total_rows is None else total_rows)
+        }
+
+
+# ---------- encoding ----------
+
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def _default(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, (datetime, date, time, pd.Timestamp)):
+        return o.isoformat()
+    return str(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify through orjson (numpy aware); the stdlib provider when it is missing."""
+
+    def dumps(self, obj, **kwargs):
+        with metrics.stage("json"):
+            if orjson is None:
+                kwargs.setdefault("default", _default)
+                return super().dumps(obj, **kwargs)
+            return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def gzip_response(response, accept_encoding: str):
+    """after_request hook body: gzip JSON responses for clients that accept it."""
+    if (
+        response.mimetype != "application/json"
+        or response.direct_passthrough
+        or "gzip" not in (accept_encoding or "").lower()
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    data = response.get_data()
+    if len(data) < GZIP_MIN_BYTES:
+        return response
+
+    with metrics.stage("gzip"):
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+    response.headers.add("Vary", "Accept-Encoding")
+    return response
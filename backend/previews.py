@@ -0,0 +1,80 @@
+"""
+Paged, sorted and filtered views of stored frames for /api/preview.
+
+Only the row positions are worked out over the whole frame; the caller
+renders and serializes just the requested page.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# frames carry the parsed schedule date here; nilson frames only have Date
+DATE_COLUMNS = ["Date_dt", "Date"]
+
+
+def _date_values(df: pd.DataFrame):
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                return df[col]
+            return pd.to_datetime(df[col], dayfirst=True, errors="coerce")
+    return None
+
+
+def query_positions(df: pd.DataFrame, filters=None, sort=None, descending=False,
+                    date_from=None, date_to=None) -> np.ndarray:
+    """
+    Row positions of df that pass the filters, in sort order.
+
+    filters: {column: text}, a case-insensitive substring match on the cell
+    text; unknown columns are ignored. date_from/date_to (inclusive
+    Timestamps) apply to Date_dt, or Date when absent. Sorting by Date is by
+    the same dates, not the DD/MM/YYYY text.
+    """
+    keep = np.ones(len(df), dtype=bool)
+
+    for col, text in (filters or {}).items():
+        if col not in df.columns or text in (None, ""):
+            continue
+        cells = df[col].astype(object).where(df[col].notna(), "").astype(str)
+        keep &= cells.str.contains(str(text), case=False, regex=False).to_numpy(dtype=bool)
+
+    if date_from or date_to:
+        dates = _date_values(df)
+        if dates is not None:
+            if date_from:
+                keep &= (dates >= date_from).to_numpy(dtype=bool)
+            if date_to:
+                keep &= (dates <= date_to).to_numpy(dtype=bool)
+
+    positions = np.flatnonzero(keep)
+    if sort and sort in df.columns and len(positions) > 1:
+        values = df[sort]
+        if sort == "Date":
+            dates = _date_values(df)
+            values = dates if dates.notna().any() else values
+        values = values.iloc[positions]
+        try:
+            order = values.reset_index(drop=True).sort_values(
+                ascending=not descending, kind="stable", na_position="last"
+            ).index.to_numpy()
+        except TypeError:
+            # mixed cell types from the sheet; fall back to text order
+            order = values.astype(str).reset_index(drop=True).sort_values(
+                ascending=not descending, kind="stable"
+            ).index.to_numpy()
+        positions = positions[order]
+    return positions
+
+
+def page_slice(total, page=1, page_size=PAGE_SIZE):
+    """(page, page_size, start, stop, page_count) with page and page_size clamped to range."""
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    page_count = max(1, math.ceil(total / page_size))
+    page = max(1, min(int(page), page_count))
+    start = (page - 1) * page_size
+    return page, page_size, start, min(start + page_size, total), page_count
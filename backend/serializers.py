@@ -0,0 +1,237 @@
+"""
+Payload serializers for storage.py.
+
+A payload is a dict of DataFrames plus small JSON-able values (meta, summary).
+Frames are written column-wise as compressed Arrow IPC (or Parquet) with a JSON
+header alongside; the pickle serializer is kept as the fallback and for keys
+written before the switch. STORAGE_FORMAT selects arrow | parquet | pickle.
+"""
+import json
+import os
+import pickle
+import struct
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pickle only
+    pa = None
+    pq = None
+
+MAGIC = b"TSMF"
+_HEADER_LEN = struct.Struct(">I")
+
+
+def _is_frame(v):
+    return isinstance(v, pd.DataFrame)
+
+
+class PickleSerializer:
+    name = "pickle"
+
+    def dumps(self, payload: dict) -> bytes:
+        return pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, raw) -> dict:
+        return pickle.loads(raw)
+
+
+class ArrowSerializer:
+    """
+    Envelope: MAGIC | header length | JSON header | section bytes.
+
+    The header holds the JSON-able payload values and, per frame, the offsets
+    of its Arrow section and of a pickled sidecar with the object columns
+    Arrow cannot round-trip exactly (mixed cell types from Excel sheets).
+    """
+
+    name = "arrow"
+
+    def __init__(self, compression="zstd"):
+        if pa is None:
+            raise RuntimeError("pyarrow is required for the arrow/parquet storage formats")
+        self.compression = compression
+
+    # --- frame <-> bytes ---
+
+    def _write_table(self, table) -> bytes:
+        sink = pa.BufferOutputStream()
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def _read_table(self, buf):
+        return pa.ipc.open_stream(buf).read_all()
+
+    def _split_frame(self, df: pd.DataFrame):
+        """(frame for arrow, sidecar columns, time columns whose nulls are NaT)"""
+        sidecar = {}
+        nat_time_cols = []
+        for col in df.columns:
+            s = df[col]
+            if s.dtype != object:
+                continue
+            if pd.api.types.infer_dtype(s, skipna=True) == "time":
+                null_kinds = {type(v) for v in s[s.isna()]}
+                if null_kinds <= {type(pd.NaT)}:
+                    if null_kinds:
+                        nat_time_cols.append(col)
+                    continue
+                if null_kinds <= {type(None)}:
+                    continue
+            sidecar[col] = s
+        return df.drop(columns=list(sidecar)), sidecar, nat_time_cols
+
+    def _dump_frame(self, df: pd.DataFrame):
+        if not df.columns.is_unique or not all(isinstance(c, str) for c in df.columns):
+            return {"pickled": True}, [pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)]
+
+        arrow_df, sidecar, nat_time_cols = self._split_frame(df)
+        try:
+            table = pa.Table.from_pandas(arrow_df, preserve_index=None)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            return {"pickled": True}, [pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)]
+
+        info = {
+            "columns": list(df.columns),
+            "sidecar": list(sidecar),
+            "nat_time_cols": nat_time_cols,
+        }
+        sections = [self._write_table(table)]
+        if sidecar:
+            sections.append(pickle.dumps(sidecar, protocol=pickle.HIGHEST_PROTOCOL))
+        return info, sections
+
+    def _load_frame(self, info, sections) -> pd.DataFrame:
+        if info.get("pickled"):
+            return pickle.loads(sections[0])
+
+        table = self._read_table(sections[0])
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+
+        for col in info["nat_time_cols"]:
+            values = df[col].to_numpy(dtype=object)
+            values[pd.isna(values)] = pd.NaT
+            df[col] = pd.Series(values, index=df.index, dtype=object)
+
+        if info["sidecar"]:
+            sidecar = pickle.loads(sections[1])
+            for col, s in sidecar.items():
+                df[col] = s.to_numpy(dtype=object)
+            df = df[info["columns"]]
+        return df
+
+    # --- payload <-> bytes ---
+
+    def dumps(self, payload: dict) -> bytes:
+        header = {"format": self.name, "values": {}, "frames": {}}
+        blobs = []
+        offset = 0
+        for key, value in payload.items():
+            if _is_frame(value):
+                info, sections = self._dump_frame(value)
+                info["sections"] = []
+                for section in sections:
+                    info["sections"].append([offset, len(section)])
+                    blobs.append(section)
+                    offset += len(section)
+                header["frames"][key] = info
+            else:
+                header["values"][key] = value
+
+        header_bytes = json.dumps(header, default=str).encode("utf-8")
+        return b"".join([MAGIC, _HEADER_LEN.pack(len(header_bytes)), header_bytes] + blobs)
+
+    def loads(self, raw) -> dict:
+        view = memoryview(raw)
+        (header_len,) = _HEADER_LEN.unpack_from(view, len(MAGIC))
+        start = len(MAGIC) + _HEADER_LEN.size
+        header = json.loads(bytes(view[start:start + header_len]))
+        body = start + header_len
+
+        # sections are sliced without copying; arrow reads straight from the buffer
+        buf = pa.py_buffer(raw)
+        payload = dict(header["values"])
+        for key, info in header["frames"].items():
+            sections = [buf.slice(body + off, length) for off, length in info["sections"]]
+            payload[key] = self._load_frame(info, sections)
+        return payload
+
+
+class ParquetSerializer(ArrowSerializer):
+    name = "parquet"
+
+    def _write_table(self, table) -> bytes:
+        sink = pa.BufferOutputStream()
+        pq.write_table(table, sink, compression=self.compression)
+        return sink.getvalue().to_pybytes()
+
+    def _read_table(self, buf):
+        return pq.read_table(pa.BufferReader(buf))
+
+
+SERIALIZERS = {
+    "pickle": PickleSerializer,
+    "arrow": ArrowSerializer,
+    "parquet": ParquetSerializer,
+}
+
+
+def get_serializer(name=None):
+    name = (name or os.getenv("STORAGE_FORMAT") or ("arrow" if pa is not None else "pickle")).lower()
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown STORAGE_FORMAT: {name}")
+    return SERIALIZERS[name]()
+
+
+def loads(raw) -> dict:
+    """Deserialize a stored payload, whichever serializer wrote it."""
+    if bytes(raw[:len(MAGIC)]) != MAGIC:
+        return PickleSerializer().loads(raw)
+    view = memoryview(raw)
+    (header_len,) = _HEADER_LEN.unpack_from(view, len(MAGIC))
+    start = len(MAGIC) + _HEADER_LEN.size
+    fmt = json.loads(bytes(view[start:start + header_len]))["format"]
+    return SERIALIZERS[fmt]().loads(raw)
+
+
+def compare_serializers(payload: dict, names=("pickle", "arrow", "parquet"), repeat=3) -> dict:
+    """Size and dumps/loads latency (best of `repeat`) of each serializer on one payload."""
+    report = {}
+    for name in names:
+        ser = get_serializer(name)
+        dump_times, load_times = [], []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            raw = ser.dumps(payload)
+            t1 = time.perf_counter()
+            ser.loads(raw)
+            t2 = time.perf_counter()
+            dump_times.append(t1 - t0)
+            load_times.append(t2 - t1)
+        report[name] = {
+            "bytes": len(raw),
+            "dumps_ms": round(min(dump_times) * 1000, 2),
+            "loads_ms": round(min(load_times) * 1000, 2),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    # python serializers.py nilson.xlsx -> compare formats on a session payload
+    import sys
+
+    from ingest import read_nilson
+    from monitoring import prepare_nilson
+
+    nilson = read_nilson(sys.argv[1])
+    # what storage.create_session stores
+    payload = {"original_nilson_df": nilson, "claim_mode": "independent"}
+    payload.update(prepare_nilson(nilson).to_payload())
+    report = compare_serializers(payload)
+    print(json.dumps(report, indent=2))
@@ -1,9 +1,16 @@
 import os
+import hashlib
+import json
 import redis
-import pickle
-import time
+import uuid
+import numpy as np
+import pandas as pd
 from dotenv import load_dotenv
 
+import metrics
+import serializers
+from cache import LRUCache, payload_size
+
 load_dotenv()
 
 REDIS_URL = os.getenv("REDIS_URL")
@@ -13,66 +20,432 @@ if not REDIS_URL:
 
 r = redis.from_url(REDIS_URL, decode_responses=False)
 
+# arrow | parquet | pickle, see serializers.py; reads detect the format themselves
+serializer = serializers.get_serializer(os.getenv("STORAGE_FORMAT"))
+
 
 EXTRACT_TTL = 60 * 60        # 1 hour
 RESULT_TTL = 60 * 60 * 2    # 2 hours
+UPLOAD_TTL = 60 * 60         # 1 hour
+JOB_TTL = 60 * 60 * 2       # 2 hours, as long as the results they point to
+
+# Extracts, results, uploads and session payloads are written once and never
+# changed under the same key, so each process keeps the ones it has recently
+# read or written, deserialized (cache.py). 0 turns the cache off.
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+cache = LRUCache(CACHE_MAX_BYTES)
+
+
+def _new_key(kind):
+    # random, not time based: requests on different workers in the same
+    # millisecond must not overwrite each other's keys
+    return f"{kind}:{uuid.uuid4().hex}"
+
+
+def _cache_put(key, value, ttl):
+    if CACHE_MAX_BYTES > 0:
+        cache.put(key, value, payload_size(value), ttl)
+
+
+def _kind(key):
+    return key.split(":", 1)[0]
+
+
+def _redis_timer(op, key):
+    kind = _kind(key)
+    return metrics.timer("tsm_redis_seconds", timing=f"redis.{op}.{kind}", op=op, kind=kind)
+
+
+def _store(key, ttl, payload):
+    """Serialize payload under key with ttl, and keep it in the local cache."""
+    kind = _kind(key)
+    with metrics.stage(f"serialize.{kind}"):
+        raw = serializer.dumps(payload)
+    metrics.observe("tsm_payload_bytes", len(raw), op="put", kind=kind)
+    with _redis_timer("put", key):
+        r.setex(key, ttl, raw)
+    _cache_put(key, payload, ttl)
+
+
+def _cached_get(key, decode=serializers.loads):
+    """Payload under key from the local cache, else from Redis (cached for its remaining TTL)."""
+    if CACHE_MAX_BYTES > 0:
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+    fetched = _fetch(key, decode)
+    if fetched is None:
+        return None
+    value, ttl = fetched
+    _cache_put(key, value, ttl)
+    return value
+
+
+def _fetch(key, decode=serializers.loads):
+    """(payload, remaining TTL in seconds or None) from Redis, None when the key is gone."""
+    with _redis_timer("get", key):
+        pipe = r.pipeline()
+        pipe.get(key)
+        pipe.pttl(key)
+        raw, pttl = pipe.execute()
+    if not raw:
+        return None
+    kind = _kind(key)
+    metrics.observe("tsm_payload_bytes", len(raw), op="get", kind=kind)
+    with metrics.stage(f"deserialize.{kind}"):
+        value = decode(raw)
+    return value, _seconds(pttl)
+
+
+def _remaining_ttl(key):
+    """Remaining TTL of key in Redis in seconds, None when it is gone (or never expires)."""
+    with _redis_timer("ttl", key):
+        return _seconds(r.pttl(key))
+
+
+def _seconds(pttl):
+    return pttl / 1000 if pttl and pttl > 0 else None
+
+
+def cache_stats():
+    return cache.stats()
+
+
+def put_upload(data: bytes):
+    """
+    Store an uploaded workbook once, keyed by its content hash.
+    Uploading the same file again only refreshes the TTL.
+    """
+    upload_id = f"upload:{hashlib.sha256(data).hexdigest()}"
+    with _redis_timer("put", upload_id):
+        if not r.expire(upload_id, UPLOAD_TTL):
+            r.setex(upload_id, UPLOAD_TTL, data)
+    _cache_put(upload_id, data, UPLOAD_TTL)
+    return upload_id
+
+
+def get_upload(upload_id):
+    if not upload_id.startswith("upload:"):
+        return None
+    return _cached_get(upload_id, decode=bytes)
 
 
 def put_extract(df, meta=None):
-    token = f"extract:{int(time.time()*1000)}"
+    token = _new_key("extract")
     payload = {
         "df": df,
         "meta": meta or {}
     }
-    r.setex(token, EXTRACT_TTL, pickle.dumps(payload))
+    _store(token, EXTRACT_TTL, payload)
     return token
 
 
 def get_extract(token):
-    raw = r.get(token)
+    return _cached_get(token)
+
+
+def create_job(kind):
+    """Status document for an async run (see jobs.py), stored as JSON under job:<id>."""
+    job_id = _new_key("job")
+    put_job(job_id, {"id": job_id, "kind": kind, "state": "queued", "stage": "queued", "percent": 0})
+    return job_id
+
+
+def put_job(job_id, status):
+    r.setex(job_id, JOB_TTL, json.dumps(status, default=str))
+
+
+def get_job(job_id):
+    if not job_id.startswith("job:"):
+        return None
+    raw = r.get(job_id)
     if not raw:
         return None
-    return pickle.loads(raw)
+    return json.loads(raw)
 
 
-def put_result(unmatched_df, all_df, nilson_df, summary=None):
-    job_id = f"result:{int(time.time()*1000)}"
+def put_result(unmatched_df, all_df, session_id, ro_number, claimed, summary=None):
+    """
+    The job's nilson frame is not stored: it is the session's log with
+    ro_number on the claimed row positions, built when it is read (see
+    monitoring.claim_nilson). Sessions outlive the results on them.
+    """
+    job_id = _new_key("result")
     payload = {
         "unmatched": unmatched_df,
         "all": all_df,
-        "nilson": nilson_df,
+        "claimed": pd.DataFrame({"position": np.asarray(claimed, dtype=np.int64)}),
+        "session_id": session_id,
+        "ro_number": ro_number,
         "summary": summary or {}
     }
-    r.setex(job_id, RESULT_TTL, pickle.dumps(payload))
+    _store(job_id, RESULT_TTL, payload)
     return job_id
 
 
 def get_result(job_id):
-    raw = r.get(job_id)
-    if not raw:
-        return None
-    return pickle.loads(raw)
+    return _cached_get(job_id)
 
 
 SESSION_TTL = 60 * 60 * 4  # 4 hours
 
-def create_session(original_nilson, full_nilson):
-    session_id = f"session:{int(time.time()*1000)}"
+# A session stores the uploaded nilson frame once under session:<id>. Each
+# monitor run appends its RO's matched nilson rows to session:<id>:claims as a
+# small delta (RO number + packed row positions); full_nilson is only built
+# from the two when it is downloaded. session:<id>:jobs maps the job ids
+# published on the session to their RO, so they can be re-run when the log
+# is extended (extend_session). An extended session stores only the rows it
+# added and lists the sessions holding the rest in session:<id>:bases.
+# session:<id>:mode holds the claim mode, which every run reads, so runs
+# never have to load the payload for it.
+
+
+def _claims_key(session_id):
+    return f"{session_id}:claims"
+
+
+def _jobs_key(session_id):
+    return f"{session_id}:jobs"
+
+
+def _bases_key(session_id):
+    return f"{session_id}:bases"
+
+
+def _mode_key(session_id):
+    return f"{session_id}:mode"
+
+
+def _pack_claim(ro_number, positions):
+    return ro_number.encode("utf-8") + b"\0" + np.asarray(positions, dtype="<u4").tobytes()
+
+
+def _unpack_claim(raw):
+    ro, _, rows = raw.partition(b"\0")
+    return ro.decode("utf-8"), np.frombuffer(rows, dtype="<u4").astype(np.int64)
+
+
+def create_session(original_nilson, prepared_nilson=None, claim_mode="independent"):
+    """
+    prepared_nilson: monitoring.PreparedNilson built from original_nilson;
+    stored alongside so later monitor runs skip the nilson preprocessing.
+    claim_mode: one of monitoring.CLAIM_MODES, for every run on the session.
+    """
+    session_id = _new_key("session")
     payload = {
         "original_nilson_df": original_nilson,
-        "full_nilson_df": full_nilson
+        "claim_mode": claim_mode,
     }
-    r.setex(session_id, SESSION_TTL, pickle.dumps(payload))
+    if prepared_nilson is not None:
+        payload.update(prepared_nilson.to_payload())
+    _store(session_id, SESSION_TTL, payload)
+    _store_claim_mode(session_id, claim_mode)
+    if prepared_nilson is not None:
+        _cache_prepared(session_id, prepared_nilson)
     return session_id
 
+
+def _store_claim_mode(session_id, claim_mode):
+    key = _mode_key(session_id)
+    with _redis_timer("put", key):
+        r.setex(key, SESSION_TTL, claim_mode.encode("utf-8"))
+    _cache_put(key, claim_mode, SESSION_TTL)
+
+
+def get_session_claim_mode(session_id):
+    """The session's claim mode, None if the session is gone."""
+    claim_mode = _cached_get(_mode_key(session_id), decode=lambda raw: raw.decode("utf-8"))
+    if claim_mode is None:
+        # sessions stored before the mode had its own key
+        sess = get_session(session_id)
+        return None if sess is None else sess.get("claim_mode", "independent")
+    return claim_mode
+
 def get_session(session_id):
-    raw = r.get(session_id)
-    if not raw:
+    """The session payload; an extended session's rows come back joined to its base's."""
+    if CACHE_MAX_BYTES > 0:
+        value = cache.get(session_id)
+        if value is not None:
+            return value
+
+    fetched = _fetch(session_id)
+    if fetched is None:
         return None
-    return pickle.loads(raw)
+    payload, ttl = fetched
+    if payload.get("base_session"):
+        base = get_session(payload["base_session"])
+        if base is None:
+            return None
+        payload = _joined_session(base, payload)
+    _cache_put(session_id, payload, ttl)
+    return payload
+
 
-def update_session(session_id, full_nilson):
+def get_session_nilson(session_id, build):
+    """
+    build(session payload), kept in the local cache for the session's
+    remaining lifetime: sessions never change, and rebuilding the prepared
+    log's matching index is most of a monitor run's setup. None if the session is gone.
+    """
+    if CACHE_MAX_BYTES > 0:
+        value = cache.get(_prepared_key(session_id))
+        if value is not None:
+            return value
     sess = get_session(session_id)
-    if sess:
-        sess["full_nilson_df"] = full_nilson
-        r.setex(session_id, SESSION_TTL, pickle.dumps(sess))
+    if sess is None:
+        return None
+    prepared = build(sess)
+    ttl = _remaining_ttl(session_id)
+    if ttl is None:
+        return None
+    _cache_prepared(session_id, prepared, ttl)
+    return prepared
+
+
+def _prepared_key(session_id):
+    return f"{session_id}:prepared"
+
+
+def _cache_prepared(session_id, prepared, ttl=SESSION_TTL):
+    if CACHE_MAX_BYTES > 0:
+        cache.put(_prepared_key(session_id), prepared, prepared.memory_usage(), ttl)
+
+
+def _joined_session(base, part):
+    joined = dict(part)
+    for name in ("original_nilson_df", "prepared_nilson_df"):
+        joined[name] = pd.concat([base[name], part[name]], ignore_index=True)
+    return joined
+
+def add_session_claims(session_id, ro_number, positions, since=0, reject_overlap=False):
+    """
+    Record the nilson row positions matched for one RO and refresh the session TTL.
+
+    The claim is one RPUSH, so concurrent monitor runs on a session (other
+    threads or workers) never overwrite each other; it runs in a WATCHed
+    transaction so nothing is recorded once the session has expired.
+
+    since: how many of the session's claims the run matched against. The
+    claims recorded after those (by runs racing with this one) are read in
+    the same transaction and returned, so the caller can count them as
+    conflicts; with reject_overlap, nothing is recorded if one of them holds
+    any of positions for another RO.
+    Returns (number of claims on the session, or None if the claim was
+    rejected; [(ro_number, positions)] recorded since), or None if the session is gone.
+    """
+    claim = _pack_claim(ro_number, positions)
+    outcome = {}
+
+    def push(pipe):
+        outcome.clear()
+        if not pipe.exists(session_id):
+            return
+        newer = [_unpack_claim(raw) for raw in pipe.lrange(_claims_key(session_id), since, -1)]
+        outcome["newer"] = newer
+        if reject_overlap and any(
+            ro != ro_number and np.intersect1d(rows, positions).size for ro, rows in newer
+        ):
+            outcome["count"] = None
+            return
+        bases = pipe.lrange(_bases_key(session_id), 0, -1)
+        pipe.multi()
+        pipe.rpush(_claims_key(session_id), claim)
+        pipe.expire(_claims_key(session_id), SESSION_TTL)
+        pipe.expire(_jobs_key(session_id), SESSION_TTL)
+        pipe.expire(_bases_key(session_id), SESSION_TTL)
+        pipe.expire(_mode_key(session_id), SESSION_TTL)
+        pipe.expire(session_id, SESSION_TTL)
+        for base in bases:
+            pipe.expire(base, SESSION_TTL)
+
+    with _redis_timer("claim", session_id):
+        # a claim pushed between the read and the RPUSH restarts the transaction
+        result = r.transaction(push, session_id, _claims_key(session_id))
+    if "newer" not in outcome:
+        return None
+    if "count" in outcome:
+        return None, outcome["newer"]
+    for key in (session_id, _prepared_key(session_id), _mode_key(session_id)):
+        cache.touch(key, SESSION_TTL)
+    return result[0], outcome["newer"]
+
+def get_session_claims(session_id):
+    """[(ro_number, row positions)] in the order the monitor runs finished."""
+    with _redis_timer("claims", session_id):
+        raw_claims = r.lrange(_claims_key(session_id), 0, -1)
+    return [_unpack_claim(raw) for raw in raw_claims]
+
+
+def add_session_job(session_id, job_id, ro_number, channel):
+    """Note a job published on the session (after its claims were recorded)."""
+    entry = json.dumps({"roNumber": ro_number, "channel": channel})
+    with _redis_timer("jobs", session_id):
+        pipe = r.pipeline()
+        pipe.hset(_jobs_key(session_id), job_id, entry)
+        pipe.expire(_jobs_key(session_id), SESSION_TTL)
+        pipe.execute()
+
+
+def get_session_jobs(session_id):
+    """{job_id: {"roNumber", "channel"}} of the jobs published on the session."""
+    with _redis_timer("jobs", session_id):
+        raw_jobs = r.hgetall(_jobs_key(session_id))
+    return {job_id.decode("utf-8"): json.loads(entry) for job_id, entry in raw_jobs.items()}
+
+
+def extend_session(session_id, prepared_nilson, start, claim_mode="independent"):
+    """
+    A new session over session_id's log extended from row `start` on
+    (PreparedNilson.appended), starting with session_id's claims; returns
+    its id, or None if session_id is gone.
+
+    Sessions are never rewritten (cached payloads are keyed by their
+    storage key), so the extended log gets its own id. It stores only the
+    added rows and reads the rest from session_id, whose TTL it keeps
+    refreshing; appended rows come after the existing ones, so the claims
+    keep pointing at the same records.
+    """
+    base = get_session(session_id)
+    if base is None:
+        return None
+    with _redis_timer("claims", session_id):
+        pipe = r.pipeline()
+        pipe.lrange(_claims_key(session_id), 0, -1)
+        pipe.lrange(_bases_key(session_id), 0, -1)
+        raw_claims, bases = pipe.execute()
+
+    new_id = _new_key("session")
+    joined = {"original_nilson_df": prepared_nilson.original, "claim_mode": claim_mode}
+    joined.update(prepared_nilson.to_payload())
+    if "prepared_nilson_df" in base:
+        part = {
+            "base_session": session_id,
+            "original_nilson_df": prepared_nilson.original.iloc[start:],
+            "claim_mode": claim_mode,
+        }
+        part.update(prepared_nilson.to_payload(start))
+        joined["base_session"] = session_id
+        chain = [*(b.decode("utf-8") for b in bases), session_id]
+    else:
+        part, chain = joined, []
+    _store(new_id, SESSION_TTL, part)
+    _store_claim_mode(new_id, claim_mode)
+    # this process already has the whole log
+    _cache_put(new_id, joined, SESSION_TTL)
+    _cache_prepared(new_id, prepared_nilson)
+
+    with _redis_timer("claim", new_id):
+        pipe = r.pipeline()
+        if raw_claims:
+            pipe.rpush(_claims_key(new_id), *raw_claims)
+            pipe.expire(_claims_key(new_id), SESSION_TTL)
+        if chain:
+            pipe.rpush(_bases_key(new_id), *chain)
+            pipe.expire(_bases_key(new_id), SESSION_TTL)
+        for key in chain:
+            pipe.expire(key, SESSION_TTL)
+        pipe.execute()
+    for key in chain:
+        cache.touch(key, SESSION_TTL)
+    return new_id
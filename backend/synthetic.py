@@ -0,0 +1,152 @@
+"""
+Synthetic schedule workbooks and nilson logs for benchmarks and tests.
+
+schedule_workbook() writes sheets in the layout extract_schedule_grid reads:
+a merged "Mon - YYYY" cell per month three rows above the "Program" header
+row, day numbers one row above it, and the spot grid from column S.
+nilson_for_schedule() airs a share of an extracted schedule's spots inside
+their time slots, and nilson_log() adds unrelated rows to reach any scale.
+"""
+import calendar
+import io
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+from monitoring import parse_schedule_times
+
+PROGRAMS = ["News", "Drama Hour", "Morning Show", "Movie", "Cartoon", "Late Show",
+            "Sports Round", "Tag", "Sponsorship - Weather"]
+THEMES = ["Normal", "Tag", "-Tr", "-BB", " Com Break", "-Extro"]
+CHANNELS = ["TV One", "TV Two", "TV Three", "News 24"]
+ADVERTISERS = ["AcmeCo", "Beta Ltd", "Gamma Foods", "Delta Telecom", "Epsilon Bank"]
+
+# (start, end) in minutes past midnight, each written in one of the styles
+# schedules use
+SLOTS = [(6 * 60, 6 * 60 + 30), (7 * 60, 8 * 60), (10 * 60, 10 * 60 + 30), (12 * 60 + 30, 13 * 60),
+         (18 * 60, 19 * 60), (20 * 60, 20 * 60 + 30), (21 * 60, 22 * 60), (22 * 60 + 30, 23 * 60)]
+HEADERS = ["Program", "Com Name", "Duration", "Language", "Genre", "Time", "Slots", "NRate", "NCost"]
+FIRST_DAY_COLUMN = 19  # S
+
+
+def _slot_text(start, end, style):
+    if style == 0:
+        return f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+
+    def twelve(m):
+        h = m // 60 % 12 or 12
+        return f"{h}.{m % 60:02d} {'AM' if m < 12 * 60 else 'PM'}"
+    return f"{twelve(start)} - {twelve(end)}"
+
+
+def schedule_workbook(programs=40, months=((2026, 1), (2026, 2)), sheets=1, density=0.15,
+                      header_row=8, seed=0) -> bytes:
+    """
+    xlsx bytes with `sheets` schedule sheets ("Sheet 1", ...) plus an empty
+    "Final KPIs" sheet. Each sheet has `programs` program rows over the given
+    (year, month) pairs; a day cell holds 1-3 spots with probability `density`.
+    """
+    rng = np.random.default_rng(seed)
+    wb = Workbook(write_only=True)
+    days = [(y, m, d) for y, m in months for d in range(1, calendar.monthrange(y, m)[1] + 1)]
+    last_col = FIRST_DAY_COLUMN + len(days) - 1
+
+    for s in range(sheets):
+        ws = wb.create_sheet(f"Sheet {s + 1}")
+        merges = []
+        rows = [[None] * last_col for _ in range(header_row)]
+        rows[0][0] = "Media Plan"
+        rows[header_row - 1][:len(HEADERS)] = HEADERS
+        col = FIRST_DAY_COLUMN
+        for y, m in months:
+            n = calendar.monthrange(y, m)[1]
+            rows[header_row - 4][col - 1] = f"{calendar.month_abbr[m]} - {y}"
+            merges.append((col, col + n - 1))
+            rows[header_row - 2][col - 1:col - 1 + n] = list(range(1, n + 1))
+            col += n
+
+        for row in rows:
+            ws.append(row)
+
+        spots = rng.choice([1, 1, 1, 2, 3], size=(programs, len(days)))
+        spots[rng.random((programs, len(days))) >= density] = 0
+        for p in range(programs):
+            start, end = SLOTS[rng.integers(len(SLOTS))]
+            cells = spots[p].tolist()
+            ws.append([
+                PROGRAMS[rng.integers(len(PROGRAMS))], f"CN{p}", int(rng.choice([15, 30, 45])), "S", None,
+                _slot_text(start, end, int(rng.integers(2))), None, 1000.0, float(rng.choice([800, 900.25]))
+            ] + [None] * (FIRST_DAY_COLUMN - 1 - len(HEADERS)) + [c or None for c in cells])
+        ws.append(["Total"] + [None] * (last_col - 1))
+
+        # write-only sheets take merges as range strings
+        for first, last in merges:
+            ws.merged_cells.ranges.add(_range(header_row - 3, first, last))
+
+    wb.create_sheet("Final KPIs")
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def _range(row, first_col, last_col):
+    return f"{get_column_letter(first_col)}{row}:{get_column_letter(last_col)}{row}"
+
+
+def nilson_for_schedule(schedule_df: pd.DataFrame, aired=0.8, seed=0) -> pd.DataFrame:
+    """
+    Nilson rows for an extracted schedule: each spot airs with probability
+    `aired`, on its date and channel, inside its time slot.
+    """
+    rng = np.random.default_rng(seed)
+    spots = schedule_df[rng.random(len(schedule_df)) < aired]
+    times = spots["Time"].astype(str).str.split("-", n=1, expand=True)
+    start = parse_schedule_times(times[0].str.strip())
+    end = parse_schedule_times(times[1].str.strip())
+    length = np.maximum(end - start, 60)
+    air = start + (rng.random(len(spots)) * length).astype(np.int64)
+    dates = pd.to_datetime(spots["Date"], dayfirst=True)
+
+    return pd.DataFrame({
+        "Channel": spots["Channel"].to_numpy(),
+        "Advertiser": spots["Advertiser"].to_numpy(),
+        "Dd": dates.dt.day.to_numpy(),
+        "Mn": dates.dt.month.to_numpy(),
+        "Yr": dates.dt.year.to_numpy(),
+        "Dur": spots["Dur"].to_numpy(),
+        "Prog_time": _clock(start),
+        "Advt_time": _clock(air),
+        "Advt_Theme": "Normal",
+        "Program": spots["Program"].to_numpy(),
+    })
+
+
+def nilson_log(rows, start="2026-01-01", days=59, channels=CHANNELS, advertisers=ADVERTISERS,
+               seed=0) -> pd.DataFrame:
+    """`rows` random nilson rows over `days` days from `start`, spread over channels and advertisers."""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp(start) + pd.to_timedelta(rng.integers(days, size=rows), unit="D")
+    air = rng.integers(5 * 3600, 24 * 3600, size=rows)
+    prog = np.maximum(air - rng.integers(0, 1800, size=rows), 0)
+    advt = _clock(air).astype(object)
+    advt[rng.random(rows) < 0.05] = None  # some rows only carry the program time
+
+    return pd.DataFrame({
+        "Channel": np.asarray(channels, dtype=object)[rng.integers(len(channels), size=rows)],
+        "Advertiser": np.asarray(advertisers, dtype=object)[rng.integers(len(advertisers), size=rows)],
+        "Dd": dates.day,
+        "Mn": dates.month,
+        "Yr": dates.year,
+        "Dur": rng.choice([15, 30, 45], size=rows),
+        "Prog_time": _clock(prog),
+        "Advt_time": advt,
+        "Advt_Theme": np.asarray(THEMES, dtype=object)[rng.integers(len(THEMES), size=rows)],
+        "Program": np.asarray(PROGRAMS, dtype=object)[rng.integers(len(PROGRAMS), size=rows)],
+    })
+
+
+def _clock(secs) -> np.ndarray:
+    secs = np.asarray(secs, dtype=np.int64)
+    return np.array([f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in secs.tolist()], dtype=object)
@@ -0,0 +1,50 @@
+import pandas as pd
+
+import cache as cache_module
+from cache import LRUCache, payload_size
+
+
+def test_hits_and_misses():
+    cache = LRUCache(1000)
+    assert cache.get("a") is None
+    cache.put("a", "value", 10)
+    assert cache.get("a") == "value"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 10)
+
+
+def test_least_recently_used_is_evicted():
+    cache = LRUCache(30)
+    for key in "abc":
+        cache.put(key, key, 10)
+    cache.get("a")
+    cache.put("d", "d", 10)
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["a", "c", "d"]
+    assert cache.stats()["evictions"] == 1
+
+    cache.put("big", "big", 31)
+    assert cache.get("big") is None
+    assert cache.stats()["bytes"] == 30
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = LRUCache(100)
+    cache.put("a", "a", 10, ttl=5)
+    cache.put("b", "b", 10, ttl=5)
+    now[0] += 4
+    cache.touch("b", 5)
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.get("b") == "b"
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["bytes"] == 10
+
+
+def test_payloads_are_charged_their_frames_in_memory():
+    df = pd.DataFrame({"text": [f"row {i} " * 5 for i in range(1000)], "n": range(1000)})
+    size = payload_size({"df": df, "meta": {}})
+    assert size >= df.memory_usage(deep=True).sum()
+    assert payload_size(b"12345") == 5
@@ -0,0 +1,81 @@
+import datetime as dt
+import io
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from exporters import iter_csv, iter_full_nilson_csv, new_workbook, save_workbook, write_sheet
+
+
+def _nilson(n):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Channel": rng.choice(["tv one", "tv two"], n),
+        "Advertiser": rng.choice(["acme", "globex", "initech"], n),
+        "Dd": rng.integers(1, 29, n),
+        "Mn": 1,
+        "Yr": 2026,
+        "Dur": rng.choice([15, 30, 45], n),
+        "Prog_time": [f"{h:02d}:{m:02d}:00" for h, m in zip(rng.integers(0, 24, n), rng.integers(0, 60, n))],
+        "Advt_Theme": rng.choice(["Com Break", "Tag", "Promo"], n),
+        "Program": rng.choice(["news", "movie", "cartoon"], n),
+    })
+
+
+def test_csv_matches_to_csv():
+    df = _nilson(1234)
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, encoding="utf-8-sig")
+    assert b"".join(iter_csv(df, chunk_rows=100)) == buf.getvalue()
+
+
+def _export_peak(n, chunk_rows=2000):
+    """(csv bytes, peak traced bytes) while streaming full_nilson for an n-row log."""
+    df = _nilson(n)
+    claims = [("RO1", np.arange(0, n, 7)), ("RO2", np.arange(0, n, 11))]
+
+    tracemalloc.start()
+    try:
+        total = 0
+        for chunk in iter_full_nilson_csv(df, claims, chunk_rows=chunk_rows):
+            total += len(chunk)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return total, peak
+
+
+def test_full_nilson_export_memory_is_bounded():
+    small_total, small_peak = _export_peak(20_000)
+    total, peak = _export_peak(100_000)
+
+    # a fraction of the file is alive at once ...
+    assert peak < total / 2
+    # ... and 5x the rows only adds the per-row owners column (8 bytes a row), not the CSV
+    assert peak - small_peak < 16 * (100_000 - 20_000)
+    assert total > 4 * small_total
+
+
+def test_sheet_cells_keep_values_and_formats():
+    df = pd.DataFrame({
+        "Date": pd.to_datetime(["2026-01-02", None, "1900-02-28"]),
+        "Aired": pd.to_datetime(["2026-01-02 20:15:30", "1900-03-01 06:00:00", None]),
+        "Advt_time": [dt.time(20, 15, 30), pd.NaT, dt.time(0, 0, 1)],
+        "Dur": [30, 15, 45],
+        "Program": pd.array(["news", "", "=1+1"], dtype="string"),
+    })
+    wb = new_workbook()
+    write_sheet(wb, "Nilson", df, chunk_rows=2)
+    rows = list(load_workbook(save_workbook(wb)).active.iter_rows())
+
+    assert [c.value for c in rows[0]] == list(df.columns)
+    cells = [{c.column_letter: (c.value, c.number_format) for c in row if c.value is not None} for row in rows[1:]]
+    assert cells == [
+        {"A": (dt.datetime(2026, 1, 2), "DD/MM/YYYY"), "B": (dt.datetime(2026, 1, 2, 20, 15, 30), "YYYY-MM-DD HH:MM:SS"),
+         "C": (dt.time(20, 15, 30), "h:mm:ss"), "D": (30, "General"), "E": ("news", "General")},
+        {"B": (dt.datetime(1900, 3, 1, 6), "YYYY-MM-DD HH:MM:SS"), "D": (15, "General")},
+        {"A": (dt.datetime(1900, 2, 28), "DD/MM/YYYY"), "C": (dt.time(0, 0, 1), "h:mm:ss"),
+         "D": (45, "General"), "E": ("=1+1", "General")},
+    ]
@@ -0,0 +1,103 @@
+import datetime as dt
+import io
+
+import pandas as pd
+import pytest
+import xlsxwriter
+from openpyxl import Workbook
+from openpyxl.cell.rich_text import CellRichText, TextBlock
+from openpyxl.cell.text import InlineFont
+from pandas.testing import assert_frame_equal
+
+import synthetic
+from ingest import NILSON_TEXT_COLUMNS, read_nilson, read_xlsx
+
+HEADER = ["Advertiser", "Channel", "Dd", "Dur", "Prog_time", "Advt_time", "Aired", "Length",
+          "Flag", "Note", "", "Note", 2026]
+
+
+def _rows():
+    return [
+        ["Acme", "TV One", 1, 30, dt.time(18, 0), dt.time(18, 12, 5), dt.datetime(2026, 3, 1, 18, 12),
+         dt.timedelta(hours=30), True, "NA", "x", 1.5, 7],
+        ["24", "TV One", 2, "45", "18:00:00", 1830, dt.datetime(2026, 3, 2), dt.timedelta(minutes=5),
+         False, None, None, 2, "7"],
+        [None] * len(HEADER),
+        [1234, None, 3.0, 15.5, None, "18:40:00", None, None, True, "#N/A", "y", "z", None],
+        ["Globex", "TV Two", None, 30, dt.time(9, 30), dt.time(9, 31), dt.datetime(2026, 3, 4), None,
+         False, "null", None, None, 8],
+    ]
+
+
+def _openpyxl_workbook():
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADER)
+    for row in _rows():
+        ws.append(row)
+    ws["H2"].number_format = "[h]:mm:ss"
+    ws["G3"].number_format = "dd/mm/yyyy"
+    ws["J6"] = "=NA()"
+    ws["J6"].data_type = "e"
+    ws["A7"] = CellRichText("Initech ", TextBlock(InlineFont(b=True), "Ltd"))
+    ws["C7"] = 9
+    ws["P7"] = "far right"
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _xlsxwriter_workbook():
+    # constant_memory writes inline strings rather than shared ones
+    buf = io.BytesIO()
+    wb = xlsxwriter.Workbook(buf, {"constant_memory": True, "strings_to_numbers": False})
+    ws = wb.add_worksheet()
+    dates = wb.add_format({"num_format": "yyyy-mm-dd hh:mm"})
+    times = wb.add_format({"num_format": "hh:mm:ss"})
+    ws.write_row(0, 0, HEADER)
+    for r, row in enumerate(_rows(), 1):
+        for c, value in enumerate(row):
+            if isinstance(value, (dt.datetime, dt.timedelta)):
+                ws.write_datetime(r, c, value, dates)
+            elif isinstance(value, dt.time):
+                ws.write_datetime(r, c, value, times)
+            elif value is not None:
+                ws.write(r, c, value)
+    wb.close()
+    return buf.getvalue()
+
+
+def _expected(data):
+    header = pd.read_excel(io.BytesIO(data), nrows=0).columns
+    return pd.read_excel(io.BytesIO(data), dtype={c: str for c in NILSON_TEXT_COLUMNS if c in header})
+
+
+@pytest.mark.parametrize("build", [_openpyxl_workbook, _xlsxwriter_workbook])
+def test_xlsx_reads_as_read_excel(build):
+    data = build()
+    df = read_xlsx(io.BytesIO(data))
+    assert_frame_equal(df, _expected(data))
+    assert df["Advertiser"].tolist()[:2] == ["Acme", "24"]
+
+
+def test_nilson_export_reads_as_read_excel():
+    nilson = synthetic.nilson_log(2000, seed=4)
+    buf = io.BytesIO()
+    nilson.to_excel(buf, index=False)
+    data = buf.getvalue()
+    df = read_nilson(io.BytesIO(data))
+    assert_frame_equal(df, _expected(data))
+    assert_frame_equal(df, read_nilson(io.BytesIO(nilson.to_csv(index=False).encode())), check_dtype=False)
+
+
+def test_empty_and_header_only_sheets():
+    wb = Workbook()
+    buf = io.BytesIO()
+    wb.save(buf)
+    assert read_xlsx(io.BytesIO(buf.getvalue())).empty
+
+    wb.active.append(["Advertiser", "Dur"])
+    buf = io.BytesIO()
+    wb.save(buf)
+    data = buf.getvalue()
+    assert_frame_equal(read_xlsx(io.BytesIO(data)), pd.read_excel(io.BytesIO(data)), check_index_type=False)
@@ -0,0 +1,66 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+import jobs
+import storage
+import synthetic
+from app import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # jobs run inline, so the status is final when the 202 comes back
+    monkeypatch.setattr(jobs, "JOB_THREADS", 0)
+    monkeypatch.setattr(storage, "r", fakeredis.FakeRedis())
+    storage.cache.clear()
+    with app.test_client() as client:
+        yield client
+    storage.cache.clear()
+
+
+def _post_async(client, url, data):
+    res = client.post(url, data={**data, "async": "1"})
+    assert res.status_code == 202
+    body = res.get_json()
+    assert body["job_id"].startswith("job:")
+    assert body["status_url"] == f"/api/jobs/{body['job_id']}"
+    return client.get(body["status_url"]).get_json()
+
+
+def test_async_runs_report_the_synchronous_body(client):
+    workbook = synthetic.schedule_workbook(programs=8, seed=2)
+    form = {"sheet": "Sheet 1", "channel": "TV One", "advertiser": "AcmeCo"}
+
+    sync = client.post("/api/extract", data={"file": (io.BytesIO(workbook), "s.xlsx"), **form}).get_json()
+    status = _post_async(client, "/api/extract", {"file": (io.BytesIO(workbook), "s.xlsx"), **form})
+    assert (status["state"], status["percent"]) == ("done", 100)
+    assert status["result"]["preview"] == sync["preview"]
+
+    schedule = storage.get_extract(sync["token"])["df"]
+    nilson = synthetic.nilson_for_schedule(schedule).to_csv(index=False).encode()
+    form = {"token": sync["token"], "ro_number": "RO1", "channel": "TV One"}
+    sync = client.post("/api/monitor", data={"nilson": (io.BytesIO(nilson), "n.csv"), **form}).get_json()
+    status = _post_async(client, "/api/monitor", {"nilson": (io.BytesIO(nilson), "n.csv"), **form})
+    assert status["state"] == "done"
+    assert status["result"]["summary"] == sync["summary"]
+    assert status["result"]["unmatchedPreview"] == sync["unmatchedPreview"]
+
+
+def test_failed_runs_keep_the_http_status(client):
+    workbook = synthetic.schedule_workbook(programs=4)
+    status = _post_async(client, "/api/extract", {
+        "file": (io.BytesIO(workbook), "s.xlsx"), "sheet": "Nope", "channel": "TV One", "advertiser": "AcmeCo",
+    })
+    assert (status["state"], status["httpStatus"]) == ("failed", 400)
+    assert "Nope" in status["error"]
+
+    token = storage.put_extract(pd.DataFrame({"Program": ["News"]}))
+    status = _post_async(client, "/api/monitor", {"token": token, "ro_number": "RO1", "session_id": "session:gone"})
+    assert (status["state"], status["httpStatus"]) == ("failed", 404)
+    assert client.get("/api/jobs/job:gone").status_code == 404
@@ -0,0 +1,81 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+from monitoring import NilsonIndex, find_unmatched_records
+
+KEY = ("acme", "tv one", "2026-03-01", "30")
+
+
+def _index(times):
+    frame = pd.DataFrame({
+        "Advertiser": KEY[0], "Channel": KEY[1], "Date_key": KEY[2], "Dur": KEY[3],
+    }, index=range(len(times)))
+    return NilsonIndex(frame, np.asarray(times, dtype=np.int64))
+
+
+def _max_matching(times, windows):
+    # Kuhn's algorithm on the explicit graph
+    def fits(t, s, e):
+        return s <= t <= e if s <= e else (t >= s or t <= e)
+
+    owner = {}
+
+    def try_spot(k, seen):
+        for r, t in enumerate(times):
+            if r in seen or not fits(t, *windows[k]):
+                continue
+            seen.add(r)
+            if r not in owner or try_spot(owner[r], seen):
+                owner[r] = k
+                return True
+        return False
+
+    return sum(try_spot(k, set()) for k in range(len(windows)))
+
+
+def test_assignment_is_maximum():
+    rng = random.Random(7)
+    for _ in range(300):
+        times = [rng.randrange(0, 86400, 600) for _ in range(rng.randrange(1, 12))]
+        windows = []
+        for _ in range(rng.randrange(1, 12)):
+            s = rng.randrange(0, 86400, 600)
+            windows.append((s, (s + rng.randrange(0, 7200, 600)) % 86400))
+
+        state = _index(times).new_state()
+        totals = state.assign(KEY, list(range(len(windows))), windows)
+        found = [state.matches.get(k) for k in range(len(windows))]
+
+        assert sum(p is not None for p in found) == _max_matching(times, windows)
+        used = [p for p in found if p is not None]
+        assert len(used) == len(set(used))
+        for (s, e), pos, total in zip(windows, found, totals):
+            if pos is not None:
+                t = times[pos]
+                assert (s <= t <= e) if s <= e else (t >= s or t <= e)
+                assert total > 0
+
+
+def test_overlapping_windows_are_not_reported_consumed():
+    # first-fit gave the 10:10 record to the long 10:00-10:50 spot (in range
+    # 09:53-11:02) and reported the short one as consumed by other spots
+    schedule = pd.DataFrame({
+        "Program": ["Movie", "News"],
+        "Time": ["10:00 - 10:50", "10:00 - 10:05"],
+        "Dur": [30, 30],
+        "Date": ["01/03/2026", "01/03/2026"],
+        "Channel": "TV One",
+        "Advertiser": "AcmeCo",
+    })
+    nilson = pd.DataFrame({
+        "Advertiser": "AcmeCo", "Channel": "TV One", "Dd": 1, "Mn": 3, "Yr": 2026, "Dur": 30,
+        "Prog_time": ["10:00:00", "10:30:00"], "Advt_time": ["10:10:00", "10:55:00"],
+        "Advt_Theme": "Normal", "Program": ["Movie", "Movie"],
+    })
+
+    unmatched, all_records, job_nilson = find_unmatched_records(schedule, nilson, "RO1")
+    assert len(unmatched) == 0
+    assert all_records["Aired_Nilson_Row"].tolist() == [1, 0]
+    assert (job_nilson["RO Number"] == "RO1").sum() == 2
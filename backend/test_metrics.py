@@ -0,0 +1,38 @@
+import contextvars
+
+import metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics.reset()
+    for value in (0.002, 0.002, 0.3, 120):
+        metrics.observe("tsm_stage_seconds", value, stage="match.pass1")
+
+    lines = metrics.render_prometheus().splitlines()
+    assert 'tsm_stage_seconds_bucket{stage="match.pass1",le="0.005"} 2' in lines
+    assert 'tsm_stage_seconds_bucket{stage="match.pass1",le="0.5"} 3' in lines
+    assert 'tsm_stage_seconds_bucket{stage="match.pass1",le="60"} 3' in lines
+    assert 'tsm_stage_seconds_bucket{stage="match.pass1",le="+Inf"} 4' in lines
+    assert 'tsm_stage_seconds_count{stage="match.pass1"} 4' in lines
+
+
+def test_server_timing_sums_stages_of_the_request():
+    # a fresh context, like a new request
+    contextvars.Context().run(_request_stages)
+
+
+def _request_stages():
+    assert metrics.server_timing() is None
+
+    metrics.start_request()
+    clock = metrics.StageClock("extract")
+    clock.lap("open")
+    with metrics.stage("redis put"):
+        pass
+    with metrics.stage("redis put"):
+        pass
+
+    header = metrics.server_timing(total=0.5)
+    names = [entry.split(";")[0] for entry in header.split(", ")]
+    assert names == ["extract.open", "redis_put", "total"]
+    assert header.endswith("total;dur=500.0")
@@ -0,0 +1,43 @@
+import os
+
+import pandas as pd
+import pytest
+
+from previews import query_positions
+
+
+def _extract():
+    dates = pd.to_datetime(["2026-01-31", "2026-02-28", "2026-02-03", "2026-01-05"])
+    return pd.DataFrame({
+        "Program": ["A", "B", "C", "D"],
+        "Date": dates.strftime("%d/%m/%Y"),
+        "Date_dt": dates,
+    })
+
+
+def test_date_sorts_by_date_not_text():
+    df = _extract()
+    assert query_positions(df, sort="Date", descending=True).tolist() == [1, 2, 0, 3]
+    assert query_positions(df, sort="Date").tolist() == [3, 0, 2, 1]
+
+
+def test_date_range():
+    positions = query_positions(_extract(), date_from=pd.Timestamp("2026-02-01"), date_to=pd.Timestamp("2026-02-28"))
+    assert positions.tolist() == [1, 2]
+
+
+def test_bad_date_is_rejected(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+    import storage
+    from app import app
+
+    monkeypatch.setattr(storage, "r", fakeredis.FakeRedis())
+    storage.cache.clear()
+    token = storage.put_extract(_extract())
+    client = app.test_client()
+    assert client.get(f"/api/preview/{token}?date_from=garbage").status_code == 400
+    res = client.get(f"/api/preview/{token}?date_from=2026-02-01&sort=Date&order=desc")
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body["columnData"][body["columns"].index("Program")] == ["B", "C"]
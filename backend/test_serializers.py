@@ -0,0 +1,118 @@
+import datetime as dt
+import io
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import serializers
+import synthetic
+from extractor import extract_schedule_grid
+from monitoring import find_unmatched_records, prepare_nilson
+
+pytest.importorskip("pyarrow")
+
+FORMATS = ["arrow", "parquet", "pickle"]
+
+
+def _schedule():
+    data = synthetic.schedule_workbook(programs=6, seed=4)
+    return extract_schedule_grid(io.BytesIO(data), "Sheet 1", "TV One", "AcmeCo")
+
+
+def _nilson(schedule):
+    nilson = pd.concat([
+        synthetic.nilson_for_schedule(schedule, aired=0.7, seed=5),
+        synthetic.nilson_log(300, seed=6),
+    ], ignore_index=True)
+    # unparseable air times become NaT in the prepared frame
+    nilson.loc[::7, "Advt_time"] = "not a time"
+    return nilson
+
+
+def _assert_round_trip(payload, name):
+    ser = serializers.get_serializer(name)
+    loaded = serializers.loads(ser.dumps(payload))
+    assert loaded.keys() == payload.keys()
+    for key, value in payload.items():
+        if isinstance(value, pd.DataFrame):
+            assert_frame_equal(loaded[key], value)
+        else:
+            assert loaded[key] == value
+    return loaded
+
+
+@pytest.mark.parametrize("name", FORMATS)
+def test_extract_payload_round_trips(name):
+    df = _schedule()
+    # Excel cells of several types in one column go through the pickled sidecar
+    df["Rate"] = [1000, "1,200", None, 2.5] * (len(df) // 4) + [1000] * (len(df) % 4)
+    if name != "pickle":
+        assert serializers.get_serializer(name)._dump_frame(df)[0]["sidecar"] == ["Rate"]
+    _assert_round_trip({"df": df, "meta": {"sheet": "Sheet 1", "channel": "TV One"}}, name)
+
+
+@pytest.mark.parametrize("name", FORMATS)
+def test_result_payload_round_trips(name):
+    schedule = _schedule()
+    unmatched, all_df, job_nilson = find_unmatched_records(schedule, prepare_nilson(_nilson(schedule)), "RO1")
+    claimed = np.flatnonzero((job_nilson["RO Number"] == "RO1").to_numpy())
+    _assert_round_trip({
+        "unmatched": unmatched,
+        "all": all_df,
+        "claimed": pd.DataFrame({"position": claimed.astype(np.int64)}),
+        "session_id": "session:1",
+        "ro_number": "RO1",
+        "summary": {"totalUnmatched": len(unmatched), "claimConflicts": {"RO2": 3}},
+    }, name)
+
+
+@pytest.mark.parametrize("name", FORMATS)
+def test_session_payload_round_trips(name):
+    nilson = _nilson(_schedule())
+    prepared = prepare_nilson(nilson)
+    frame = prepared.frame
+    assert frame["Advt_time"].isna().any()
+    assert {type(v) for v in frame["Advt_time"][frame["Advt_time"].isna()]} == {type(pd.NaT)}
+
+    payload = {"original_nilson_df": nilson, "claim_mode": "exclusive", **prepared.to_payload()}
+    loaded = _assert_round_trip(payload, name)
+    # NaT stays NaT, not None
+    times = loaded["prepared_nilson_df"]["Advt_time"]
+    assert {type(v) for v in times[times.isna()]} == {type(pd.NaT)}
+
+
+@pytest.mark.parametrize("name", ["arrow", "parquet"])
+def test_time_columns_keep_their_nulls(name):
+    df = pd.DataFrame({
+        "nat": pd.Series([dt.time(1, 2), pd.NaT, dt.time(3, 4)], dtype=object),
+        "none": pd.Series([dt.time(1, 2), None, dt.time(3, 4)], dtype=object),
+        "both": pd.Series([dt.time(1, 2), None, pd.NaT], dtype=object),
+    })
+    loaded = _assert_round_trip({"df": df}, name)["df"]
+    assert loaded["nat"][1] is pd.NaT
+    assert loaded["none"][1] is None
+    assert loaded["both"][1] is None and loaded["both"][2] is pd.NaT
+
+
+@pytest.mark.parametrize("name", ["arrow", "parquet"])
+def test_frames_arrow_cannot_hold_are_pickled_whole(name):
+    frames = {
+        "duplicate_columns": pd.DataFrame([[1, 2]], columns=["a", "a"]),
+        "int_columns": pd.DataFrame({0: ["x"], 1: [2]}),
+        "complex": pd.DataFrame({"a": [1 + 2j, 3j]}),
+    }
+    ser = serializers.get_serializer(name)
+    for df in frames.values():
+        assert ser._dump_frame(df)[0] == {"pickled": True}
+    _assert_round_trip(frames, name)
+
+
+def test_pickled_payloads_from_before_the_switch_still_load():
+    schedule = _schedule()
+    payload = {"df": schedule, "meta": {"sheet": "Sheet 1"}}
+    loaded = serializers.loads(pickle.dumps(payload))
+    assert_frame_equal(loaded["df"], schedule)
+    assert loaded["meta"] == payload["meta"]
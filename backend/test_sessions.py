@@ -0,0 +1,335 @@
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+import app as app_module
+import storage
+import workers
+from app import app
+from monitoring import prepare_nilson
+
+RO_COUNT = 16
+SPOTS = 30
+
+
+def _schedule(adv, channel="TV One"):
+    days = [1 + i % 5 for i in range(SPOTS)]
+    return pd.DataFrame({
+        "Program": "News",
+        "Time": [f"{18 + i % 4}:00 - {18 + i % 4}:30" for i in range(SPOTS)],
+        "Dur": 30,
+        "Date": [f"{d:02d}/03/2026" for d in days],
+        "Channel": channel,
+        "Advertiser": adv,
+        "Date_dt": pd.to_datetime([f"2026-03-{d:02d}" for d in days]),
+    })
+
+
+def _nilson():
+    rows = []
+    for ro in range(RO_COUNT):
+        # two of every three spots aired
+        for i in range(SPOTS):
+            if i % 3 == 2:
+                continue
+            rows.append({
+                "Advertiser": f"Adv {ro}", "Channel": "TV One",
+                "Dd": 1 + i % 5, "Mn": 3, "Yr": 2026, "Dur": 30,
+                "Prog_time": f"{18 + i % 4}:00:00", "Advt_time": f"{18 + i % 4}:{10 + ro % 10}:00",
+                "Advt_Theme": "Normal", "Program": "News",
+            })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    monkeypatch.setattr(storage, "r", fakeredis.FakeRedis())
+    storage.cache.clear()
+    yield storage.r
+    storage.cache.clear()
+
+
+def _monitor(token, ro_number, session_id, **form):
+    with app.test_client() as client:
+        res = client.post("/api/monitor", data={
+            "token": token, "ro_number": ro_number, "session_id": session_id,
+            "channel": "TV One", "diagnostics": "0", **form,
+        })
+    assert res.status_code == 200, res.get_data(as_text=True)
+    return res.get_json()
+
+
+def _claims_by_ro(session_id):
+    claims = storage.get_session_claims(session_id)
+    assert len(claims) == len({ro for ro, _ in claims})
+    return {ro: positions.tolist() for ro, positions in claims}
+
+
+def test_keys_do_not_collide(fake_redis):
+    df = pd.DataFrame({"a": [1]})
+    tokens = [storage.put_extract(df) for _ in range(500)]
+    assert len(set(tokens)) == len(tokens)
+
+
+def test_parallel_monitor_runs_keep_every_claim(fake_redis):
+    nilson = _nilson()
+    tokens = {f"RO{i}": storage.put_extract(_schedule(f"Adv {i}")) for i in range(RO_COUNT)}
+
+    serial_session = storage.create_session(nilson, prepare_nilson(nilson))
+    for ro, token in tokens.items():
+        _monitor(token, ro, serial_session)
+    expected = _claims_by_ro(serial_session)
+    assert all(expected.values())
+
+    session_id = storage.create_session(nilson, prepare_nilson(nilson))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda item: _monitor(item[1], item[0], session_id), tokens.items()))
+
+    assert {res["session_id"] for res in results} == {session_id}
+    assert len({res["job_id"] for res in results}) == RO_COUNT
+    assert _claims_by_ro(session_id) == expected
+
+    res = app.test_client().get(f"/api/monitor/download/session/{session_id}/full_nilson")
+    full = pd.read_csv(io.BytesIO(res.get_data()), encoding="utf-8-sig", keep_default_na=False)
+    counts = full["RO Number"].value_counts()
+    for res in results:
+        summary = res["summary"]
+        assert counts.get(summary["roNumber"], 0) == summary["totalMatchedInNilson"]
+
+
+def test_runs_do_not_load_the_session_payload(fake_redis, monkeypatch):
+    nilson = _nilson()
+    token = storage.put_extract(_schedule("Adv 1"))
+    session_id = storage.create_session(nilson, prepare_nilson(nilson), "exclusive")
+    # the payload left this process's cache; the prepared log did not
+    storage.cache.invalidate(session_id)
+
+    fetch = storage._fetch
+    fetched = []
+    monkeypatch.setattr(storage, "_fetch", lambda key, *args: fetched.append(key) or fetch(key, *args))
+    first = _monitor(token, "RO1", session_id)["summary"]
+    second = _monitor(token, "RO2", session_id)["summary"]
+
+    assert session_id not in fetched
+    # the claim mode still applies
+    assert second["totalMatchedInNilson"] == 0 < first["totalMatchedInNilson"]
+
+
+def test_prepared_log_is_cached_for_the_sessions_remaining_ttl(fake_redis):
+    nilson = _nilson()
+    session_id = storage.create_session(nilson, prepare_nilson(nilson))
+    storage.cache.clear()
+    fake_redis.expire(session_id, 100)
+
+    prepared = storage.get_session_nilson(session_id, app_module._prepared_from_session)
+    _, size, expires_at = storage.cache._entries[f"{session_id}:prepared"]
+    assert 0 < expires_at - time.monotonic() <= 100
+    # the raw log it keeps for exports is charged too
+    assert size == prepared.memory_usage()
+    assert size > sum(frame.memory_usage(deep=True).sum() for frame in (prepared.frame, prepared.original))
+
+
+def test_claims_on_expired_session_are_dropped(fake_redis):
+    session_id = storage.create_session(_nilson())
+    fake_redis.delete(session_id)
+    assert storage.add_session_claims(session_id, "RO1", np.arange(3)) is None
+    assert not fake_redis.exists(f"{session_id}:claims")
+
+
+def test_appended_log_matches_like_a_full_run(fake_redis):
+    nilson = _nilson()
+    tokens = {f"RO{i}": storage.put_extract(_schedule(f"Adv {i}")) for i in range(4)}
+
+    full_session = storage.create_session(nilson, prepare_nilson(nilson))
+    expected = {ro: _monitor(token, ro, full_session)["summary"] for ro, token in tokens.items()}
+
+    # days 1-2 and part of day 3 first; the rest (joining the day 3 buckets) later
+    first = (nilson["Dd"] < 3) | ((nilson["Dd"] == 3) & (nilson.index % 2 == 0))
+    session_id = storage.create_session(nilson[first], prepare_nilson(nilson[first].reset_index(drop=True)))
+    for ro, token in tokens.items():
+        _monitor(token, ro, session_id)
+    before = _claims_by_ro(session_id)
+
+    with app.test_client() as client:
+        res = client.post(f"/api/monitor/session/{session_id}/append", data={
+            "nilson": (io.BytesIO(nilson[~first].to_csv(index=False).encode()), "more.csv"),
+        })
+    assert res.status_code == 200, res.get_data(as_text=True)
+    body = res.get_json()
+    assert body["totalRows"] == len(nilson)
+    assert body["affectedBuckets"] == RO_COUNT * 3
+
+    for job in body["jobs"]:
+        ro = job["roNumber"]
+        assert job["summary"]["totalMatchedInNilson"] == expected[ro]["totalMatchedInNilson"]
+        assert job["summary"]["totalUnmatched"] == expected[ro]["totalUnmatched"]
+        assert job["newlyMatched"] > 0
+
+    # earlier claims carried over, new ones added after them
+    claims = storage.get_session_claims(body["session_id"])
+    assert [ro for ro, _ in claims[:len(before)]] == list(before)
+    owned = {}
+    for ro, positions in claims:
+        owned.setdefault(ro, set()).update(positions.tolist())
+    for ro, positions in before.items():
+        assert set(positions) <= owned[ro]
+        assert len(owned[ro]) == expected[ro]["totalMatchedInNilson"]
+
+
+def test_extended_session_reads_its_base(fake_redis):
+    nilson = _nilson()
+    token = storage.put_extract(_schedule("Adv 5"))
+    parts = [nilson[nilson["Dd"] == day] for day in (1, 2, 3)]
+    session_id = storage.create_session(parts[0], prepare_nilson(parts[0].reset_index(drop=True)))
+    job = _monitor(token, "RO1", session_id)
+
+    client = app.test_client()
+    for part in parts[1:]:
+        res = client.post(f"/api/monitor/session/{session_id}/append", data={
+            "nilson": (io.BytesIO(part.to_csv(index=False).encode()), "more.csv"),
+        })
+        body = res.get_json()
+        session_id, job = body["session_id"], body["jobs"][0]
+        # the extension stores only its own rows
+        assert len(storage._fetch(session_id)[0]["original_nilson_df"]) == len(part)
+
+    # as in another worker: nothing cached
+    storage.cache.clear()
+    total = sum(len(part) for part in parts)
+    assert len(storage.get_session(session_id)["original_nilson_df"]) == total
+    res = client.get(f"/api/monitor/download/{job['job_id']}/nilson")
+    job_nilson = pd.read_csv(io.BytesIO(res.get_data()), encoding="utf-8-sig", keep_default_na=False)
+    assert len(job_nilson) == total
+    assert (job_nilson["RO Number"] == "RO1").sum() == job["summary"]["totalMatchedInNilson"]
+    res = client.get(f"/api/monitor/download/session/{session_id}/full_nilson")
+    full = pd.read_csv(io.BytesIO(res.get_data()), encoding="utf-8-sig", keep_default_na=False)
+    assert (full["RO Number"] == "RO1").sum() == job["summary"]["totalMatchedInNilson"]
+
+
+def test_exclusive_claims_leave_records_to_the_first_ro(fake_redis):
+    nilson = _nilson()
+    # two ROs booked the same spots of one advertiser
+    tokens = [storage.put_extract(_schedule("Adv 3")) for _ in range(2)]
+    aired = int((nilson["Advertiser"] == "Adv 3").sum())
+
+    independent = storage.create_session(nilson, prepare_nilson(nilson))
+    first = _monitor(tokens[0], "RO1", independent)["summary"]
+    second = _monitor(tokens[1], "RO2", independent)["summary"]
+    assert first["totalMatchedInNilson"] == second["totalMatchedInNilson"] == aired
+    assert first["claimConflicts"] == {}
+    assert second["claimConflicts"] == {"RO1": aired}
+
+    upload = (io.BytesIO(nilson.to_csv(index=False).encode()), "nilson.csv")
+    with app.test_client() as client:
+        res = client.post("/api/monitor", data={
+            "token": tokens[0], "ro_number": "RO1", "nilson": upload, "claim_mode": "exclusive",
+        })
+    session_id = res.get_json()["session_id"]
+    second = _monitor(tokens[1], "RO2", session_id, claim_mode="independent")["summary"]
+    assert second["totalMatchedInNilson"] == 0
+    assert second["totalUnmatched"] == SPOTS
+    assert second["totalClaimConflicts"] == 0
+    # re-running an RO keeps its own records
+    again = _monitor(tokens[0], "RO1", session_id)["summary"]
+    assert again["totalMatchedInNilson"] == aired
+
+
+@pytest.mark.parametrize("claim_mode", ["independent", "exclusive"])
+def test_racing_runs_see_each_others_claims(fake_redis, monkeypatch, claim_mode):
+    nilson = _nilson()
+    tokens = [storage.put_extract(_schedule("Adv 3")) for _ in range(2)]
+    aired = int((nilson["Advertiser"] == "Adv 3").sum())
+    session_id = storage.create_session(nilson, prepare_nilson(nilson), claim_mode)
+
+    # RO2 runs and publishes after RO1 read the session's claims, before RO1 publishes
+    add_session_claims = storage.add_session_claims
+    racing = []
+
+    def add_after_racing_run(session, ro_number, *args, **kwargs):
+        if ro_number == "RO1" and not racing:
+            racing.append(_monitor(tokens[1], "RO2", session_id)["summary"])
+        return add_session_claims(session, ro_number, *args, **kwargs)
+
+    monkeypatch.setattr(app_module, "add_session_claims", add_after_racing_run)
+    first = _monitor(tokens[0], "RO1", session_id)["summary"]
+    second = racing[0]
+
+    assert second["totalMatchedInNilson"] == aired
+    assert second["claimConflicts"] == {}
+    claims = _claims_by_ro(session_id)
+    if claim_mode == "exclusive":
+        # RO1 was matched again without RO2's records
+        assert first["totalMatchedInNilson"] == 0
+        assert first["claimConflicts"] == {}
+        assert claims["RO1"] == []
+    else:
+        assert first["totalMatchedInNilson"] == aired
+        assert first["claimConflicts"] == {"RO2": aired}
+        assert claims["RO1"] == claims["RO2"]
+
+
+@pytest.mark.parametrize("claim_mode", ["independent", "exclusive"])
+def test_batch_matches_sequential_runs(fake_redis, monkeypatch, claim_mode):
+    # partitions go to worker processes even on a single core
+    monkeypatch.setattr(workers, "WORKER_PROCESSES", 2)
+    monkeypatch.setattr(workers, "_pool", None)
+    one = _nilson()
+    nilson = pd.concat([one, one.assign(Channel="TV Two")], ignore_index=True)
+    # RO1 and RO2 booked the same spots; RO3 and RO4 run on the other channel
+    items = [("RO1", "Adv 1", "TV One"), ("RO2", "Adv 1", "TV One"),
+             ("RO3", "Adv 1", "TV Two"), ("RO4", "Adv 2", "TV Two"), ("RO5", "Adv 2", "TV One")]
+    tokens = [storage.put_extract(_schedule(adv, channel)) for _, adv, channel in items]
+
+    serial_session = storage.create_session(nilson, prepare_nilson(nilson), claim_mode)
+    expected = [_monitor(token, ro, serial_session)["summary"] for token, (ro, _, _) in zip(tokens, items)]
+
+    session_id = storage.create_session(nilson, prepare_nilson(nilson), claim_mode)
+    specs = [{"token": token, "ro_number": ro, "channel": "TV One"} for token, (ro, _, _) in zip(tokens, items)]
+    with app.test_client() as client:
+        res = client.post("/api/monitor/batch", data={
+            "items": json.dumps(specs), "session_id": session_id, "diagnostics": "0",
+        })
+    assert res.status_code == 200, res.get_data(as_text=True)
+    assert [job["summary"] for job in res.get_json()["jobs"]] == expected
+    assert _claims_by_ro(session_id) == _claims_by_ro(serial_session)
+    assert (expected[1]["totalMatchedInNilson"] == 0) == (claim_mode == "exclusive")
+
+
+def test_unknown_claim_mode_is_rejected(fake_redis):
+    token = storage.put_extract(_schedule("Adv 1"))
+    specs = json.dumps([{"token": token, "ro_number": "RO1"}])
+    with app.test_client() as client:
+        for url, form in [("/api/monitor", {"token": token, "ro_number": "RO1"}),
+                          ("/api/monitor/batch", {"items": specs})]:
+            res = client.post(url, data={**form, "claim_mode": "first"})
+            assert res.status_code == 400
+            assert res.get_json()["error"] == "claim_mode must be one of independent, exclusive"
+
+
+def test_monitoring_workbook_download(fake_redis):
+    nilson = _nilson()
+    session_id = storage.create_session(nilson, prepare_nilson(nilson))
+    first = _monitor(storage.put_extract(_schedule("Adv 3")), "RO1", session_id)
+    second = _monitor(storage.put_extract(_schedule("Adv 3")), "RO2", session_id)
+
+    client = app.test_client()
+    for job in (first, second):
+        res = client.get(f"/api/monitor/download/{job['job_id']}/xlsx")
+        assert res.status_code == 200
+        sheets = pd.read_excel(io.BytesIO(res.get_data()), sheet_name=None)
+        assert list(sheets) == ["Unmatched", "All Schedule Data", "Nilson", "Summary"]
+        assert len(sheets["All Schedule Data"]) == SPOTS
+
+    summary = dict(zip(sheets["Summary"]["Field"], sheets["Summary"]["Value"]))
+    aired = second["summary"]["totalMatchedInNilson"]
+    assert summary["roNumber"] == "RO2"
+    assert summary["claimConflicts: RO1"] == summary["totalClaimConflicts"] == aired
@@ -0,0 +1,31 @@
+import io
+
+import pandas as pd
+
+import synthetic
+from extractor import extract_schedule_grid, list_valid_sheets
+from monitoring import find_unmatched_records
+
+
+def test_schedule_workbook_extracts():
+    data = synthetic.schedule_workbook(programs=12, months=((2026, 1), (2026, 2)), sheets=2)
+    assert list_valid_sheets(io.BytesIO(data)) == ["Sheet 1", "Sheet 2"]
+
+    df = extract_schedule_grid(io.BytesIO(data), "Sheet 2", "TV One", "AcmeCo")
+    assert len(df) > 0
+    assert df["Date_dt"].min() >= pd.Timestamp("2026-01-01")
+    assert df["Date_dt"].max() <= pd.Timestamp("2026-02-28")
+    assert df["Time"].notna().all()
+
+
+def test_aired_spots_all_match():
+    data = synthetic.schedule_workbook(programs=12, seed=3)
+    schedule = extract_schedule_grid(io.BytesIO(data), "Sheet 1", "TV One", "AcmeCo")
+    nilson = pd.concat([
+        synthetic.nilson_for_schedule(schedule, aired=1.0),
+        synthetic.nilson_log(500, channels=["TV Two"]),
+    ], ignore_index=True)
+
+    unmatched, _, job_nilson = find_unmatched_records(schedule, nilson, "RO1", diagnostics=False)
+    assert len(unmatched) == 0
+    assert (job_nilson["RO Number"] == "RO1").sum() == len(schedule)
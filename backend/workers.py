@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# worker processes for CPU-bound batch work (extraction, monitoring)
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "0")) or os.cpu_count() or 1
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=WORKER_PROCESSES)
+    return _pool
+
+
+def run_parallel(fn, args_list):
+    """
+    Run fn(*args) for every args tuple on the process pool, results in input order.
+    Exceptions raised by fn are returned in place of the result.
+    A single task runs inline, there is nothing to overlap.
+    """
+    global _pool
+    if len(args_list) < 2 or WORKER_PROCESSES < 2:
+        return [_call(fn, args) for args in args_list]
+
+    try:
+        futures = [get_pool().submit(fn, *args) for args in args_list]
+        return [_result(f) for f in futures]
+    except BrokenProcessPool:
+        # a worker died (e.g. killed for memory); start a fresh pool next time
+        _pool = None
+        raise
+
+
+def _call(fn, args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        return e
+
+
+def _result(future):
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        return e